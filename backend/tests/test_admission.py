@@ -0,0 +1,100 @@
+import pymemcache
+import pytest
+from pymemcache.exceptions import MemcacheUnexpectedCloseError
+
+from worldguess import dependencies
+from worldguess.admission import CLIENT_WINDOW_SECONDS, TokenBucket, charge_client, circle_cost
+from worldguess.dependencies import DummyMemcachedClient
+
+
+class FakeMemcached(DummyMemcachedClient):
+    """Just enough of memcached's add and incr semantics, without expiry."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, int] = {}
+
+    def add(self, key: str, value: str | bytes, expire: int = 0, noreply: bool | None = None) -> bool:
+        if key in self.values:
+            return False
+        self.values[key] = int(value)
+        return True
+
+    def incr(self, key: str, value: int) -> int | None:
+        if key not in self.values:
+            return None
+        self.values[key] += value
+        return self.values[key]
+
+
+class BrokenMemcached(DummyMemcachedClient):
+    """Writes raise like a pooled client's do while memcached is down, ignore_exc notwithstanding."""
+
+    def incr(self, key: str, value: int) -> int | None:
+        raise MemcacheUnexpectedCloseError()
+
+
+class TestCircleCost:
+    def test_grows_with_radius_squared(self) -> None:
+        assert circle_cost(0.0, 200.0) == pytest.approx(4 * circle_cost(0.0, 100.0))
+
+    def test_shrinks_towards_the_poles(self) -> None:
+        assert circle_cost(60.0, 100.0) == pytest.approx(circle_cost(0.0, 100.0) / 2)
+
+    def test_capped_at_the_whole_grid(self) -> None:
+        assert circle_cost(0.0, 1e9) == circle_cost(0.0, 1e12)
+
+
+class TestTokenBucket:
+    def test_refills_over_time(self) -> None:
+        now = [0.0]
+        bucket = TokenBucket(rate=10.0, capacity=100.0, clock=lambda: now[0])
+        assert bucket.try_acquire(80.0) == 0.0
+        assert bucket.try_acquire(40.0) == pytest.approx(2.0)
+        now[0] = 2.0
+        assert bucket.try_acquire(40.0) == 0.0
+
+    def test_oversized_request_waits_for_a_full_bucket(self) -> None:
+        now = [0.0]
+        bucket = TokenBucket(rate=10.0, capacity=100.0, clock=lambda: now[0])
+        assert bucket.try_acquire(500.0) == 0.0
+        # Went 400 into debt, refilling to full takes 50 seconds
+        now[0] = 10.0
+        assert bucket.try_acquire(500.0) == pytest.approx(40.0)
+
+
+class TestChargeClient:
+    def test_limits_clients_independently(self) -> None:
+        cache = FakeMemcached()
+        assert charge_client(cache, "a", 60, limit=100, now=0.0) == 0.0
+        assert charge_client(cache, "a", 30, limit=100, now=1.0) == 0.0
+        assert charge_client(cache, "a", 30, limit=100, now=15.0) == pytest.approx(CLIENT_WINDOW_SECONDS - 15.0)
+        assert charge_client(cache, "b", 30, limit=100, now=15.0) == 0.0
+
+    def test_new_window_resets_the_count(self) -> None:
+        cache = FakeMemcached()
+        assert charge_client(cache, "a", 150, limit=100, now=0.0) == 0.0
+        assert charge_client(cache, "a", 1, limit=100, now=1.0) > 0
+        assert charge_client(cache, "a", 1, limit=100, now=CLIENT_WINDOW_SECONDS + 1.0) == 0.0
+
+    def test_unavailable_memcached_admits(self) -> None:
+        assert charge_client(DummyMemcachedClient(), "a", 10**12, limit=1, now=0.0) == 0.0
+
+    def test_memcached_errors_admit(self) -> None:
+        assert charge_client(BrokenMemcached(), "a", 10**12, limit=1, now=0.0) == 0.0
+
+
+def test_failed_memcached_connect_is_not_retried_every_call(monkeypatch: pytest.MonkeyPatch) -> None:
+    attempts = 0
+
+    def refuse(*args: object, **kwargs: object) -> None:
+        nonlocal attempts
+        attempts += 1
+        raise ConnectionRefusedError()
+
+    monkeypatch.setattr(pymemcache, "PooledClient", refuse)
+    monkeypatch.setattr(dependencies, "_client", None)
+    monkeypatch.setattr(dependencies, "_fallback", None)
+    first = dependencies.memcached()
+    assert isinstance(first, DummyMemcachedClient)
+    assert dependencies.memcached() is first
+    assert attempts == 1
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from worldguess.cancellation import CLIENT_CLOSED_REQUEST, run_cancellable
+from worldguess.database import QUERY_CANCELED_SQLSTATE, is_query_canceled
+
+
+class QueryCanceled(Exception):
+    sqlstate = QUERY_CANCELED_SQLSTATE
+
+
+class FakeRequest:
+    """Delivers http.disconnect after disconnect_after seconds, never when None."""
+
+    def __init__(self, disconnect_after: float | None) -> None:
+        self.disconnect_after = disconnect_after
+
+    async def receive(self) -> dict[str, Any]:
+        if self.disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.disconnect_after or 0)
+        return {"type": "http.disconnect"}
+
+
+class FakeSession:
+    """A session whose running statement blocks until the driver-level cancel is called."""
+
+    def __init__(self) -> None:
+        self.canceled = threading.Event()
+        dbapi_connection = SimpleNamespace(cancel=self.canceled.set)
+        self._connection = SimpleNamespace(connection=SimpleNamespace(dbapi_connection=dbapi_connection))
+
+    def in_transaction(self) -> bool:
+        return True
+
+    def connection(self) -> SimpleNamespace:
+        return self._connection
+
+    def slow_query(self) -> int:
+        if self.canceled.wait(timeout=5):
+            raise OperationalError("SELECT ...", {}, QueryCanceled())
+        return 42
+
+
+class TestRunCancellable:
+    def test_returns_result_while_connected(self) -> None:
+        session = FakeSession()
+        result = asyncio.run(run_cancellable(FakeRequest(None), session, lambda: 7))  # type: ignore[arg-type]
+        assert result == 7
+        assert not session.canceled.is_set()
+
+    def test_cancels_query_on_disconnect(self) -> None:
+        session = FakeSession()
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(run_cancellable(FakeRequest(0.05), session, session.slow_query))  # type: ignore[arg-type]
+        assert raised.value.status_code == CLIENT_CLOSED_REQUEST
+        assert session.canceled.is_set()
+
+
+def test_is_query_canceled() -> None:
+    assert is_query_canceled(OperationalError("SELECT 1", {}, QueryCanceled()))
+    assert not is_query_canceled(DBAPIError("SELECT 1", {}, Exception("connection refused")))
@@ -0,0 +1,60 @@
+from collections.abc import Iterator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymemcache.exceptions import MemcacheUnexpectedCloseError
+
+from worldguess.database import get_read_db
+from worldguess.dependencies import DummyMemcachedClient, memcached
+from worldguess.orm.tables import Challenge
+from worldguess.routes import challenge
+
+CHALLENGE = Challenge(
+    challenge_id="c1", game_id="g1", latitude=48.8566, longitude=2.3522, radius_km=10.0, size_class=None
+)
+
+
+class FakeSession:
+    def get(self, entity: type[Challenge], challenge_id: str) -> Challenge | None:
+        return CHALLENGE if challenge_id == CHALLENGE.challenge_id else None
+
+
+class BrokenMemcached(DummyMemcachedClient):
+    """Reads miss as with ignore_exc, writes raise as they do on a pooled client when memcached is down."""
+
+    def set(self, key: str, value: str | bytes, expire: int = 0) -> bool:
+        raise MemcacheUnexpectedCloseError()
+
+    def delete(self, key: str) -> bool:
+        raise MemcacheUnexpectedCloseError()
+
+
+@pytest.fixture
+def client() -> Iterator[TestClient]:
+    app = FastAPI()
+    app.include_router(challenge.router)
+    app.dependency_overrides[get_read_db] = FakeSession
+    app.dependency_overrides[memcached] = BrokenMemcached
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_challenge_is_served_when_caching_it_fails(client: TestClient) -> None:
+    response = client.get("/challenge/c1")
+    assert response.status_code == 200
+    assert response.json()["game_id"] == "g1"
+
+
+def test_matching_etag_is_answered_without_a_body(client: TestClient) -> None:
+    etag = client.get("/challenge/c1").headers["etag"]
+    response = client.get("/challenge/c1", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_stale_etag_gets_the_details(client: TestClient) -> None:
+    response = client.get("/challenge/c1", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert response.json()["challenge_id"] == "c1"
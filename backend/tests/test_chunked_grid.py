@@ -0,0 +1,84 @@
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+from worldguess.chunked_grid import ChunkCache, ChunkedArray, CorruptChunkError, write_chunked_grid
+from worldguess.grid_files import Grid, GridTransform
+from worldguess.queries.population_grid import population_in_circle
+
+# One degree pixels covering lon [-10, 10), lat (-10, 10]
+TRANSFORM = GridTransform(west=-10.0, north=10.0, pixel_width=1.0, pixel_height=1.0)
+
+
+def _array() -> np.ndarray:
+    array = np.random.default_rng(0).random((20, 20), dtype=np.float32) * 1000
+    # A chunk of zeros only, left out of the store
+    array[:4, :4] = 0
+    return array
+
+
+def _store(tmp_path: Path, array: np.ndarray, max_bytes: int = 1024 * 1024) -> ChunkedArray:
+    path = tmp_path / "test.chunks"
+    write_chunked_grid(array, path, "1", chunk_shape=(4, 6))
+    return ChunkedArray(path, ChunkCache(max_bytes))
+
+
+class TestChunkedArray:
+    @pytest.mark.parametrize(
+        "key",
+        [
+            (3, slice(2, 17)),
+            (19, slice(None)),
+            (-1, slice(15, 40)),
+            (slice(2, 11), slice(5, 19)),
+            (slice(None), 7),
+            slice(5, 9),
+            (4, 4),
+            (slice(5, 5), slice(None)),
+        ],
+    )
+    def test_reads_like_the_array(self, tmp_path: Path, key: Any) -> None:
+        array = _array()
+        np.testing.assert_array_equal(_store(tmp_path, array)[key], array[key])
+
+    def test_circle_sums_match_the_array(self, tmp_path: Path) -> None:
+        array = _array()
+        chunked = Grid(name="test", array=_store(tmp_path, array), transform=TRANSFORM, metadata={})
+        in_memory = Grid(name="test", array=array, transform=TRANSFORM, metadata={})
+        for latitude, longitude, radius_km in [(0.0, 0.0, 500.0), (5.3, -7.1, 300.0), (0.0, 0.0, 5000.0)]:
+            assert population_in_circle(chunked, latitude, longitude, radius_km) == population_in_circle(
+                in_memory, latitude, longitude, radius_km
+            )
+
+    def test_detects_corrupt_chunks(self, tmp_path: Path) -> None:
+        _store(tmp_path, _array())
+        path = tmp_path / "test.chunks"
+        content = bytearray(path.read_bytes())
+        content[-10] ^= 0xFF
+        path.write_bytes(bytes(content))
+        corrupt = ChunkedArray(path, ChunkCache(1024 * 1024))
+        with pytest.raises(CorruptChunkError):
+            corrupt[19, :]
+
+    def test_cache_stays_within_budget(self, tmp_path: Path) -> None:
+        chunk_bytes = 4 * 6 * 4
+        cache = ChunkCache(max_bytes=3 * chunk_bytes)
+        path = tmp_path / "test.chunks"
+        write_chunked_grid(_array(), path, "1", chunk_shape=(4, 6))
+        store = ChunkedArray(path, cache)
+        for row in range(20):
+            store[row, :]
+        assert cache._size <= 3 * chunk_bytes
+
+    def test_prefetches_when_reads_move_to_other_chunks(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        store = _store(tmp_path, _array())
+        prefetched: list[list[int]] = []
+        monkeypatch.setattr(store._cache, "prefetch", lambda _, chunks: prefetched.append(chunks))
+        # Rows 0 to 3 are one row of chunks
+        for row in range(4):
+            store[row, 2:10]
+        assert len(prefetched) == 1
+        store[4, 2:10]
+        assert len(prefetched) == 2
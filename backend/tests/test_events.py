@@ -0,0 +1,64 @@
+import pytest
+
+from worldguess import events
+from worldguess.events import ChallengeEvent, ChallengeEventHub, LocalBroker, PostgresBroker
+from worldguess.settings import get_settings
+
+
+@pytest.mark.parametrize(
+    ("workers", "configured", "expected"),
+    [
+        ("1", None, LocalBroker),
+        ("4", None, PostgresBroker),
+        ("4", "local", LocalBroker),
+        ("1", "postgres", PostgresBroker),
+    ],
+)
+def test_broker_follows_the_worker_count_unless_configured(
+    monkeypatch: pytest.MonkeyPatch, workers: str, configured: str | None, expected: type
+) -> None:
+    monkeypatch.setenv("WORKERS", workers)
+    if configured is None:
+        monkeypatch.delenv("CHALLENGE_EVENTS_BROKER", raising=False)
+    else:
+        monkeypatch.setenv("CHALLENGE_EVENTS_BROKER", configured)
+    monkeypatch.setattr(events, "_broker", None)
+    get_settings.cache_clear()
+    try:
+        assert isinstance(events.get_event_broker(), expected)
+    finally:
+        get_settings.cache_clear()
+
+
+def _event(challenge_id: str, count: int) -> ChallengeEvent:
+    return ChallengeEvent(challenge_id=challenge_id, type="guess_submitted", data={"count": count})
+
+
+class TestChallengeEventHub:
+    def test_events_reach_every_subscriber_of_their_challenge(self) -> None:
+        hub = ChallengeEventHub()
+        with hub.subscribe("c1") as first, hub.subscribe("c1") as second, hub.subscribe("c2") as other:
+            hub.deliver(_event("c1", 1))
+            assert first.get_nowait() == second.get_nowait() == _event("c1", 1)
+            assert other.empty()
+
+    def test_full_queue_drops_its_oldest_event_only(self) -> None:
+        hub = ChallengeEventHub(queue_size=2)
+        with hub.subscribe("c1") as slow, hub.subscribe("c1") as fast:
+            for count in range(3):
+                hub.deliver(_event("c1", count))
+                if count < 2:
+                    fast.get_nowait()
+            assert [slow.get_nowait().data["count"] for _ in range(slow.qsize())] == [1, 2]
+            assert fast.get_nowait().data["count"] == 2
+
+    def test_unsubscribing_removes_the_queue(self) -> None:
+        hub = ChallengeEventHub()
+        with hub.subscribe("c1"):
+            with hub.subscribe("c1") as leaving:
+                assert hub.subscriber_count("c1") == 2
+            assert hub.subscriber_count("c1") == 1
+            hub.deliver(_event("c1", 1))
+            assert leaving.empty()
+        assert hub.subscriber_count("c1") == 0
+        assert "c1" not in hub._subscribers
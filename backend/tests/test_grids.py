@@ -0,0 +1,76 @@
+import json
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sqlalchemy.orm import Session
+
+from worldguess import grids
+from worldguess.population_cache import population_data_version
+from worldguess.settings import get_settings
+
+
+def export_grid(grid_dir: Path, name: str, value: float, data_version: str) -> None:
+    """Write a grid the way the pipeline does, array first, both replaced atomically."""
+    np.save(grid_dir / f"{name}.partial.npy", np.full((4, 8), value, dtype=np.float32))
+    os.replace(grid_dir / f"{name}.partial.npy", grid_dir / f"{name}.npy")
+    metadata = {"west": -180.0, "north": 90.0, "pixel_width": 45.0, "pixel_height": 45.0, "data_version": data_version}
+    (grid_dir / f"{name}.json.partial").write_text(json.dumps(metadata))
+    os.replace(grid_dir / f"{name}.json.partial", grid_dir / f"{name}.json")
+
+
+@pytest.fixture
+def grid_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    monkeypatch.setenv("GRID_DIR", str(tmp_path))
+    monkeypatch.setattr(grids, "GRID_CHECK_SECONDS", 0.0)
+    monkeypatch.setattr(grids, "_grids", {})
+    get_settings.cache_clear()
+    yield tmp_path
+    get_settings.cache_clear()
+
+
+def test_missing_grid_is_found_once_exported(grid_dir: Path) -> None:
+    assert grids.get_grid("population") is None
+    export_grid(grid_dir, "population", 1.0, "1")
+    grid = grids.get_grid("population")
+    assert grid is not None and grid.data_version == "1"
+
+
+def test_new_export_is_reloaded(grid_dir: Path) -> None:
+    export_grid(grid_dir, "population", 1.0, "1")
+    first = grids.get_grid("population")
+    assert grids.get_grid("population") is first
+
+    export_grid(grid_dir, "population", 2.0, "2")
+    grid = grids.get_grid("population")
+    assert grid is not None and grid.data_version == "2"
+    assert float(grid.array[0, 0]) == 2.0
+
+
+def test_loaded_grid_is_kept_between_checks(grid_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(grids, "GRID_CHECK_SECONDS", 3600.0)
+    export_grid(grid_dir, "population", 1.0, "1")
+    first = grids.get_grid("population")
+    export_grid(grid_dir, "population", 2.0, "2")
+    assert grids.get_grid("population") is first
+
+
+def test_refreshed_grid_version_is_the_population_data_version(grid_dir: Path) -> None:
+    """Results the pipeline warms under the new data version are the ones workers look up after a refresh."""
+    export_grid(grid_dir, "population", 1.0, "1")
+    # Unbound, the data version comes from the grid without a query
+    session = Session()
+    assert population_data_version(session) == "1"
+    export_grid(grid_dir, "population", 2.0, "2")
+    assert population_data_version(session) == "2"
+
+
+def test_only_shared_grids_are_published(grid_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Restored after the test, publishing advertises the segments through it
+    monkeypatch.setenv(grids.SHARED_GRIDS_ENV, "{}")
+    export_grid(grid_dir, "population", 1.0, "1")
+    export_grid(grid_dir, "population_2015", 1.0, "1")
+    grids.publish_shared_grids()
+    assert list(json.loads(os.environ[grids.SHARED_GRIDS_ENV])) == ["population"]
@@ -1,4 +1,38 @@
-from worldguess.utils.guess_qualification import calculate_guess_qualification
+import numpy as np
+import pytest
+
+from worldguess.utils.guess_qualification import calculate_guess_qualification, calculate_guess_qualifications
+
+# Every (actual, guess) pair exercised by TestGuessQualification
+SCALAR_CASES = [
+    (100, 100),
+    (0, 0),
+    (1000000, 1000000),
+    (0, 5),
+    (0, 50),
+    (0, 500),
+    (5, 0),
+    (50, 0),
+    (500, 0),
+    (5, 10),
+    (10, 5),
+    (5, 15),
+    (300, 200),
+    (300, 450),
+    (300, 600),
+    (300, 900),
+    (12000, 16000),
+    (12000, 19000),
+    (12000, 40000),
+    (1000000, 1200000),
+    (1000000, 1500000),
+    (1000000, 3000000),
+    (12000000, 19000000),
+    (100, 150),
+    (100, 50),
+    (1000, 1500),
+    (1000, 500),
+]
 
 
 class TestGuessQualification:
@@ -55,3 +89,34 @@ class TestGuessQualification:
         # Over and under guessing should be treated the same
         assert calculate_guess_qualification(100, 150) == calculate_guess_qualification(100, 50)
         assert calculate_guess_qualification(1000, 1500) == calculate_guess_qualification(1000, 500)
+
+
+class TestBatchGuessQualification:
+    @pytest.mark.parametrize("actual", sorted({actual for actual, _ in SCALAR_CASES}))
+    def test_matches_scalar(self, actual: int) -> None:
+        guesses = [guess for case_actual, guess in SCALAR_CASES if case_actual == actual]
+        result = calculate_guess_qualifications(actual, guesses)
+        assert list(result.qualifications) == [calculate_guess_qualification(actual, guess) for guess in guesses]
+        assert list(result.differences) == [abs(actual - guess) for guess in guesses]
+
+    def test_matches_scalar_on_all_guesses(self) -> None:
+        guesses = [guess for _, guess in SCALAR_CASES]
+        for actual, _ in SCALAR_CASES:
+            result = calculate_guess_qualifications(actual, guesses)
+            assert list(result.qualifications) == [calculate_guess_qualification(actual, guess) for guess in guesses]
+
+    def test_dense_ranks_with_ties(self) -> None:
+        # 900 and 1100 are equally close to 1000
+        result = calculate_guess_qualifications(1000, [900, 1000, 1100, 5000, 1000])
+        assert list(result.ranks) == [2, 1, 2, 3, 1]
+
+    def test_scores(self) -> None:
+        result = calculate_guess_qualifications(1000, [1000, 1500, 2000, 4000])
+        assert result.scores[0] == 1.0
+        assert result.scores[1] == pytest.approx(0.5)
+        assert result.scores[2] == pytest.approx(1 / 3)
+        assert np.all(np.diff(result.scores) < 0)
+
+    def test_empty(self) -> None:
+        result = calculate_guess_qualifications(1000, [])
+        assert len(result.qualifications) == len(result.ranks) == 0
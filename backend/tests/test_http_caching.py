@@ -0,0 +1,33 @@
+import pytest
+
+from worldguess.utils.http_caching import etag_matches, make_etag
+
+ETAG = make_etag(b"{}")
+
+
+@pytest.mark.parametrize(
+    ("if_none_match", "matches"),
+    [
+        (None, False),
+        ("", False),
+        (ETAG, True),
+        (f"W/{ETAG}", True),
+        ('"other"', False),
+        ('W/"other"', False),
+        ("*", True),
+        (" * ", True),
+        (f'"other", {ETAG}', True),
+        (f'"other",W/{ETAG}', True),
+        ('"other", W/"another"', False),
+        # Only a whole header of * matches anything
+        ('"other", *', False),
+    ],
+)
+def test_etag_matches(if_none_match: str | None, matches: bool) -> None:
+    assert etag_matches(if_none_match, ETAG) is matches
+
+
+def test_etag_is_strong_and_follows_the_body() -> None:
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert make_etag(b"{}") == ETAG
+    assert make_etag(b"[]") != ETAG
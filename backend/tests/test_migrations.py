@@ -0,0 +1,15 @@
+from worldguess.migrations import LATEST_VERSION, MIGRATIONS
+
+
+def test_versions_are_contiguous_from_one() -> None:
+    assert [migration.version for migration in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_latest_version_is_the_last_migration() -> None:
+    assert LATEST_VERSION == MIGRATIONS[-1].version == max(migration.version for migration in MIGRATIONS)
+
+
+def test_every_migration_is_described_and_has_statements() -> None:
+    for migration in MIGRATIONS:
+        assert migration.description
+        assert migration.statements
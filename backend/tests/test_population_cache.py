@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from pymemcache.exceptions import MemcacheUnexpectedCloseError
+
+from worldguess.cancellation import CLIENT_CLOSED_REQUEST
+from worldguess.dependencies import DummyMemcachedClient
+from worldguess.population_cache import SingleFlight, leased_compute
+from worldguess.query_log import normalize_circle, population_cache_key
+
+
+class FakeMemcached(DummyMemcachedClient):
+    """Just enough of memcached's get, set, add and delete semantics, without expiry."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, str | bytes] = {}
+
+    def get(self, key: str) -> str | bytes | None:  # type: ignore[override]
+        return self.values.get(key)
+
+    def set(self, key: str, value: str | bytes, expire: int = 0) -> bool:
+        self.values[key] = value
+        return True
+
+    def add(self, key: str, value: str | bytes, expire: int = 0, noreply: bool | None = None) -> bool:
+        if key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    def delete(self, key: str) -> bool:
+        return self.values.pop(key, None) is not None
+
+
+class UnwritableMemcached(DummyMemcachedClient):
+    """Reads miss as with ignore_exc, writes raise as they do on a pooled client when memcached is down."""
+
+    def get(self, key: str) -> None:
+        return None
+
+    def set(self, key: str, value: str | bytes, expire: int = 0) -> bool:
+        raise MemcacheUnexpectedCloseError()
+
+    def add(self, key: str, value: str | bytes, expire: int = 0, noreply: bool | None = None) -> bool:
+        raise MemcacheUnexpectedCloseError()
+
+    def delete(self, key: str) -> bool:
+        raise MemcacheUnexpectedCloseError()
+
+
+def test_nearby_circles_share_a_key() -> None:
+    first = population_cache_key(*normalize_circle(48.85661234, 2.35221234, 100.0001), "1")
+    second = population_cache_key(*normalize_circle(48.85661201, 2.35221199, 100.0002), "1")
+    assert first == second
+    assert first != population_cache_key(*normalize_circle(48.85661234, 2.35221234, 100.0001), "2")
+
+
+class TestSingleFlight:
+    def test_concurrent_callers_share_one_computation(self) -> None:
+        calls = 0
+
+        async def compute() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 42
+
+        async def main() -> list[int]:
+            flights: SingleFlight[int] = SingleFlight()
+            return await asyncio.gather(*(flights.run("key", compute) for _ in range(10)))
+
+        assert asyncio.run(main()) == [42] * 10
+        assert calls == 1
+
+    def test_errors_reach_every_caller(self) -> None:
+        async def compute() -> int:
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def main() -> list[int | BaseException]:
+            flights: SingleFlight[int] = SingleFlight()
+            return await asyncio.gather(*(flights.run("key", compute) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+
+    def test_follower_takes_over_when_leader_disconnects(self) -> None:
+        async def disconnected() -> int:
+            await asyncio.sleep(0.01)
+            raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+
+        async def connected() -> int:
+            return 7
+
+        async def main() -> tuple[int | BaseException, int | BaseException]:
+            flights: SingleFlight[int] = SingleFlight()
+            leader = asyncio.create_task(flights.run("key", disconnected))
+            await asyncio.sleep(0)
+            return await asyncio.gather(leader, flights.run("key", connected), return_exceptions=True)
+
+        leader, follower = asyncio.run(main())
+        assert isinstance(leader, HTTPException)
+        assert follower == 7
+
+
+class TestLeasedCompute:
+    def test_stores_result_and_releases_lease(self) -> None:
+        cache = FakeMemcached()
+
+        async def compute() -> int:
+            return 42
+
+        assert asyncio.run(leased_compute(cache, "population:1", compute, str, int)) == 42
+        assert cache.values == {"population:1": "42"}
+
+    def test_waits_for_lease_holder(self) -> None:
+        cache = FakeMemcached()
+        cache.add("population:1:lease", "1")
+
+        async def compute() -> int:
+            raise AssertionError("only the lease holder computes")
+
+        async def main() -> int:
+            waiter = asyncio.create_task(leased_compute(cache, "population:1", compute, str, int))
+            await asyncio.sleep(0.02)
+            cache.set("population:1", "42")
+            return await waiter
+
+        assert asyncio.run(main()) == 42
+
+    def test_failed_computation_releases_lease(self) -> None:
+        cache = FakeMemcached()
+
+        async def compute() -> int:
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            asyncio.run(leased_compute(cache, "population:1", compute, str, int))
+        assert cache.values == {}
+
+    def test_computes_without_lease_when_memcached_writes_fail(self) -> None:
+        async def compute() -> int:
+            return 42
+
+        started = time.monotonic()
+        assert asyncio.run(leased_compute(UnwritableMemcached(), "population:1", compute, str, int)) == 42
+        # Did not wait out a lease nobody holds
+        assert time.monotonic() - started < 1.0
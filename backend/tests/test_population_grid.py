@@ -0,0 +1,123 @@
+import math
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from worldguess.grid_files import Grid, GridTransform
+from worldguess.queries.population_grid import (
+    EARTH_RADIUS_M,
+    _mercator_y,
+    population_by_country,
+    population_in_circle,
+    population_in_circle_per_grid,
+)
+from worldguess.schemas import GameConfig
+
+# One degree pixels covering lon [-10, 10), lat (-10, 10]
+TRANSFORM = GridTransform(west=-10.0, north=10.0, pixel_width=1.0, pixel_height=1.0)
+
+
+def _grid(array: np.ndarray) -> Grid:
+    return Grid(name="test", array=array, transform=TRANSFORM, metadata={})
+
+
+def _brute_force(array: np.ndarray, latitude: float, longitude: float, radius_km: float) -> int:
+    """Sum of the pixels whose centers lie in the Web Mercator circle, like ST_Clip on a 3857 buffer."""
+    center_x = EARTH_RADIUS_M * math.radians(longitude)
+    center_y = _mercator_y(latitude)
+    total = 0.0
+    for row in range(array.shape[0]):
+        for column in range(array.shape[1]):
+            x = EARTH_RADIUS_M * math.radians(TRANSFORM.west + column + 0.5)
+            y = _mercator_y(TRANSFORM.north - row - 0.5)
+            if (x - center_x) ** 2 + (y - center_y) ** 2 <= (radius_km * 1000) ** 2:
+                total += float(array[row, column])
+    return round(total)
+
+
+class TestPopulationInCircle:
+    @pytest.mark.parametrize(
+        "latitude,longitude,radius_km",
+        [(0.0, 0.0, 300.0), (5.3, -2.7, 450.0), (-8.0, 9.5, 600.0), (0.5, 0.5, 10.0), (0.0, 0.0, 5000.0)],
+    )
+    def test_matches_brute_force(self, latitude: float, longitude: float, radius_km: float) -> None:
+        array = np.random.default_rng(0).random((20, 20), dtype=np.float32) * 1000
+        expected = _brute_force(array, latitude, longitude, radius_km)
+        assert population_in_circle(_grid(array), latitude, longitude, radius_km) == expected
+
+    def test_circle_outside_grid(self) -> None:
+        array = np.ones((20, 20), dtype=np.float32)
+        assert population_in_circle(_grid(array), 45.0, 90.0, 100.0) == 0
+
+    def test_small_circle_between_pixel_centers(self) -> None:
+        array = np.ones((20, 20), dtype=np.float32)
+        assert population_in_circle(_grid(array), 0.0, 0.0, 1.0) == 0
+
+
+class TestPopulationByCountry:
+    @staticmethod
+    def _country_grid(array: np.ndarray) -> Grid:
+        countries = {"1": {"name": "West", "iso_code": "WST"}, "2": {"name": "East", "iso_code": "EST"}}
+        return Grid(name="countries", array=array, transform=TRANSFORM, metadata={"countries": countries})
+
+    def test_splits_total_by_country(self) -> None:
+        population = np.random.default_rng(1).random((20, 20), dtype=np.float32) * 1000
+        countries = np.zeros((20, 20), dtype=np.uint16)
+        countries[:, 5:10] = 1
+        countries[:, 10:15] = 2
+
+        total, by_country = population_by_country(_grid(population), self._country_grid(countries), 0.0, 0.0, 500.0)
+
+        assert total == population_in_circle(_grid(population), 0.0, 0.0, 500.0)
+        west = population * (countries == 1)
+        east = population * (countries == 2)
+        assert by_country == {
+            1: _brute_force(west, 0.0, 0.0, 500.0),
+            2: _brute_force(east, 0.0, 0.0, 500.0),
+        }
+
+    def test_countries_outside_circle_are_omitted(self) -> None:
+        countries = np.zeros((20, 20), dtype=np.uint16)
+        countries[:, :2] = 1
+        countries[:, 18:] = 2
+        total, by_country = population_by_country(
+            _grid(np.ones((20, 20), dtype=np.float32)), self._country_grid(countries), 0.0, 0.0, 300.0
+        )
+        assert total > 0
+        assert by_country == {}
+
+    def test_rejects_misaligned_grid(self) -> None:
+        with pytest.raises(ValueError):
+            population_by_country(
+                _grid(np.ones((20, 20), dtype=np.float32)),
+                self._country_grid(np.zeros((10, 10), dtype=np.uint16)),
+                0.0,
+                0.0,
+                100.0,
+            )
+
+
+class TestPopulationInCirclePerGrid:
+    def test_matches_each_grid_alone(self) -> None:
+        rng = np.random.default_rng(0)
+        grids = [_grid(rng.random((20, 20), dtype=np.float32) * 1000) for _ in range(3)]
+        assert population_in_circle_per_grid(grids, 1.5, -2.5, 600.0) == [
+            population_in_circle(grid, 1.5, -2.5, 600.0) for grid in grids
+        ]
+
+    def test_rejects_misaligned_grids(self) -> None:
+        with pytest.raises(ValueError):
+            population_in_circle_per_grid(
+                [_grid(np.ones((20, 20), dtype=np.float32)), _grid(np.ones((10, 10), dtype=np.float32))],
+                0.0,
+                0.0,
+                100.0,
+            )
+
+
+def test_country_breakdown_and_years_are_exclusive() -> None:
+    circle = {"latitude": 0.0, "longitude": 0.0, "radius_km": 100.0}
+    assert GameConfig.model_validate({**circle, "years": [2000]}).years == [2000]
+    with pytest.raises(ValidationError):
+        GameConfig.model_validate({**circle, "by_country": True, "years": [2000]})
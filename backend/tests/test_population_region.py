@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from worldguess.grid_files import Grid, GridTransform
+from worldguess.queries.population_region import (
+    RegionMaskCache,
+    RegionTooComplexError,
+    geometry_hash,
+    population_in_mask,
+    rasterize_region,
+)
+from worldguess.schemas import MAX_REGION_POSITIONS, RegionConfig
+
+# One degree pixels covering lon [-10, 10), lat (-10, 10]
+TRANSFORM = GridTransform(west=-10.0, north=10.0, pixel_width=1.0, pixel_height=1.0)
+
+Polygons = list[list[list[tuple[float, float]]]]
+
+SQUARE: list[list[tuple[float, float]]] = [[(-3.2, -3.2), (3.2, -3.2), (3.2, 3.2), (-3.2, 3.2), (-3.2, -3.2)]]
+SQUARE_WITH_HOLE: list[list[tuple[float, float]]] = [
+    SQUARE[0],
+    [(-1.2, -1.2), (1.2, -1.2), (1.2, 1.2), (-1.2, 1.2), (-1.2, -1.2)],
+]
+TRIANGLE: list[list[tuple[float, float]]] = [[(4.1, 8.7), (9.6, -2.3), (-6.4, 1.9), (4.1, 8.7)]]
+
+
+def _grid(array: np.ndarray) -> Grid:
+    return Grid(name="test", array=array, transform=TRANSFORM, metadata={"data_version": "1"})
+
+
+def _inside(polygons: Polygons, longitude: float, latitude: float) -> bool:
+    """Even-odd point in polygon test over every ring."""
+    inside = False
+    for polygon in polygons:
+        for ring in polygon:
+            for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+                if (y0 <= latitude) != (y1 <= latitude):
+                    if longitude < x0 + (latitude - y0) / (y1 - y0) * (x1 - x0):
+                        inside = not inside
+    return inside
+
+
+def _brute_force(array: np.ndarray, polygons: Polygons) -> int:
+    total = 0.0
+    for row in range(array.shape[0]):
+        for column in range(array.shape[1]):
+            if _inside(polygons, TRANSFORM.west + column + 0.5, TRANSFORM.north - row - 0.5):
+                total += float(array[row, column])
+    return round(total)
+
+
+class TestRasterizeRegion:
+    @pytest.mark.parametrize(
+        "polygons",
+        [
+            [SQUARE],
+            [SQUARE_WITH_HOLE],
+            [TRIANGLE],
+            [SQUARE, TRIANGLE[:1]],
+            [[[(-20.0, -20.0), (20.0, -20.0), (0.0, 20.0), (-20.0, -20.0)]]],
+        ],
+    )
+    def test_matches_brute_force(self, polygons: Polygons) -> None:
+        array = np.random.default_rng(0).random((20, 20), dtype=np.float32) * 1000
+        grid = _grid(array)
+        assert population_in_mask(grid, rasterize_region(polygons, grid)) == _brute_force(array, polygons)
+
+    def test_region_outside_grid(self) -> None:
+        grid = _grid(np.ones((20, 20), dtype=np.float32))
+        mask = rasterize_region([[[(50.0, 50.0), (60.0, 50.0), (60.0, 60.0), (50.0, 50.0)]]], grid)
+        assert population_in_mask(grid, mask) == 0
+
+    def test_rejects_regions_crossing_too_many_rows(self) -> None:
+        grid = _grid(np.ones((20, 20), dtype=np.float32))
+        # Two edges spanning 6 rows each
+        with pytest.raises(RegionTooComplexError):
+            rasterize_region([SQUARE], grid, max_crossings=11)
+        assert population_in_mask(grid, rasterize_region([SQUARE], grid, max_crossings=12)) == 36
+
+
+class TestRegionMaskCache:
+    def test_reuses_masks_of_equal_geometries(self) -> None:
+        grid = _grid(np.ones((20, 20), dtype=np.float32))
+        cache = RegionMaskCache(max_bytes=1024 * 1024)
+        first = cache.get_or_rasterize([SQUARE], grid)
+        assert cache.get_or_rasterize([[[(float(x), float(y)) for x, y in SQUARE[0]]]], grid) is first
+        assert cache.get_or_rasterize([TRIANGLE], grid) is not first
+
+    def test_hash_depends_on_rings(self) -> None:
+        assert geometry_hash([SQUARE]) != geometry_hash([SQUARE_WITH_HOLE])
+        assert geometry_hash([SQUARE, TRIANGLE]) != geometry_hash([SQUARE + TRIANGLE])
+
+
+class TestRegionConfig:
+    def test_polygon_and_multipolygon(self) -> None:
+        polygon = RegionConfig.model_validate({"geometry": {"type": "Polygon", "coordinates": SQUARE}})
+        multi = RegionConfig.model_validate({"geometry": {"type": "MultiPolygon", "coordinates": [SQUARE, TRIANGLE]}})
+        assert polygon.polygons() == [SQUARE]
+        assert multi.polygons() == [SQUARE, TRIANGLE]
+
+    def test_rejects_mismatched_type(self) -> None:
+        with pytest.raises(ValidationError):
+            RegionConfig.model_validate({"geometry": {"type": "MultiPolygon", "coordinates": SQUARE}})
+
+    def test_rejects_short_ring(self) -> None:
+        with pytest.raises(ValidationError):
+            RegionConfig.model_validate({"geometry": {"type": "Polygon", "coordinates": [SQUARE[0][:3]]}})
+
+    def test_rejects_too_many_positions(self) -> None:
+        ring = [(-3.0 + 6.0 * i / MAX_REGION_POSITIONS, (i % 2) * 1.0) for i in range(MAX_REGION_POSITIONS)]
+        with pytest.raises(ValidationError):
+            RegionConfig.model_validate({"geometry": {"type": "Polygon", "coordinates": [[*ring, ring[0]]]}})
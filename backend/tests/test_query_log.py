@@ -0,0 +1,95 @@
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+
+from worldguess.query_log import (
+    QueryLog,
+    QueryLogWriter,
+    QueryOutcome,
+    QueryRecord,
+    most_frequent_circles,
+    read_query_log,
+)
+
+
+def _record(timestamp: int, latitude: float, outcome: QueryOutcome = QueryOutcome.COMPUTED) -> QueryRecord:
+    return QueryRecord(timestamp, latitude, 2.352222, 100.5, 12.5, outcome)
+
+
+class TestQueryLog:
+    def test_reads_back_appended_records(self, tmp_path: Path) -> None:
+        query_log = QueryLog(tmp_path / "population.log", max_bytes=1024 * 1024)
+        records = [_record(1, 48.856613), _record(2, -33.868820, QueryOutcome.CACHE_HIT)]
+        for record in records:
+            query_log.append(record)
+        assert list(read_query_log(query_log.path)) == records
+
+    def test_rotates_beyond_max_bytes(self, tmp_path: Path) -> None:
+        query_log = QueryLog(tmp_path / "population.log", max_bytes=100)
+        for timestamp in range(10):
+            query_log.append(_record(timestamp, 48.856613))
+        assert (tmp_path / "population.log.1").exists()
+        timestamps = [record.timestamp for record in read_query_log(query_log.path)]
+        assert timestamps == sorted(timestamps)
+        assert timestamps[-1] == 9
+        assert len(timestamps) < 10
+
+    def test_skips_partial_record(self, tmp_path: Path) -> None:
+        query_log = QueryLog(tmp_path / "population.log", max_bytes=1024 * 1024)
+        query_log.append(_record(1, 48.856613))
+        with open(query_log.path, "ab") as log_file:
+            log_file.write(b"\x01\x02\x03")
+        assert len(list(read_query_log(query_log.path))) == 1
+
+
+
+class BlockedQueryLog(QueryLog):
+    """Holds its writer in the first write until released."""
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path, max_bytes=1024 * 1024)
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def extend(self, records: Iterable[QueryRecord]) -> None:
+        self.writing.set()
+        self.release.wait()
+        super().extend(records)
+
+
+class TestQueryLogWriter:
+    def test_writes_submitted_records_in_order(self, tmp_path: Path) -> None:
+        writer = QueryLogWriter(QueryLog(tmp_path / "population.log", max_bytes=1024 * 1024))
+        records = [_record(timestamp, 48.856613) for timestamp in range(100)]
+        for record in records:
+            assert writer.submit(record)
+        writer.flush()
+        assert list(read_query_log(writer.query_log.path)) == records
+
+    def test_drops_records_beyond_max_pending(self, tmp_path: Path) -> None:
+        query_log = BlockedQueryLog(tmp_path / "population.log")
+        writer = QueryLogWriter(query_log, max_pending=2)
+        assert writer.submit(_record(1, 48.856613))
+        assert query_log.writing.wait(timeout=5)
+        assert writer.submit(_record(2, 48.856613)) and writer.submit(_record(3, 48.856613))
+        assert not writer.submit(_record(4, 48.856613))
+        query_log.release.set()
+        writer.flush()
+        assert [record.timestamp for record in read_query_log(query_log.path)] == [1, 2, 3]
+
+    def test_keeps_writing_after_a_failed_write(self, tmp_path: Path) -> None:
+        query_log = QueryLog(tmp_path / "missing" / "population.log", max_bytes=1024 * 1024)
+        writer = QueryLogWriter(query_log)
+        writer.submit(_record(1, 48.856613))
+        writer.flush()
+        (tmp_path / "missing").mkdir()
+        writer.submit(_record(2, 48.856613))
+        writer.flush()
+        assert [record.timestamp for record in read_query_log(query_log.path)] == [2]
+
+
+def test_most_frequent_circles_within_window() -> None:
+    records = [_record(100, 1.0), _record(100, 2.0), _record(101, 2.0), _record(10, 3.0), _record(11, 3.0)]
+    records += [_record(12, 3.0)]
+    assert most_frequent_circles(records, since=50, limit=5) == [(2.0, 2.352222, 100.5), (1.0, 2.352222, 100.5)]
+    assert most_frequent_circles(records, since=0, limit=1) == [(3.0, 2.352222, 100.5)]
@@ -0,0 +1,33 @@
+import asyncio
+from datetime import datetime
+from typing import Any
+
+import pytest
+from pymemcache.exceptions import MemcacheUnexpectedCloseError
+
+from worldguess import reaper
+from worldguess.dependencies import DummyMemcachedClient
+from worldguess.reaper import ExpiredChallenge
+
+
+class BrokenMemcached(DummyMemcachedClient):
+    def delete(self, key: str) -> bool:
+        raise MemcacheUnexpectedCloseError()
+
+
+def test_expired_challenges_are_published_while_memcached_is_down(monkeypatch: pytest.MonkeyPatch) -> None:
+    expired = [ExpiredChallenge(challenge_id, None, None, None) for challenge_id in ("c1", "c2")]
+    published: list[str] = []
+
+    def delete_expired_batch(cutoff: datetime, batch_size: int) -> list[ExpiredChallenge]:
+        return expired
+
+    async def publish_challenge_event(challenge_id: str, event_type: str, data: dict[str, Any]) -> None:
+        published.append(challenge_id)
+
+    monkeypatch.setattr(reaper, "_delete_expired_batch", delete_expired_batch)
+    monkeypatch.setattr(reaper, "memcached", BrokenMemcached)
+    monkeypatch.setattr(reaper, "publish_challenge_event", publish_challenge_event)
+
+    assert asyncio.run(reaper.reap_expired_challenges()) == 2
+    assert published == ["c1", "c2"]
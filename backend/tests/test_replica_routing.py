@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from sqlalchemy import Engine, create_engine, text
+
+from worldguess.database import ReplicaRouter, parse_replica_hosts
+
+
+def _unreachable_engine(tmp_path: Path) -> Engine:
+    return create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+
+
+class TestReplicaRouter:
+    def test_parse_replica_hosts(self) -> None:
+        assert parse_replica_hosts("replica-1, replica-2:5433,", 5432) == [("replica-1", 5432), ("replica-2", 5433)]
+        assert parse_replica_hosts("", 5432) == []
+
+    def test_without_replicas_uses_primary(self) -> None:
+        primary = create_engine("sqlite://")
+        router = ReplicaRouter(primary, [], retry_seconds=10)
+        with router.session() as session:
+            assert session.get_bind() is primary
+
+    def test_round_robin_over_replicas(self) -> None:
+        primary = create_engine("sqlite://")
+        replicas = [create_engine("sqlite://"), create_engine("sqlite://")]
+        router = ReplicaRouter(primary, replicas, retry_seconds=10)
+        binds = []
+        for _ in range(4):
+            with router.session() as session:
+                binds.append(session.get_bind())
+        assert binds == replicas * 2
+
+    def test_unhealthy_replica_falls_back(self, tmp_path: Path) -> None:
+        primary = create_engine("sqlite://")
+        broken = _unreachable_engine(tmp_path)
+        router = ReplicaRouter(primary, [broken], retry_seconds=10)
+        with router.session() as session:
+            assert session.get_bind() is primary
+            assert session.execute(text("SELECT 1")).scalar() == 1
+        # Skipped without another connection attempt until the retry delay passes
+        assert router.candidates() == [primary]
+
+    def test_unhealthy_replica_is_retried(self, tmp_path: Path) -> None:
+        primary = create_engine("sqlite://")
+        broken = _unreachable_engine(tmp_path)
+        router = ReplicaRouter(primary, [broken], retry_seconds=0)
+        router.mark_unhealthy(broken)
+        assert router.candidates() == [broken, primary]
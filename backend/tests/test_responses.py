@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any
+
+from starlette.datastructures import Headers
+from starlette.types import Message, Receive, Scope, Send
+
+from worldguess.responses import APIGZipMiddleware
+
+EVENT = b"data: " + b"x" * 2048 + b"\n\n"
+
+
+def _scope(path: str) -> dict[str, Any]:
+    return {"type": "http", "path": path, "method": "GET", "headers": [(b"accept-encoding", b"gzip")]}
+
+
+async def _receive() -> Message:
+    await asyncio.Event().wait()
+    return {"type": "http.disconnect"}
+
+
+def _run(content_type: bytes) -> tuple[list[Message], int]:
+    """Streams two large chunks, returns what reached the client and how much of it had before the second chunk."""
+    received: list[Message] = []
+    sent_before_second_chunk = 0
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        nonlocal sent_before_second_chunk
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        await send({"type": "http.response.body", "body": EVENT, "more_body": True})
+        sent_before_second_chunk = len(received)
+        await send({"type": "http.response.body", "body": EVENT, "more_body": False})
+
+    async def send(message: Message) -> None:
+        received.append(message)
+
+    asyncio.run(APIGZipMiddleware(app)(_scope("/v1/challenge/1/events"), _receive, send))
+    return received, sent_before_second_chunk
+
+
+def test_event_stream_is_sent_uncompressed_and_unbuffered() -> None:
+    received, sent_before_second_chunk = _run(b"text/event-stream")
+    assert "content-encoding" not in Headers(raw=received[0]["headers"])
+    assert sent_before_second_chunk == 2
+    assert [message["body"] for message in received[1:]] == [EVENT, EVENT]
+
+
+def test_large_json_is_gzipped() -> None:
+    received, _ = _run(b"application/json")
+    assert Headers(raw=received[0]["headers"])["content-encoding"] == "gzip"
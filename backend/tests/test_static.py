@@ -0,0 +1,85 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from starlette.responses import Response
+
+from worldguess.static import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    PrecompressedStaticFiles,
+    negotiate_encoding,
+)
+
+INDEX = b"<!doctype html><html><body>" + b"<p>worldguess</p>" * 200 + b"</body></html>"
+
+
+def _get(static_files: PrecompressedStaticFiles, request_path: str, accept_encoding: bytes = b"gzip") -> Response:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": request_path,
+        "root_path": "",
+        "headers": [(b"accept-encoding", accept_encoding)],
+    }
+    return asyncio.run(static_files.get_response(static_files.get_path(scope), scope))
+
+
+def test_root_and_directories_serve_precompressed_index(tmp_path: Path) -> None:
+    (tmp_path / "index.html").write_bytes(INDEX)
+    (tmp_path / "about").mkdir()
+    (tmp_path / "about" / "index.html").write_bytes(INDEX)
+    static_files = PrecompressedStaticFiles(directory=str(tmp_path), html=True)
+    static_files.precompress()
+
+    for request_path in ("/", "/about/"):
+        response = _get(static_files, request_path)
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"] == f'{static_files.assets["index.html"].etag[:-1]}-gzip"'
+
+
+BOTH = {"br": b"b", "gzip": b"g"}
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "available", "expected"),
+    [
+        (None, BOTH, None),
+        ("gzip, br", {}, None),
+        ("gzip, deflate, br", BOTH, "br"),
+        ("gzip, br", {"gzip": b"g"}, "gzip"),
+        ("br;q=0.5, gzip", BOTH, "gzip"),
+        ("br;q=0, gzip", BOTH, "gzip"),
+        ("gzip;q=0", {"gzip": b"g"}, None),
+        ("GZIP;q=0.8", BOTH, "gzip"),
+        ("identity", BOTH, None),
+        ("*", BOTH, "br"),
+        ("*, br;q=0", BOTH, "gzip"),
+        ("br;q=oops, gzip;q=0.1", BOTH, "gzip"),
+    ],
+)
+def test_negotiate_encoding(accept_encoding: str | None, available: dict[str, bytes], expected: str | None) -> None:
+    assert negotiate_encoding(accept_encoding, available) == expected
+
+
+def test_only_hashed_assets_are_cached_as_immutable(tmp_path: Path) -> None:
+    (tmp_path / "index.html").write_bytes(INDEX)
+    (tmp_path / "static").mkdir()
+    (tmp_path / "static" / "main.1a2b3c4d.js").write_bytes(INDEX)
+    static_files = PrecompressedStaticFiles(directory=str(tmp_path), html=True)
+    static_files.precompress()
+
+    assert _get(static_files, "/static/main.1a2b3c4d.js").headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert _get(static_files, "/index.html").headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    assert _get(static_files, "/").headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+
+def test_uncompressed_response_when_no_encoding_is_acceptable(tmp_path: Path) -> None:
+    (tmp_path / "index.html").write_bytes(INDEX)
+    static_files = PrecompressedStaticFiles(directory=str(tmp_path), html=True)
+    static_files.precompress()
+
+    response = _get(static_files, "/index.html", accept_encoding=b"gzip;q=0")
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == static_files.assets["index.html"].etag
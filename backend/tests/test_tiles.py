@@ -0,0 +1,75 @@
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from worldguess.chunked_grid import ChunkCache, ChunkedArray, write_chunked_grid
+from worldguess.grid_files import Grid, GridTransform
+from worldguess.routes.tiles import _load_density_tile
+from worldguess.settings import get_settings
+from worldguess.tiles import TILE_SIZE, DiskTileCache, render_density_tile, tile_path
+
+# Ten degree pixels covering the whole world
+TRANSFORM = GridTransform(west=-180.0, north=90.0, pixel_width=10.0, pixel_height=10.0)
+
+
+def _pixels(content: bytes) -> np.ndarray:
+    return np.asarray(Image.open(io.BytesIO(content)))
+
+
+class TestRenderDensityTile:
+    def test_empty_grid_is_transparent(self) -> None:
+        pixels = _pixels(render_density_tile(np.zeros((18, 36), dtype=np.float32), TRANSFORM, 0, 0, 0))
+        assert pixels.shape == (TILE_SIZE, TILE_SIZE, 4)
+        assert not pixels[..., 3].any()
+
+    def test_populated_pixel_is_drawn_where_it_lies(self) -> None:
+        array = np.zeros((18, 36), dtype=np.float32)
+        # Lon [0, 10), lat (0, 10], north east of the origin
+        array[8, 18] = 1_000_000
+        pixels = _pixels(render_density_tile(array, TRANSFORM, 1, 1, 0))
+        opaque_rows, opaque_columns = np.nonzero(pixels[..., 3])
+        assert opaque_rows.size > 0
+        # Bottom left corner of the north east tile
+        assert opaque_rows.min() > TILE_SIZE * 3 // 4
+        assert opaque_columns.max() < TILE_SIZE // 4
+
+        other = _pixels(render_density_tile(array, TRANSFORM, 1, 0, 1))
+        assert not other[..., 3].any()
+
+
+class TestDiskTileCache:
+    def test_evicts_least_recently_used(self, tmp_path: Path) -> None:
+        cache = DiskTileCache(tmp_path, "1", max_bytes=25)
+        cache.put(0, 0, 0, b"a" * 10)
+        cache.put(1, 0, 0, b"b" * 10)
+        assert cache.get(0, 0, 0) == b"a" * 10
+        cache.put(1, 1, 0, b"c" * 10)
+
+        assert cache.get(1, 0, 0) is None
+        assert cache.get(0, 0, 0) == b"a" * 10
+        assert cache.get(1, 1, 0) == b"c" * 10
+
+    def test_removes_other_versions(self, tmp_path: Path) -> None:
+        DiskTileCache(tmp_path, "1", max_bytes=100).put(0, 0, 0, b"old")
+        cache = DiskTileCache(tmp_path, "2", max_bytes=100)
+        assert not (tmp_path / "1").exists()
+        assert cache.get(0, 0, 0) is None
+        assert not tile_path(tmp_path, "1", 0, 0, 0).exists()
+
+
+def test_chunked_grid_serves_low_zooms_from_the_pyramid_only(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("GRID_DIR", str(tmp_path))
+    monkeypatch.setenv("TILE_CACHE_DIR", str(tmp_path / "cache"))
+    get_settings.cache_clear()
+    try:
+        write_chunked_grid(np.ones((18, 36), dtype=np.float32), tmp_path / "population.chunks", "1")
+        array = ChunkedArray(tmp_path / "population.chunks", ChunkCache(1024 * 1024))
+        grid = Grid(name="population", array=array, transform=TRANSFORM, metadata={"data_version": "1"})
+        prerender_max_zoom = get_settings().TILE_PRERENDER_MAX_ZOOM
+        assert _load_density_tile(grid, "1", prerender_max_zoom, 0, 0) is None
+        assert _load_density_tile(grid, "1", prerender_max_zoom + 1, 0, 0) is not None
+    finally:
+        get_settings.cache_clear()
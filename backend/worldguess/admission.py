@@ -0,0 +1,145 @@
+"""Cost-based admission control for population queries.
+
+A query's cost is the number of population grid pixels it sums, estimated from the request before any work is done.
+Every worker charges admitted costs against its own token bucket, sized to what one process can compute, and sheds
+load with 503 once it is drained. On top of that each client gets a cost allowance per minute, counted in memcached
+so it holds across workers and instances, and is answered 429 beyond it. Both carry Retry-After.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections.abc import Callable
+
+from fastapi import HTTPException, Request
+from pymemcache.exceptions import MemcacheError
+
+from .dependencies import MemcachedClient, memcached
+from .settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# WorldPop 1 km grid, 30 arc seconds per pixel
+RASTER_PIXEL_DEGREES = 1 / 120
+EARTH_RADIUS_M = 6378137.0
+MAX_MERCATOR_LATITUDE = 85.0511287798
+RASTER_PIXEL_COUNT = round(360 / RASTER_PIXEL_DEGREES) * round(180 / RASTER_PIXEL_DEGREES)
+CLIENT_WINDOW_SECONDS = 60
+
+
+def circle_cost(latitude: float, radius_km: float) -> float:
+    """Grid pixels inside a Web Mercator circle.
+
+    The circle is round in Mercator meters, so it spans radius / R radians of longitude, and the same in latitude
+    shrunk by cos(latitude). Circles covering more than the whole grid cost the whole grid.
+    """
+    radius_degrees = math.degrees(radius_km * 1000 / EARTH_RADIUS_M)
+    latitude = max(-MAX_MERCATOR_LATITUDE, min(MAX_MERCATOR_LATITUDE, latitude))
+    area_degrees = math.pi * radius_degrees**2 * math.cos(math.radians(latitude))
+    return min(area_degrees / RASTER_PIXEL_DEGREES**2, RASTER_PIXEL_COUNT)
+
+
+def bounds_cost(west: float, south: float, east: float, north: float) -> float:
+    """Grid pixels inside a bounding box, an upper bound for any shape within it."""
+    return max(east - west, 0.0) * max(north - south, 0.0) / RASTER_PIXEL_DEGREES**2
+
+
+class TokenBucket:
+    """Cost budget of one worker, refilled at rate per second up to capacity."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, cost: float) -> float:
+        """Charge cost and return 0, or return the seconds until it could be charged.
+
+        A request costing more than the whole capacity is admitted once the bucket is full, it would never be
+        otherwise.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            needed = min(cost, self.capacity)
+            if self._tokens >= needed:
+                self._tokens -= cost
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+
+def charge_client(cache: MemcachedClient, client: str, cost: int, limit: int, now: float) -> float:
+    """Add cost to the client's count for the current window, 0 if within limit, else seconds until the next window.
+
+    The first request of a window is always admitted, however large. When memcached is unavailable clients are not
+    limited, the worker budgets still are.
+    """
+    window = int(now // CLIENT_WINDOW_SECONDS)
+    key = f"admission:{client}:{window}"
+    try:
+        total = cache.incr(key, cost)
+        if total is None:
+            if cache.add(key, str(cost), expire=CLIENT_WINDOW_SECONDS * 2, noreply=False):
+                return 0.0
+            # Another worker created the key first
+            total = cache.incr(key, cost)
+            if total is None:
+                return 0.0
+    except (MemcacheError, OSError) as e:
+        # ignore_exc only covers reads, writes still raise while memcached is down
+        logger.warning(f"Could not count client cost in memcached, admitting: {e}")
+        return 0.0
+    if int(total) <= limit or int(total) == cost:
+        return 0.0
+    return (window + 1) * CLIENT_WINDOW_SECONDS - now
+
+
+_bucket: TokenBucket | None = None
+
+
+def _get_bucket() -> TokenBucket:
+    global _bucket
+    if _bucket is None:
+        settings = get_settings()
+        _bucket = TokenBucket(settings.ADMISSION_COST_PER_SECOND, settings.ADMISSION_COST_BURST)
+    return _bucket
+
+
+def _client_id(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def admit(request: Request, cost: float) -> None:
+    """Raise 429 or 503 with Retry-After when a query of this cost may not run now.
+
+    The client's count is kept in memcached, it is charged in a thread so a slow memcached does not stall the loop.
+    """
+    settings = get_settings()
+    if settings.ADMISSION_CLIENT_COST_PER_MINUTE > 0:
+        client = _client_id(request)
+        retry_after = await asyncio.to_thread(
+            lambda: charge_client(
+                memcached(), client, math.ceil(cost), settings.ADMISSION_CLIENT_COST_PER_MINUTE, time.time()
+            )
+        )
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many expensive queries, try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    if settings.ADMISSION_COST_PER_SECOND > 0:
+        retry_after = _get_bucket().try_acquire(cost)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
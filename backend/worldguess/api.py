@@ -1,28 +1,70 @@
+import asyncio
+import contextlib
 import logging
 import os
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.exc import DBAPIError
 
-from .database import get_engine
-from .orm.tables import Base
+from .constants import POPULATION_GRID
+from .database import get_engine, is_query_canceled, warm_pool
+from .dependencies import memcached
+from .events import get_event_broker
+from .grids import get_grid, publish_shared_grids
+from .migrations import ensure_schema
+from .reaper import run_challenge_reaper
+from .responses import APIGZipMiddleware
 from .routes import main_router
 from .settings import get_settings
+from .static import PrecompressedStaticFiles
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(api: FastAPI) -> AsyncGenerator[None, None]:
+    reaper: asyncio.Task[None] | None = None
+    settings = get_settings()
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+
+    async def timed(step: str, function: Callable[[], object]) -> None:
+        step_started = time.perf_counter()
+        await asyncio.to_thread(function)
+        timings[step] = time.perf_counter() - step_started
+
     try:
-        # Create tables on startup
-        engine = get_engine()
-        Base.metadata.create_all(bind=engine)
+        if not os.path.isdir(settings.STATIC_DIR):
+            raise RuntimeError(
+                f"Static directory {settings.STATIC_DIR} does not exist, "
+                "make sure to build the frontend first with `npm run build`"
+            )
+        await timed("schema", lambda: ensure_schema(get_engine(), apply=settings.MIGRATE_ON_STARTUP))
+        await timed("database pool", warm_pool)
+        await timed("memcached", memcached)
+        await timed("static assets", static_files.precompress)
+        await timed("grids", lambda: get_grid(POPULATION_GRID))
+        step_started = time.perf_counter()
+        await get_event_broker().start()
+        timings["event broker"] = time.perf_counter() - step_started
+        if settings.CHALLENGE_TTL_SECONDS > 0:
+            reaper = asyncio.create_task(run_challenge_reaper())
+
+        breakdown = ", ".join(f"{step} {duration * 1000:.0f} ms" for step, duration in timings.items())
+        logger.info(f"Ready in {(time.perf_counter() - started) * 1000:.0f} ms ({breakdown})")
         yield
     finally:
-        pass
+        await get_event_broker().stop()
+        if reaper is not None:
+            reaper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await reaper
 
 
 settings = get_settings()
@@ -43,26 +85,42 @@ api.add_middleware(
     allow_headers=["*"],
 )
 
-api.include_router(main_router)
+api.add_middleware(APIGZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE)
 
-static_dir = settings.STATIC_DIR
-if not os.path.exists(static_dir):
-    print(f"Static directory {static_dir} does not exist, make sure to build the frontend first with `npm run build`")
-    exit(1)
 
-api.mount("", StaticFiles(directory=static_dir, html=True), name="static")
+@api.exception_handler(DBAPIError)
+async def handle_database_error(request: Request, error: DBAPIError) -> Response:
+    """A statement that ran past the request's deadline is a timeout, anything else stays a server error."""
+    if is_query_canceled(error):
+        return ORJSONResponse({"detail": "Query took too long"}, status_code=504)
+    raise error
+
+
+api.include_router(main_router)
+
+# The directory is checked in lifespan, importing the app stays cheap for every worker
+static_files = PrecompressedStaticFiles(directory=settings.STATIC_DIR, html=True, check_dir=False)
+api.mount("", static_files, name="static")
 
+logging.basicConfig(level=logging.DEBUG if settings.DEBUG else logging.INFO)
 logging.getLogger("uvicorn.error").setLevel(logging.WARNING)
 
 __all__ = ["api"]
 
 if __name__ == "__main__":
-    if settings.DEBUG:
-        logging.basicConfig(level=logging.DEBUG)
+    if settings.CHALLENGE_EVENTS_BROKER == "local" and settings.WORKERS > 1:
+        raise RuntimeError(
+            "CHALLENGE_EVENTS_BROKER=local only reaches event streams of the worker that published the event, "
+            "use postgres or leave it unset with WORKERS > 1"
+        )
+    if settings.WORKERS > 1 and settings.GRID_SHARING == "shm":
+        # Load grids once here, workers attach to the segments instead of reading their own copy
+        shared_grids = publish_shared_grids()
 
     uvicorn.run(
         "worldguess.api:api",
         host=settings.HOST,
         port=settings.PORT,
-        reload=settings.RELOAD,
+        reload=settings.RELOAD and settings.WORKERS == 1,
+        workers=settings.WORKERS,
     )
@@ -0,0 +1,46 @@
+"""Run blocking database work so it stops when the client that asked for it goes away."""
+
+import asyncio
+from collections.abc import Callable
+from typing import TypeVar
+
+from fastapi import HTTPException, Request
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from .database import cancel_running_query, is_query_canceled
+
+T = TypeVar("T")
+
+# Not sent to anyone, the client is gone, but shows up in access logs like nginx's
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body was read before the endpoint ran, the next ASGI message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def run_cancellable(request: Request, session: Session, work: Callable[[], T]) -> T:
+    """Run work in a thread and cancel its running statement if the client disconnects first.
+
+    The event loop stays free to notice the disconnect while the query runs. Once cancelled, the session's
+    transaction is rolled back when the request's session is closed and its connection goes back to the pool.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(work))
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnected.cancel()
+
+    if not task.done():
+        cancel_running_query(session)
+        try:
+            await task
+        except DBAPIError as e:
+            if not is_query_canceled(e):
+                raise
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    return task.result()
@@ -0,0 +1,267 @@
+"""Chunked, compressed storage of grids for hosts that cannot map a whole grid into memory.
+
+The pipeline writes every grid a second time as a .chunks file: fixed size chunks, each zlib compressed on its own
+and checksummed, behind an index giving their offsets. The API reads chunks on demand into an LRU cache of
+decompressed chunks with a byte budget, so RSS stays bounded while repeated queries of an area keep most of the
+speed of an in-memory array.
+
+Layout, little-endian: the magic, the format version and the length of a JSON header (dtype, shape, chunk shape,
+data version), the header, one index entry (offset, length, crc32 of the decompressed chunk) per chunk in row-major
+order, then the chunks. Edge chunks are padded with zeros to the full chunk shape, chunks of zeros only are not
+stored and have length 0.
+
+Only numpy is imported here so the pipeline can use it without the API settings.
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO
+
+import numpy as np
+import numpy.typing as npt
+
+MAGIC = b"WGCHUNKS"
+FORMAT_VERSION = 1
+CHUNK_SHAPE = (256, 256)
+COMPRESSION_LEVEL = 6
+CHUNKS_SUFFIX = ".chunks"
+
+_PREAMBLE = struct.Struct("<8sII")
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("crc32", "<u4")])
+
+
+class CorruptChunkError(ValueError):
+    pass
+
+
+def write_chunked_grid(
+    array: npt.NDArray[Any], path: Path, data_version: str | None, chunk_shape: tuple[int, int] = CHUNK_SHAPE
+) -> None:
+    """Write a 2D array as a chunk store, atomically so readers never open a partial file.
+
+    The array is read one row of chunks at a time, a memory-mapped .npy is never loaded whole.
+    """
+    height, width = array.shape
+    chunk_rows, chunk_columns = chunk_shape
+    rows_of_chunks = -(-height // chunk_rows)
+    columns_of_chunks = -(-width // chunk_columns)
+    header = json.dumps(
+        {
+            "dtype": array.dtype.str,
+            "shape": [height, width],
+            "chunk_shape": [chunk_rows, chunk_columns],
+            "data_version": data_version,
+        }
+    ).encode()
+    index = np.zeros(rows_of_chunks * columns_of_chunks, dtype=INDEX_DTYPE)
+
+    partial_path = path.with_suffix(path.suffix + ".partial")
+    with open(partial_path, "wb") as output:
+        output.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        output.write(header)
+        index_offset = output.tell()
+        output.write(index.tobytes())
+
+        for chunk_row in range(rows_of_chunks):
+            row = chunk_row * chunk_rows
+            band = np.asarray(array[row : row + chunk_rows])
+            padded = np.zeros((chunk_rows, columns_of_chunks * chunk_columns), dtype=array.dtype)
+            padded[: band.shape[0], :width] = band
+            for chunk_column in range(columns_of_chunks):
+                chunk = padded[:, chunk_column * chunk_columns : (chunk_column + 1) * chunk_columns]
+                if not chunk.any():
+                    continue
+                raw = np.ascontiguousarray(chunk).tobytes()
+                compressed = zlib.compress(raw, COMPRESSION_LEVEL)
+                entry = index[chunk_row * columns_of_chunks + chunk_column]
+                entry["offset"] = output.tell()
+                entry["length"] = len(compressed)
+                entry["crc32"] = zlib.crc32(raw)
+                output.write(compressed)
+
+        output.seek(index_offset)
+        output.write(index.tobytes())
+    os.replace(partial_path, path)
+
+
+def _read_header(chunks_file: BinaryIO, path: Path) -> dict[str, Any]:
+    magic, version, header_length = _PREAMBLE.unpack(chunks_file.read(_PREAMBLE.size))
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise CorruptChunkError(f"{path} is not a version {FORMAT_VERSION} chunk store")
+    header: dict[str, Any] = json.loads(chunks_file.read(header_length))
+    return header
+
+
+def read_chunked_header(path: Path) -> dict[str, Any]:
+    with open(path, "rb") as chunks_file:
+        return _read_header(chunks_file, path)
+
+
+class ChunkCache:
+    """Decompressed chunks of every open chunk store, evicted least recently used first beyond max_bytes.
+
+    Neighbours of the chunks a read touched are decompressed in the background, queries tend to move around the area
+    last queried.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, int], npt.NDArray[Any]] = OrderedDict()
+        self._size = 0
+        self._pending: set[tuple[str, int]] = set()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chunk-prefetch")
+
+    def get(self, key: tuple[str, int]) -> npt.NDArray[Any] | None:
+        with self._lock:
+            chunk = self._entries.get(key)
+            if chunk is not None:
+                self._entries.move_to_end(key)
+            return chunk
+
+    def put(self, key: tuple[str, int], chunk: npt.NDArray[Any]) -> None:
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = chunk
+            self._size += chunk.nbytes
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    def prefetch(self, store: "ChunkedArray", chunks: list[int]) -> None:
+        with self._lock:
+            missing = [
+                chunk
+                for chunk in chunks
+                if (store.cache_key, chunk) not in self._entries and (store.cache_key, chunk) not in self._pending
+            ]
+            self._pending.update((store.cache_key, chunk) for chunk in missing)
+        if missing:
+            self._prefetcher.submit(self._load, store, missing)
+
+    def _load(self, store: "ChunkedArray", chunks: list[int]) -> None:
+        for chunk in chunks:
+            try:
+                store.chunk(chunk)
+            except (OSError, CorruptChunkError):
+                # The read that needs the chunk raises the same error
+                pass
+            finally:
+                with self._lock:
+                    self._pending.discard((store.cache_key, chunk))
+
+
+class ChunkedArray:
+    """Read-only 2D array over a chunk store, indexed like the numpy array it was written from.
+
+    Supports integer and step-less slice indices, which is all the grid queries use. Every read returns a new array.
+    """
+
+    def __init__(self, path: Path, cache: ChunkCache) -> None:
+        with open(path, "rb") as chunks_file:
+            header = _read_header(chunks_file, path)
+            self.dtype = np.dtype(header["dtype"])
+            self.shape: tuple[int, int] = (header["shape"][0], header["shape"][1])
+            self.chunk_shape: tuple[int, int] = (header["chunk_shape"][0], header["chunk_shape"][1])
+            self.data_version: str | None = header["data_version"]
+            self._rows_of_chunks = -(-self.shape[0] // self.chunk_shape[0])
+            self._columns_of_chunks = -(-self.shape[1] // self.chunk_shape[1])
+            count = self._rows_of_chunks * self._columns_of_chunks
+            self._index = np.frombuffer(chunks_file.read(count * INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)
+        if self._index.size != count:
+            raise CorruptChunkError(f"{path} has a truncated index")
+        self.path = str(path)
+        # A store replaced by a new export at the same path must not be served the old one's cached chunks
+        self.cache_key = f"{path}@{self.data_version}"
+        self._file_descriptor = os.open(path, os.O_RDONLY)
+        self._cache = cache
+        self._zeros = np.zeros(self.chunk_shape, dtype=self.dtype)
+        self._zeros.flags.writeable = False
+        self._last_footprint: tuple[int, int, int, int] | None = None
+
+    def __del__(self) -> None:
+        if hasattr(self, "_file_descriptor"):
+            os.close(self._file_descriptor)
+
+    def chunk(self, chunk: int) -> npt.NDArray[Any]:
+        """A decompressed chunk, from the cache when it is there."""
+        offset, length, crc = self._index[chunk].tolist()
+        if length == 0:
+            return self._zeros
+        cached = self._cache.get((self.cache_key, chunk))
+        if cached is not None:
+            return cached
+
+        try:
+            raw = zlib.decompress(os.pread(self._file_descriptor, length, offset))
+        except zlib.error as e:
+            raise CorruptChunkError(f"Chunk {chunk} of {self.path} does not decompress: {e}") from e
+        if zlib.crc32(raw) != crc:
+            raise CorruptChunkError(f"Chunk {chunk} of {self.path} does not match its checksum")
+        decompressed: npt.NDArray[Any] = np.frombuffer(raw, dtype=self.dtype).reshape(self.chunk_shape)
+        self._cache.put((self.cache_key, chunk), decompressed)
+        return decompressed
+
+    def __getitem__(self, key: Any) -> npt.NDArray[Any]:
+        row_key, column_key = key if isinstance(key, tuple) else (key, slice(None))
+        row_start, row_stop, squeeze_rows = self._bounds(row_key, self.shape[0])
+        column_start, column_stop, squeeze_columns = self._bounds(column_key, self.shape[1])
+
+        result = np.zeros((row_stop - row_start, column_stop - column_start), dtype=self.dtype)
+        chunk_rows, chunk_columns = self.chunk_shape
+        if result.size:
+            first_chunk_row, last_chunk_row = row_start // chunk_rows, (row_stop - 1) // chunk_rows
+            first_chunk_column, last_chunk_column = column_start // chunk_columns, (column_stop - 1) // chunk_columns
+            for chunk_row in range(first_chunk_row, last_chunk_row + 1):
+                top = chunk_row * chunk_rows
+                start, stop = max(row_start, top), min(row_stop, top + chunk_rows)
+                for chunk_column in range(first_chunk_column, last_chunk_column + 1):
+                    left = chunk_column * chunk_columns
+                    column_from, column_to = max(column_start, left), min(column_stop, left + chunk_columns)
+                    chunk = self.chunk(chunk_row * self._columns_of_chunks + chunk_column)
+                    result[
+                        start - row_start : stop - row_start, column_from - column_start : column_to - column_start
+                    ] = chunk[start - top : stop - top, column_from - left : column_to - left]
+            footprint = (first_chunk_row, last_chunk_row, first_chunk_column, last_chunk_column)
+            # Queries read row by row, their neighbours only change when a read touches other chunks
+            if footprint != self._last_footprint:
+                self._last_footprint = footprint
+                self._cache.prefetch(self, self._ring(*footprint))
+
+        squeezed = [size for size, squeeze in zip(result.shape, (squeeze_rows, squeeze_columns)) if not squeeze]
+        return result.reshape(squeezed)
+
+    def _ring(self, first_row: int, last_row: int, first_column: int, last_column: int) -> list[int]:
+        """Chunks bordering a rectangle of chunks, longitude wraps around."""
+        ring = []
+        for chunk_row in range(max(first_row - 1, 0), min(last_row + 1, self._rows_of_chunks - 1) + 1):
+            for chunk_column in range(first_column - 1, last_column + 2):
+                if first_row <= chunk_row <= last_row and first_column <= chunk_column <= last_column:
+                    continue
+                ring.append(chunk_row * self._columns_of_chunks + chunk_column % self._columns_of_chunks)
+        return ring
+
+    @staticmethod
+    def _bounds(key: Any, size: int) -> tuple[int, int, bool]:
+        """[start, stop) of an index along one axis, and whether the axis is dropped from the result."""
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                raise IndexError("Chunked grids do not support slice steps")
+            start, stop, _ = key.indices(size)
+            return start, max(start, stop), False
+        index = int(key)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError(f"Index {key} is out of bounds for size {size}")
+        return index, index + 1, True
+
+
+GridArray = npt.NDArray[Any] | ChunkedArray
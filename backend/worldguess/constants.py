@@ -1 +1,7 @@
 PIPELINE_READYNESS_KEY = "pipelinestatus"
+# Name of the population grid exported by the pipeline, see grids.py
+POPULATION_GRID = "population"
+# Grids of the other WorldPop years, aligned with the population grid which has the latest year
+POPULATION_YEAR_GRID = POPULATION_GRID + "_{year}"
+# Country ID grid aligned with the population grid, 0 where no country is
+COUNTRY_GRID = "countries"
@@ -1,38 +1,191 @@
+import itertools
+import logging
+import threading
+import time
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Generator
 
-from sqlalchemy import Engine, create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import Connection, Engine, create_engine, event, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session, SessionTransaction, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from .settings import get_settings
+from .utils.database_url import build_database_url, driver_connect_args
+
+logger = logging.getLogger(__name__)
 
 _engine: Engine | None = None
 _session_factory: sessionmaker[Session] | None = None
+_replica_router: "ReplicaRouter | None" = None
+
+# Monotonic time in Session.info after which the request's statements are cancelled by Postgres
+DEADLINE_KEY = "deadline"
+QUERY_CANCELED_SQLSTATE = "57014"
+
+
+def pool_sizes(connection_budget: int, workers: int) -> tuple[int, int]:
+    """Split the global connection budget between workers, a third persistent and the rest overflow."""
+    per_worker = max(1, connection_budget // max(1, workers))
+    pool_size = max(1, per_worker // 3)
+    return pool_size, max(0, per_worker - pool_size)
+
+
+def _create_engine(host: str, port: int, connection_budget: int) -> Engine:
+    settings = get_settings()
+    pool_size, max_overflow = pool_sizes(connection_budget, settings.WORKERS)
+    database_url = build_database_url(
+        settings.POSTGRES_DRIVER,
+        settings.POSTGRES_USER,
+        settings.POSTGRES_PASSWORD,
+        host,
+        port,
+        settings.POSTGRES_DB,
+    )
+    return create_engine(
+        database_url,
+        connect_args=driver_connect_args(settings.POSTGRES_DRIVER, settings.POSTGRES_PREPARE_THRESHOLD),
+        pool_size=pool_size,  # Number of persistent connections
+        max_overflow=max_overflow,  # Additional connections when pool is full
+        pool_timeout=5,  # Seconds to wait for connection
+        pool_recycle=3600,  # Recycle connections after 1 hour
+        pool_pre_ping=True,  # Verify connections before using
+    )
 
 
 def get_engine() -> Engine:
     global _engine
     if _engine is None:
         settings = get_settings()
-        database_url = f"postgresql+psycopg2://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
-        _engine = create_engine(
-            database_url,
-            pool_size=20,  # Number of persistent connections
-            max_overflow=40,  # Additional connections when pool is full
-            pool_timeout=5,  # Seconds to wait for connection
-            pool_recycle=3600,  # Recycle connections after 1 hour
-            pool_pre_ping=True,  # Verify connections before using
-        )
+        _engine = _create_engine(settings.POSTGRES_HOST, settings.POSTGRES_PORT, settings.DB_CONNECTION_BUDGET)
     return _engine
 
 
+def parse_replica_hosts(replica_hosts: str, default_port: int) -> list[tuple[str, int]]:
+    """Parse a comma separated list of host or host:port entries."""
+    hosts = []
+    for entry in replica_hosts.split(","):
+        host, _, port = entry.strip().partition(":")
+        if host:
+            hosts.append((host, int(port) if port else default_port))
+    return hosts
+
+
+class ReplicaRouter:
+    """Hands out sessions for read-only queries, spread round-robin over the replicas.
+
+    A replica that fails to connect is skipped for retry_seconds, the primary serves reads when no replica is
+    healthy.
+    """
+
+    def __init__(self, primary: Engine, replicas: list[Engine], retry_seconds: float) -> None:
+        self.primary = primary
+        self.replicas = replicas
+        self.retry_seconds = retry_seconds
+        self._unhealthy_until: dict[Engine, float] = {}
+        self._next = itertools.cycle(range(len(replicas))) if replicas else None
+        self._lock = threading.Lock()
+
+    def candidates(self) -> list[Engine]:
+        """Healthy replicas starting at the next one in turn, then the primary."""
+        if self._next is None:
+            return [self.primary]
+        with self._lock:
+            start = next(self._next)
+        now = time.monotonic()
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [engine for engine in ordered if self._unhealthy_until.get(engine, 0.0) <= now] + [self.primary]
+
+    def mark_unhealthy(self, engine: Engine) -> None:
+        self._unhealthy_until[engine] = time.monotonic() + self.retry_seconds
+
+    def session(self, info: dict[str, Any] | None = None) -> Session:
+        session_factory = get_session_factory()
+        for engine in self.candidates():
+            session = session_factory(bind=engine, info=info)
+            if engine is self.primary:
+                return session
+            try:
+                # Connect now so an unreachable replica falls through to the next candidate
+                session.connection()
+                return session
+            except OperationalError as e:
+                session.close()
+                self.mark_unhealthy(engine)
+                logger.warning(f"Read replica {engine.url.host}:{engine.url.port} unavailable, skipping it: {e}")
+        raise RuntimeError("No database engine available")  # pragma: no cover - the primary is always a candidate
+
+
+def get_replica_router() -> ReplicaRouter:
+    global _replica_router
+    if _replica_router is None:
+        settings = get_settings()
+        replicas = [
+            _create_engine(host, port, settings.REPLICA_CONNECTION_BUDGET)
+            for host, port in parse_replica_hosts(settings.POSTGRES_REPLICA_HOSTS, settings.POSTGRES_PORT)
+        ]
+        _replica_router = ReplicaRouter(get_engine(), replicas, settings.REPLICA_RETRY_SECONDS)
+    return _replica_router
+
+
+def warm_pool() -> None:
+    """Open the persistent connections up front so the first requests do not pay for connecting."""
+    engine = get_engine()
+    pool_size = engine.pool.size() if isinstance(engine.pool, QueuePool) else 1
+    connections = []
+    try:
+        for _ in range(pool_size):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def _apply_deadline(session: Session, transaction: SessionTransaction, connection: Connection) -> None:
+    """Limit every transaction of a session with a deadline to the time left, as a transaction-local timeout."""
+    deadline = session.info.get(DEADLINE_KEY)
+    if deadline is None:
+        return
+    remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+    connection.execute(text("SELECT set_config('statement_timeout', :timeout, true)"), {"timeout": str(remaining_ms)})
+
+
 def get_session_factory() -> sessionmaker[Session]:
     global _session_factory
     if _session_factory is None:
         _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+        event.listen(_session_factory, "after_begin", _apply_deadline)
     return _session_factory
 
 
+def request_session_info() -> dict[str, Any]:
+    """Session.info for a request's session, carrying its query deadline when one is configured."""
+    timeout = get_settings().QUERY_TIMEOUT_SECONDS
+    return {DEADLINE_KEY: time.monotonic() + timeout} if timeout > 0 else {}
+
+
+def is_query_canceled(error: DBAPIError) -> bool:
+    """Whether Postgres cancelled the statement, for a statement_timeout or a cancel request."""
+    # psycopg exposes the SQLSTATE as sqlstate, psycopg2 as pgcode
+    code = getattr(error.orig, "sqlstate", None) or getattr(error.orig, "pgcode", None)
+    return bool(code == QUERY_CANCELED_SQLSTATE)
+
+
+def cancel_running_query(session: Session) -> None:
+    """Ask the server to cancel the statement a session is running in another thread.
+
+    Both drivers send the cancel request over a separate connection, so this is safe while the statement blocks.
+    """
+    if not session.in_transaction():
+        return
+    dbapi_connection = session.connection().connection.dbapi_connection
+    cancel = getattr(dbapi_connection, "cancel", None)
+    if cancel is not None:
+        cancel()
+
+
 @contextmanager
 def get_session_context() -> Generator[Session, None, None]:
     session_factory = get_session_factory()
@@ -48,7 +201,16 @@ def get_session() -> Session:
 def get_db() -> Generator[Session, None, None]:
     """FastAPI dependency for database sessions."""
     session_factory = get_session_factory()
-    session = session_factory()
+    session = session_factory(info=request_session_info())
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def get_read_db() -> Generator[Session, None, None]:
+    """FastAPI dependency for read-only sessions, served by a replica when one is configured and healthy."""
+    session = get_replica_router().session(info=request_session_info())
     try:
         yield session
     finally:
@@ -1,6 +1,9 @@
 import logging
+import time
+from typing import TypeAlias
 
 import pymemcache
+from pymemcache.exceptions import MemcacheError
 
 from .settings import get_settings
 
@@ -13,23 +16,70 @@ class DummyMemcachedClient:
     def get(self, key: str) -> None:
         return None
 
-    def set(self, key: str, value: str, expire: int = 0) -> bool:
+    def set(self, key: str, value: str | bytes, expire: int = 0) -> bool:
         return True
 
+    def delete(self, key: str) -> bool:
+        return True
+
+    def add(self, key: str, value: str | bytes, expire: int = 0, noreply: bool | None = None) -> bool:
+        return True
+
+    def incr(self, key: str, value: int) -> int | None:
+        return None
+
     def version(self) -> bytes:
         return b"1.0.0"
 
 
-def memcached() -> pymemcache.Client | DummyMemcachedClient:
-    """Get memcached client or fallback dummy client if unavailable."""
+MemcachedClient: TypeAlias = pymemcache.PooledClient | DummyMemcachedClient
+
+_client: pymemcache.PooledClient | None = None
+# The dummy client used since a failed connect and the time.monotonic() to connect again at
+_fallback: tuple[DummyMemcachedClient, float] | None = None
+
+
+def memcached() -> MemcachedClient:
+    """Get the shared memcached client or fallback dummy client if unavailable.
+
+    The pooled client is created once per process, reads that fail after that are treated as cache misses. After a
+    failed connect the same dummy client is returned for MEMCACHE_RETRY_SECONDS before connecting again.
+    """
+    global _client, _fallback
+    if _client is not None:
+        return _client
+    if _fallback is not None and time.monotonic() < _fallback[1]:
+        return _fallback[0]
+    settings = get_settings()
     try:
-        client = pymemcache.Client(
-            get_settings().MEMCACHE_SERVER,
+        client = pymemcache.PooledClient(
+            settings.MEMCACHE_SERVER,
             timeout=1.0,
             connect_timeout=1.0,
+            ignore_exc=True,
         )
-        client.get("test")
+        client.version()
+        _client = client
+        _fallback = None
         return client
     except (ConnectionRefusedError, TimeoutError, OSError) as e:
-        logger.warning(f"Memcached unavailable, using dummy client: {e}")
-        return DummyMemcachedClient()
+        logger.warning(f"Memcached unavailable, using dummy client for {settings.MEMCACHE_RETRY_SECONDS}s: {e}")
+        dummy = _fallback[0] if _fallback is not None else DummyMemcachedClient()
+        _fallback = (dummy, time.monotonic() + settings.MEMCACHE_RETRY_SECONDS)
+        return dummy
+
+
+def cache_set(cache: MemcachedClient, key: str, value: str | bytes, expire: int = 0) -> None:
+    """Store a cache entry. ignore_exc only covers reads, a failed write is logged and the entry left uncached."""
+    try:
+        cache.set(key, value, expire=expire)
+    except (MemcacheError, OSError) as e:
+        logger.warning(f"Could not store {key} in memcached: {e}")
+
+
+def cache_delete(cache: MemcachedClient, key: str) -> None:
+    """Drop a cache entry, a failure is logged and the entry left to expire."""
+    try:
+        cache.delete(key)
+    except (MemcacheError, OSError) as e:
+        logger.warning(f"Could not delete {key} from memcached: {e}")
@@ -0,0 +1,174 @@
+import abc
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Generator
+from contextlib import contextmanager
+from typing import Any, Literal
+
+from pydantic import BaseModel
+from sqlalchemy import text
+
+from .database import get_engine
+from .settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+POSTGRES_CHANNEL = "worldguess_challenge_events"
+# NOTIFY payloads must be shorter than 8000 bytes
+POSTGRES_MAX_PAYLOAD = 7999
+
+ChallengeEventType = Literal["guess_submitted", "challenge_ended", "challenge_expired"]
+FINAL_EVENTS: set[ChallengeEventType] = {"challenge_ended", "challenge_expired"}
+
+
+class ChallengeEvent(BaseModel):
+    """Live update about a challenge pushed to subscribers."""
+
+    challenge_id: str
+    type: ChallengeEventType
+    data: dict[str, Any] = {}
+
+    @property
+    def is_final(self) -> bool:
+        return self.type in FINAL_EVENTS
+
+    def to_sse(self) -> str:
+        return f"event: {self.type}\ndata: {self.model_dump_json()}\n\n"
+
+
+class ChallengeEventHub:
+    """Fans out challenge events to the subscribers connected to this process."""
+
+    def __init__(self, queue_size: int = 100) -> None:
+        self.queue_size = queue_size
+        self._subscribers: defaultdict[str, set[asyncio.Queue[ChallengeEvent]]] = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, challenge_id: str) -> Generator[asyncio.Queue[ChallengeEvent], None, None]:
+        queue: asyncio.Queue[ChallengeEvent] = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[challenge_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[challenge_id].discard(queue)
+            if not self._subscribers[challenge_id]:
+                del self._subscribers[challenge_id]
+
+    def deliver(self, event: ChallengeEvent) -> None:
+        for queue in self._subscribers.get(event.challenge_id, ()):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than blocking everyone else
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def subscriber_count(self, challenge_id: str) -> int:
+        return len(self._subscribers.get(challenge_id, ()))
+
+
+class EventBroker(abc.ABC):
+    """Distributes published events to the hub of every API instance."""
+
+    def __init__(self, hub: ChallengeEventHub) -> None:
+        self.hub = hub
+
+    async def start(self) -> None:
+        """Start receiving events from other instances."""
+
+    async def stop(self) -> None:
+        """Stop receiving events from other instances."""
+
+    @abc.abstractmethod
+    async def publish(self, event: ChallengeEvent) -> None:
+        """Send an event to the subscribers of all instances."""
+
+
+class LocalBroker(EventBroker):
+    """Single instance stand-in that delivers straight to the local hub."""
+
+    async def publish(self, event: ChallengeEvent) -> None:
+        self.hub.deliver(event)
+
+
+class PostgresBroker(EventBroker):
+    """Cross-instance distribution through Postgres LISTEN/NOTIFY.
+
+    Every instance, including the publisher, receives the notification exactly once and delivers it to its own hub.
+    """
+
+    def __init__(self, hub: ChallengeEventHub) -> None:
+        super().__init__(hub)
+        self._connection: Any = None
+
+    async def start(self) -> None:
+        self._connection = get_engine().raw_connection()
+        driver_connection = self._connection.driver_connection
+        driver_connection.autocommit = True
+        with driver_connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {POSTGRES_CHANNEL}")
+        asyncio.get_running_loop().add_reader(driver_connection.fileno(), self._on_notify)
+
+    async def stop(self) -> None:
+        if self._connection is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._connection.driver_connection.fileno())
+        self._connection.invalidate()
+        self._connection = None
+
+    def _on_notify(self) -> None:
+        driver_connection = self._connection.driver_connection
+        if get_settings().POSTGRES_DRIVER == "psycopg":
+            # Drains what is already received without blocking the event loop
+            notifications = list(driver_connection.notifies(timeout=0))
+        else:
+            driver_connection.poll()
+            notifications = driver_connection.notifies[:]
+            driver_connection.notifies.clear()
+        for notification in notifications:
+            try:
+                self.hub.deliver(ChallengeEvent.model_validate_json(notification.payload))
+            except ValueError as e:
+                logger.error(f"Invalid challenge event payload: {e}")
+
+    async def publish(self, event: ChallengeEvent) -> None:
+        payload = event.model_dump_json()
+        if len(payload.encode()) > POSTGRES_MAX_PAYLOAD:
+            logger.warning(f"Challenge event too large for NOTIFY, delivering locally only: {event.type}")
+            self.hub.deliver(event)
+            return
+        await asyncio.to_thread(self._notify, payload)
+
+    @staticmethod
+    def _notify(payload: str) -> None:
+        with get_engine().begin() as connection:
+            connection.execute(
+                text("SELECT pg_notify(:channel, :payload)"), {"channel": POSTGRES_CHANNEL, "payload": payload}
+            )
+
+
+_hub = ChallengeEventHub()
+_broker: EventBroker | None = None
+
+
+def get_event_hub() -> ChallengeEventHub:
+    return _hub
+
+
+def get_event_broker() -> EventBroker:
+    global _broker
+    if _broker is None:
+        settings = get_settings()
+        broker = settings.CHALLENGE_EVENTS_BROKER or ("postgres" if settings.WORKERS > 1 else "local")
+        if broker == "postgres":
+            _broker = PostgresBroker(_hub)
+        else:
+            _broker = LocalBroker(_hub)
+    return _broker
+
+
+async def publish_challenge_event(challenge_id: str, event_type: ChallengeEventType, data: dict[str, Any]) -> None:
+    """Publish an event, failures are logged as live updates are best effort."""
+    try:
+        await get_event_broker().publish(ChallengeEvent(challenge_id=challenge_id, type=event_type, data=data))
+    except Exception as e:
+        logger.error(f"Failed to publish challenge event {event_type} for {challenge_id}: {e}")
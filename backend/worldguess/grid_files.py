@@ -0,0 +1,62 @@
+"""Grids as the pipeline exports them, a .npy array next to its .json metadata.
+
+Only numpy is imported here so the pipeline can use the grids and the queries over them without the API settings.
+"""
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .chunked_grid import GridArray
+
+
+@dataclass(frozen=True)
+class GridTransform:
+    """North-up geotransform of a lat/lon grid, pixel sizes in degrees."""
+
+    west: float
+    north: float
+    pixel_width: float
+    pixel_height: float
+
+
+@dataclass(frozen=True)
+class Grid:
+    """A raster aligned array exported by the pipeline, e.g. the population grid."""
+
+    name: str
+    array: GridArray
+    transform: GridTransform
+    metadata: dict[str, Any]
+
+    @property
+    def data_version(self) -> str | None:
+        version = self.metadata.get("data_version")
+        return str(version) if version is not None else None
+
+
+def read_grid_metadata(grid_dir: Path, name: str) -> dict[str, Any]:
+    with open(grid_dir / f"{name}.json") as metadata_file:
+        metadata: dict[str, Any] = json.load(metadata_file)
+    return metadata
+
+
+def transform_from_metadata(metadata: dict[str, Any]) -> GridTransform:
+    return GridTransform(
+        west=metadata["west"],
+        north=metadata["north"],
+        pixel_width=metadata["pixel_width"],
+        pixel_height=metadata["pixel_height"],
+    )
+
+
+def load_grid(grid_dir: Path, name: str) -> Grid | None:
+    """Memory-map a grid read-only, None when it has not been exported."""
+    if not (grid_dir / f"{name}.npy").exists() or not (grid_dir / f"{name}.json").exists():
+        return None
+    metadata = read_grid_metadata(grid_dir, name)
+    array = np.load(grid_dir / f"{name}.npy", mmap_mode="r")
+    return Grid(name=name, array=array, transform=transform_from_metadata(metadata), metadata=metadata)
@@ -0,0 +1,183 @@
+import atexit
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from .chunked_grid import CHUNKS_SUFFIX, ChunkCache, ChunkedArray, CorruptChunkError, GridArray
+from .grid_files import Grid, read_grid_metadata, transform_from_metadata
+from .settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Set by the parent process in multi-worker mode, maps grid names to shared memory segments
+SHARED_GRIDS_ENV = "WORLDGUESS_SHARED_GRIDS"
+# Copy to shared memory in chunks to keep the parent's RSS bounded while publishing
+COPY_CHUNK_ROWS = 1024
+# How often a loaded grid's files are checked for a new export
+GRID_CHECK_SECONDS = 60.0
+
+
+def available_grids(grid_dir: str | None = None) -> list[str]:
+    """Names of the grids exported to the grid directory."""
+    directory = Path(grid_dir or get_settings().GRID_DIR)
+    if not directory.is_dir():
+        return []
+    return sorted(path.stem for path in directory.glob("*.npy") if path.with_suffix(".json").exists())
+
+
+def publish_shared_grids(grid_dir: str | None = None, names: list[str] | None = None) -> list[SharedMemory]:
+    """Copy the grids named in SHARED_GRIDS, or names, into shared memory segments and advertise them to workers.
+
+    Other grids are memory-mapped by each worker. Called once by the parent before spawning workers. The returned
+    segments must stay referenced for the lifetime of the server, they are unlinked at exit.
+    """
+    settings = get_settings()
+    directory = Path(grid_dir or settings.GRID_DIR)
+    if names is None:
+        names = [name.strip() for name in settings.SHARED_GRIDS.split(",") if name.strip()]
+    segments: list[SharedMemory] = []
+    descriptors: dict[str, dict[str, Any]] = {}
+
+    for name in available_grids(str(directory)):
+        if name not in names:
+            continue
+        source = np.load(directory / f"{name}.npy", mmap_mode="r")
+        segment = SharedMemory(create=True, size=max(source.nbytes, 1))
+        target: npt.NDArray[Any] = np.ndarray(source.shape, dtype=source.dtype, buffer=segment.buf)
+        for start in range(0, source.shape[0], COPY_CHUNK_ROWS):
+            target[start : start + COPY_CHUNK_ROWS] = source[start : start + COPY_CHUNK_ROWS]
+        del target
+
+        segments.append(segment)
+        descriptors[name] = {
+            "shm_name": segment.name,
+            "shape": list(source.shape),
+            "dtype": source.dtype.str,
+            "data_version": read_grid_metadata(directory, name).get("data_version"),
+        }
+        logger.info(f"Published grid {name} {source.shape} ({source.nbytes / 1024**2:.0f} MiB) to shared memory")
+
+    def _cleanup() -> None:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+    atexit.register(_cleanup)
+    os.environ[SHARED_GRIDS_ENV] = json.dumps(descriptors)
+    return segments
+
+
+def _attach_shared(descriptor: dict[str, Any]) -> npt.NDArray[Any]:
+    segment = SharedMemory(name=descriptor["shm_name"])
+    # The parent owns the segment, keep this worker's resource tracker from unlinking it on exit
+    resource_tracker.unregister(segment._name, "shared_memory")  # type: ignore[attr-defined]
+    shape = tuple(descriptor["shape"])
+    array: npt.NDArray[Any] = np.ndarray(shape, dtype=np.dtype(descriptor["dtype"]), buffer=segment.buf)
+    array.flags.writeable = False
+    _attached_segments.append(segment)
+    return array
+
+
+def _open_chunked(grid_dir: Path, name: str, metadata: dict[str, Any]) -> ChunkedArray | None:
+    """The grid's chunk store, None when it is missing, unreadable or from another data version than the grid."""
+    global _chunk_cache
+    path = grid_dir / f"{name}{CHUNKS_SUFFIX}"
+    if not path.exists():
+        return None
+    if _chunk_cache is None:
+        _chunk_cache = ChunkCache(get_settings().GRID_CHUNK_CACHE_MAX_BYTES)
+    try:
+        array = ChunkedArray(path, _chunk_cache)
+    except (OSError, CorruptChunkError) as e:
+        logger.warning(f"Could not open chunk store of grid {name}: {e}")
+        return None
+    if array.data_version != metadata.get("data_version"):
+        logger.warning(f"Chunk store of grid {name} is from data version {array.data_version}, not using it")
+        return None
+    return array
+
+
+@dataclass
+class _LoadedGrid:
+    grid: Grid
+    # Inode and mtime of the files the grid was loaded from, the pipeline replaces them on export
+    files: tuple[tuple[int, int], ...]
+    checked_at: float
+
+
+def _file_signature(paths: list[Path]) -> tuple[tuple[int, int], ...]:
+    signature = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            signature.append((stat.st_ino, stat.st_mtime_ns))
+        except FileNotFoundError:
+            signature.append((0, 0))
+    return tuple(signature)
+
+
+def _load_grid(grid_dir: Path, name: str, storage: str) -> Grid | None:
+    if not (grid_dir / f"{name}.json").exists():
+        return None
+    metadata = read_grid_metadata(grid_dir, name)
+    shared = json.loads(os.environ.get(SHARED_GRIDS_ENV, "{}")).get(name)
+    array: GridArray | None = None
+    if storage == "chunked":
+        array = _open_chunked(grid_dir, name, metadata)
+    # The segments hold the grids exported when the server started, a newer export is mapped from its file instead
+    if array is None and shared is not None and shared.get("data_version") == metadata.get("data_version"):
+        array = _attach_shared(shared)
+    elif array is None and (grid_dir / f"{name}.npy").exists():
+        array = np.load(grid_dir / f"{name}.npy", mmap_mode="r")
+    if array is None:
+        return None
+    logger.info(f"Loaded grid {name} {array.shape} of data version {metadata.get('data_version')}")
+    return Grid(name=name, array=array, transform=transform_from_metadata(metadata), metadata=metadata)
+
+
+_attached_segments: list[SharedMemory] = []
+_chunk_cache: ChunkCache | None = None
+_grids: dict[str, _LoadedGrid] = {}
+
+
+def get_grid(name: str) -> Grid | None:
+    """The grid as last exported, None when the pipeline has not exported it.
+
+    Workers attach to the shared memory segment published by the parent when there is one. Otherwise the .npy file
+    is memory-mapped read-only, so all workers share the same page cache pages instead of private copies. With
+    GRID_STORAGE "chunked" the grid is read from its chunk store instead, through a cache of decompressed chunks.
+
+    A loaded grid is kept while its files are unchanged, they are checked at most every GRID_CHECK_SECONDS. A missing
+    grid is looked for again on every call.
+    """
+    now = time.monotonic()
+    loaded = _grids.get(name)
+    if loaded is not None and now - loaded.checked_at < GRID_CHECK_SECONDS:
+        return loaded.grid
+
+    settings = get_settings()
+    grid_dir = Path(settings.GRID_DIR)
+    watched = [grid_dir / f"{name}.json"]
+    if settings.GRID_STORAGE == "chunked":
+        # The chunk store is written after the grid, switch to it once it catches up
+        watched.append(grid_dir / f"{name}{CHUNKS_SUFFIX}")
+    files = _file_signature(watched)
+    if loaded is not None and loaded.files == files:
+        loaded.checked_at = now
+        return loaded.grid
+
+    grid = _load_grid(grid_dir, name, settings.GRID_STORAGE)
+    if grid is None:
+        _grids.pop(name, None)
+        return None
+    _grids[name] = _LoadedGrid(grid=grid, files=files, checked_at=now)
+    return grid
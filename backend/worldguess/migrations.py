@@ -0,0 +1,181 @@
+"""Versioned schema migrations for the tables the API owns.
+
+land_areas and population_raster are recreated by the pipeline on every data load and are not managed here. Each
+migration runs once, in its own transaction, and is recorded in schema_version. Run them with
+`python -m worldguess.migrations`, the pipeline and API startup also apply pending ones.
+"""
+
+import logging
+from dataclasses import dataclass
+
+from sqlalchemy import Connection, Engine, text
+
+logger = logging.getLogger(__name__)
+
+# Serializes migrations between API workers, replicas and the pipeline starting at the same time
+MIGRATION_LOCK_ID = 0x776F726C64  # "world"
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: tuple[str, ...]
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(
+        1,
+        "Baseline schema previously created by create_all",
+        (
+            "CREATE EXTENSION IF NOT EXISTS postgis",
+            "CREATE EXTENSION IF NOT EXISTS postgis_raster",
+            """
+            CREATE TABLE IF NOT EXISTS countries (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                geometry geometry(POLYGON)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_countries_geometry ON countries USING GIST (geometry)",
+            """
+            CREATE TABLE IF NOT EXISTS data_version (
+                id SERIAL PRIMARY KEY,
+                version_hash VARCHAR NOT NULL UNIQUE
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS challenges (
+                challenge_id VARCHAR PRIMARY KEY,
+                game_id VARCHAR NOT NULL,
+                latitude DOUBLE PRECISION NOT NULL,
+                longitude DOUBLE PRECISION NOT NULL,
+                radius_km DOUBLE PRECISION NOT NULL,
+                size_class VARCHAR,
+                webhook_url VARCHAR,
+                webhook_token VARCHAR,
+                webhook_extra_params JSON,
+                created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS challenge_guesses (
+                id SERIAL PRIMARY KEY,
+                challenge_id VARCHAR NOT NULL REFERENCES challenges (challenge_id),
+                username VARCHAR NOT NULL,
+                guess BIGINT NOT NULL,
+                created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+            )
+            """,
+        ),
+    ),
+    Migration(
+        2,
+        "Stored challenge population, one guess per user, cascading deletes and expiry index",
+        (
+            "ALTER TABLE challenges ADD COLUMN IF NOT EXISTS actual_population BIGINT",
+            "CREATE INDEX IF NOT EXISTS ix_challenges_created_at ON challenges (created_at)",
+            # Keep the first guess of each user, the unique constraint can not be added otherwise
+            """
+            DELETE FROM challenge_guesses g
+            USING challenge_guesses earlier
+            WHERE g.challenge_id = earlier.challenge_id AND g.username = earlier.username AND g.id > earlier.id
+            """,
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint WHERE conname = 'uq_challenge_guesses_challenge_id_username'
+                ) THEN
+                    ALTER TABLE challenge_guesses ADD CONSTRAINT uq_challenge_guesses_challenge_id_username
+                        UNIQUE (challenge_id, username);
+                END IF;
+            END $$
+            """,
+            "ALTER TABLE challenge_guesses DROP CONSTRAINT IF EXISTS challenge_guesses_challenge_id_fkey",
+            """
+            ALTER TABLE challenge_guesses ADD CONSTRAINT challenge_guesses_challenge_id_fkey
+                FOREIGN KEY (challenge_id) REFERENCES challenges (challenge_id) ON DELETE CASCADE
+            """,
+        ),
+    ),
+    Migration(
+        3,
+        "Country boundaries as WGS 84 multipolygons with ISO codes, loaded by the pipeline",
+        (
+            """
+            ALTER TABLE countries ALTER COLUMN geometry TYPE geometry(MULTIPOLYGON, 4326)
+                USING ST_Multi(ST_SetSRID(geometry, 4326))
+            """,
+            "ALTER TABLE countries ADD COLUMN IF NOT EXISTS iso_code VARCHAR",
+        ),
+    ),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(connection: Connection) -> int:
+    """Current schema version, 0 for a database that was never migrated."""
+    if connection.execute(text("SELECT to_regclass('schema_version') IS NOT NULL")).scalar() is not True:
+        return 0
+    return int(connection.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar_one())
+
+
+def migrate(engine: Engine) -> int:
+    """Apply pending migrations and return the resulting schema version."""
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+        connection.commit()
+        try:
+            with connection.begin():
+                connection.execute(
+                    text("""
+                        CREATE TABLE IF NOT EXISTS schema_version (
+                            version INTEGER PRIMARY KEY,
+                            description VARCHAR NOT NULL,
+                            applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now()
+                        )
+                    """)
+                )
+            # Read after taking the lock, another process may have just migrated
+            current_version = get_schema_version(connection)
+            connection.commit()
+
+            for migration in MIGRATIONS:
+                if migration.version <= current_version:
+                    continue
+                logger.info(f"Applying schema migration {migration.version}: {migration.description}")
+                with connection.begin():
+                    for statement in migration.statements:
+                        connection.execute(text(statement))
+                    connection.execute(
+                        text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                        {"version": migration.version, "description": migration.description},
+                    )
+                current_version = migration.version
+            return current_version
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+            connection.commit()
+
+
+def ensure_schema(engine: Engine, apply: bool = True) -> int:
+    """Cheap startup check, only takes the migration lock when the schema is behind."""
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+    if version >= LATEST_VERSION:
+        return version
+    if not apply:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}. "
+            "Run `python -m worldguess.migrations` first"
+        )
+    return migrate(engine)
+
+
+if __name__ == "__main__":
+    from .database import get_engine
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Schema is at version {migrate(get_engine())}")
@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from geoalchemy2 import Geometry, Raster, WKBElement
-from sqlalchemy import JSON, BigInteger, DateTime, Float, ForeignKey, String
+from sqlalchemy import JSON, BigInteger, DateTime, Float, ForeignKey, String, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -13,7 +13,8 @@ class Countries(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String)
-    geometry: Mapped[WKBElement] = mapped_column(Geometry(geometry_type="POLYGON"))
+    iso_code: Mapped[str | None] = mapped_column(String, nullable=True)
+    geometry: Mapped[WKBElement] = mapped_column(Geometry(geometry_type="MULTIPOLYGON", srid=4326))
 
 
 class PopulationRaster(Base):
@@ -49,13 +50,20 @@ class Challenge(Base):
     webhook_url: Mapped[str | None] = mapped_column(String, nullable=True)
     webhook_token: Mapped[str | None] = mapped_column(String, nullable=True)
     webhook_extra_params: Mapped[dict | None] = mapped_column(JSON, nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    actual_population: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
-    guesses: Mapped[list["ChallengeGuess"]] = relationship(back_populates="challenge", cascade="all, delete-orphan")
+    guesses: Mapped[list["ChallengeGuess"]] = relationship(
+        back_populates="challenge", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 
 class ChallengeGuess(Base):
     __tablename__ = "challenge_guesses"
+    __table_args__ = (
+        # Also serves challenge_id lookups, as it is the leading column
+        UniqueConstraint("challenge_id", "username", name="uq_challenge_guesses_challenge_id_username"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     challenge_id: Mapped[str] = mapped_column(
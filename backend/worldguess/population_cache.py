@@ -0,0 +1,162 @@
+"""Coalescing and caching of circle population results.
+
+Identical circles requested at the same time, as when a challenge link is shared, run one computation per process:
+the first request computes and the others await its result. Across processes and instances a memcached lease lets
+one of them compute while the others poll for the result it stores. Results are keyed by the normalized circle and
+the data version, so they stay valid until the pipeline loads new data.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Generic, TypeVar
+
+from fastapi import HTTPException
+from pymemcache.exceptions import MemcacheError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .cancellation import CLIENT_CLOSED_REQUEST
+from .constants import POPULATION_GRID
+from .dependencies import MemcachedClient, cache_delete, cache_set
+from .grids import get_grid
+from .orm.tables import DataVersion
+from .query_log import QUERY_LOG_NAME, QueryLog, QueryLogWriter, QueryOutcome, QueryRecord
+from .settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LEASE_POLL_SECONDS = 0.05
+DATA_VERSION_TTL_SECONDS = 60.0
+
+
+_data_version: tuple[float, str | None] | None = None
+
+
+def population_data_version(session: Session) -> str | None:
+    """Version of the data populations are computed from, the loaded grid's or the latest loaded into Postgres."""
+    global _data_version
+    grid = get_grid(POPULATION_GRID)
+    if grid is not None:
+        return grid.data_version
+
+    now = time.monotonic()
+    if _data_version is None or now - _data_version[0] > DATA_VERSION_TTL_SECONDS:
+        version = session.execute(select(DataVersion.version_hash).order_by(DataVersion.id.desc()).limit(1)).scalar()
+        _data_version = (now, version)
+    return _data_version[1]
+
+
+class _LeaderGone(Exception):
+    """The computing request went away before finishing, a waiting request takes over."""
+
+
+class SingleFlight(Generic[T]):
+    """At most one running computation per key in this process, concurrent callers share its outcome."""
+
+    def __init__(self) -> None:
+        self._flights: dict[str, asyncio.Future[T]] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                return await self._lead(key, compute)
+            try:
+                return await asyncio.shield(flight)
+            except _LeaderGone:
+                continue
+
+    async def _lead(self, key: str, compute: Callable[[], Awaitable[T]]) -> T:
+        flight: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        try:
+            result = await compute()
+        except BaseException as e:
+            # A disconnect or cancellation concerns the leader's request only, a waiting one takes over
+            leader_gone = not isinstance(e, Exception) or (
+                isinstance(e, HTTPException) and e.status_code == CLIENT_CLOSED_REQUEST
+            )
+            flight.set_exception(_LeaderGone() if leader_gone else e)
+            # Nobody may be waiting, retrieve it so asyncio does not log it as unhandled
+            flight.exception()
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+
+
+async def leased_compute(
+    cache: MemcachedClient,
+    key: str,
+    compute: Callable[[], Awaitable[T]],
+    encode: Callable[[T], str],
+    decode: Callable[[str | bytes], T],
+) -> T:
+    """Compute under a memcached lease and store the encoded result, or wait for the lease holder to store it.
+
+    A holder that dies without storing a result lets its lease expire, the waiters compute themselves then. Without
+    memcached every caller computes itself, failing to store the result or release the lease only costs the caching.
+    """
+    settings = get_settings()
+    lease_key = f"{key}:lease"
+    try:
+        # With noreply, add would report success even when another caller holds the lease
+        holds_lease = bool(cache.add(lease_key, "1", expire=settings.POPULATION_LEASE_SECONDS, noreply=False))
+        lease_taken = not holds_lease
+    except (MemcacheError, OSError) as e:
+        logger.warning(f"Could not take the lease {lease_key}, computing without it: {e}")
+        holds_lease = lease_taken = False
+    if lease_taken:
+        deadline = time.monotonic() + settings.POPULATION_LEASE_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+            cached = cache.get(key)
+            if cached is not None:
+                return decode(cached)
+
+    try:
+        result = await compute()
+        cache_set(cache, key, encode(result), expire=settings.POPULATION_CACHE_SECONDS)
+        return result
+    finally:
+        if holds_lease:
+            cache_delete(cache, lease_key)
+
+
+_query_log: QueryLogWriter | None = None
+
+
+def _get_query_log() -> QueryLogWriter | None:
+    global _query_log
+    settings = get_settings()
+    if not settings.QUERY_LOG_DIR:
+        return None
+    if _query_log is None:
+        _query_log = QueryLogWriter(
+            QueryLog(Path(settings.QUERY_LOG_DIR) / QUERY_LOG_NAME, settings.QUERY_LOG_MAX_BYTES)
+        )
+    return _query_log
+
+
+def record_population_query(
+    latitude: float, longitude: float, radius_km: float, started: float, outcome: QueryOutcome
+) -> None:
+    """Queue a served circle for the query log, started being its time.perf_counter() when the request began.
+
+    The record is written by a background thread, the request never waits on the disk.
+    """
+    query_log = _get_query_log()
+    if query_log is None:
+        return
+    latency_ms = (time.perf_counter() - started) * 1000
+    query_log.submit(QueryRecord(int(time.time()), latitude, longitude, radius_km, latency_ms, outcome))
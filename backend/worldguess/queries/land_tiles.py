@@ -0,0 +1,33 @@
+from typing import NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Built by the pipeline, one gzip compressed GeoJSON FeatureCollection per XYZ tile
+LAND_TILE_QUERY = text("SELECT data_version, body FROM land_tiles WHERE z = :z AND x = :x AND y = :y")
+
+_has_land_tiles = False
+
+
+class LandTile(NamedTuple):
+    data_version: str
+    # Gzip compressed GeoJSON
+    body: bytes
+
+
+def has_land_tiles(session: Session) -> bool:
+    """Whether the pipeline built the land tiles table, only a positive answer is remembered."""
+    global _has_land_tiles
+    if not _has_land_tiles:
+        _has_land_tiles = bool(session.execute(text("SELECT to_regclass('land_tiles') IS NOT NULL")).scalar())
+    return _has_land_tiles
+
+
+def get_land_tile(session: Session, z: int, x: int, y: int) -> LandTile | None:
+    """Pre-computed land polygons of an XYZ tile, None if the tile was not built."""
+    if not has_land_tiles(session):
+        return None
+    row = session.execute(LAND_TILE_QUERY, {"z": z, "x": x, "y": y}).first()
+    if row is None:
+        return None
+    return LandTile(data_version=row.data_version, body=bytes(row.body))
@@ -0,0 +1,65 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Walks the population_cells quadtree from the top level down. Cells inside the circle are summed whole and not
+# descended into, cells crossing the boundary are split into their children down to level 0. Only the raster under
+# the level 0 boundary cells is clipped, grouped so every raster tile is clipped once.
+POPULATION_IN_CIRCLE_FROM_CELLS_QUERY = text("""
+    WITH RECURSIVE circle AS (
+        SELECT ST_Transform(
+            ST_Buffer(ST_Transform(ST_SetSRID(ST_MakePoint(:lon, :lat), 4326), 3857), :radius_m),
+            4326
+        ) AS geom
+    ),
+    cells AS (
+        SELECT c.level, c.x, c.y, c.population, c.geom, ST_Within(c.geom, circle.geom) AS inside
+        FROM population_cells c, circle
+        WHERE c.level = (SELECT MAX(level) FROM population_cells) AND ST_Intersects(c.geom, circle.geom)
+        UNION ALL
+        SELECT child.level, child.x, child.y, child.population, child.geom, ST_Within(child.geom, circle.geom)
+        FROM cells parent
+        JOIN population_cells child
+            ON child.level = parent.level - 1
+            AND child.x BETWEEN parent.x * 2 AND parent.x * 2 + 1
+            AND child.y BETWEEN parent.y * 2 AND parent.y * 2 + 1
+        CROSS JOIN circle
+        WHERE NOT parent.inside AND parent.level > 0 AND ST_Intersects(child.geom, circle.geom)
+    ),
+    edge_by_tile AS (
+        SELECT r.rid, ST_Union(ST_Intersection(cells.geom, circle.geom)) AS geom
+        FROM cells
+        CROSS JOIN circle
+        JOIN population_raster r ON ST_Intersects(r.rast, cells.geom)
+        WHERE cells.level = 0 AND NOT cells.inside
+        GROUP BY r.rid
+    ),
+    edge AS (
+        SELECT (ST_SummaryStats(ST_Clip(r.rast, e.geom, true))).sum AS population
+        FROM edge_by_tile e
+        JOIN population_raster r ON r.rid = e.rid
+    )
+    SELECT (
+        COALESCE((SELECT SUM(population) FROM cells WHERE inside), 0)
+        + COALESCE((SELECT SUM(population) FROM edge), 0)
+    )::bigint
+""")
+
+_has_population_cells = False
+
+
+def has_population_cells(session: Session) -> bool:
+    """Whether the pipeline built the cells table, only a positive answer is remembered."""
+    global _has_population_cells
+    if not _has_population_cells:
+        _has_population_cells = bool(
+            session.execute(text("SELECT to_regclass('population_cells') IS NOT NULL")).scalar()
+        )
+    return _has_population_cells
+
+
+def get_population_in_circle_from_cells(session: Session, latitude: float, longitude: float, radius_km: float) -> int:
+    """Total population within a circle from the pre-aggregated cells, matching the plain ST_Clip query."""
+    result = session.execute(
+        POPULATION_IN_CIRCLE_FROM_CELLS_QUERY, {"lat": latitude, "lon": longitude, "radius_m": radius_km * 1000}
+    ).scalar()
+    return int(result) if result else 0
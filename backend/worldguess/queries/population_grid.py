@@ -0,0 +1,108 @@
+import math
+from collections.abc import Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from ..grid_files import Grid
+
+# Spherical Web Mercator (EPSG:3857), the circle is buffered in this projection like the PostGIS query does
+EARTH_RADIUS_M = 6378137.0
+MAX_MERCATOR_LATITUDE = 85.0511287798
+
+
+def _mercator_y(latitude: float) -> float:
+    latitude = max(-MAX_MERCATOR_LATITUDE, min(MAX_MERCATOR_LATITUDE, latitude))
+    return EARTH_RADIUS_M * math.log(math.tan(math.pi / 4 + math.radians(latitude) / 2))
+
+
+def _mercator_latitude(y: float) -> float:
+    return math.degrees(2 * math.atan(math.exp(y / EARTH_RADIUS_M)) - math.pi / 2)
+
+
+def circle_row_spans(
+    grid: Grid, latitude: float, longitude: float, radius_km: float
+) -> tuple[int, npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """Column span of every grid row whose pixel centers fall inside the circle.
+
+    Returns the first row and per-row [start, stop) column indices, empty spans have start >= stop. Pixels are
+    selected by their center, the same rule ST_Clip uses.
+    """
+    height, width = grid.array.shape[:2]
+    transform = grid.transform
+    radius_m = radius_km * 1000
+    center_y = _mercator_y(latitude)
+
+    north = _mercator_latitude(center_y + radius_m)
+    south = _mercator_latitude(center_y - radius_m)
+    first_row = max(0, math.floor((transform.north - north) / transform.pixel_height))
+    last_row = min(height - 1, math.ceil((transform.north - south) / transform.pixel_height))
+    if first_row > last_row:
+        return 0, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    rows = np.arange(first_row, last_row + 1)
+    row_latitudes = np.clip(
+        transform.north - (rows + 0.5) * transform.pixel_height, -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE
+    )
+    row_y = EARTH_RADIUS_M * np.log(np.tan(np.pi / 4 + np.radians(row_latitudes) / 2))
+    half_width_m = np.sqrt(np.maximum(radius_m**2 - (row_y - center_y) ** 2, 0.0))
+    half_width_degrees = np.degrees(half_width_m / EARTH_RADIUS_M)
+    inside = np.abs(row_y - center_y) <= radius_m
+
+    west = longitude - half_width_degrees
+    east = longitude + half_width_degrees
+    starts = np.clip(np.ceil((west - transform.west) / transform.pixel_width - 0.5), 0, width).astype(np.int64)
+    stops = np.clip(np.floor((east - transform.west) / transform.pixel_width - 0.5) + 1, 0, width).astype(np.int64)
+    stops = np.where(inside, stops, starts)
+    return first_row, starts, stops
+
+
+def population_in_circle(grid: Grid, latitude: float, longitude: float, radius_km: float) -> int:
+    """Total population within a circle, computed from the in-memory population grid."""
+    return population_in_circle_per_grid([grid], latitude, longitude, radius_km)[0]
+
+
+def population_in_circle_per_grid(
+    grids: Sequence[Grid], latitude: float, longitude: float, radius_km: float
+) -> list[int]:
+    """Total population within a circle in each of several aligned grids, e.g. one per year.
+
+    The circle's row spans are computed once and every grid is summed over them in the same pass.
+    """
+    if any(grid.array.shape != grids[0].array.shape for grid in grids):
+        raise ValueError("Population grids are not aligned")
+
+    first_row, starts, stops = circle_row_spans(grids[0], latitude, longitude, radius_km)
+    totals = [0.0] * len(grids)
+    for offset, (start, stop) in enumerate(zip(starts.tolist(), stops.tolist())):
+        if start < stop:
+            for index, grid in enumerate(grids):
+                totals[index] += float(grid.array[first_row + offset, start:stop].sum(dtype=np.float64))
+    return [round(total) for total in totals]
+
+
+def population_by_country(
+    population_grid: Grid, country_grid: Grid, latitude: float, longitude: float, radius_km: float
+) -> tuple[int, dict[int, int]]:
+    """Total population within a circle and its split by country id, in one pass over the circle's pixels.
+
+    The country grid is aligned with the population grid, every row span is bincounted by country id weighted by
+    population. Id 0 is population outside every country, it counts towards the total only.
+    """
+    if population_grid.array.shape != country_grid.array.shape:
+        raise ValueError("Country grid is not aligned with the population grid")
+
+    country_count = max((int(country_id) for country_id in country_grid.metadata.get("countries", {})), default=0) + 1
+    totals = np.zeros(country_count, dtype=np.float64)
+    first_row, starts, stops = circle_row_spans(population_grid, latitude, longitude, radius_km)
+    for offset, (start, stop) in enumerate(zip(starts.tolist(), stops.tolist())):
+        if start < stop:
+            row = first_row + offset
+            totals += np.bincount(
+                country_grid.array[row, start:stop],
+                weights=population_grid.array[row, start:stop],
+                minlength=totals.size,
+            )[: totals.size]
+
+    by_country = {country_id: round(total) for country_id, total in enumerate(totals.tolist()) if country_id}
+    return round(float(totals.sum())), {country_id: total for country_id, total in by_country.items() if total > 0}
@@ -1,11 +1,81 @@
 from typing import NamedTuple
 
-from sqlalchemy import text
+from sqlalchemy import TextClause, text
 from sqlalchemy.orm import Session
 
 METERS_PER_DEGREE_LATITUDE = 111320.0
 
 
+def tile_sum_query(circle_sql: str) -> TextClause:
+    """Population inside the circle given by circle_sql, a SELECT returning one EPSG:4326 geometry named geom.
+
+    Tiles lying entirely inside the circle contribute their stored sum from population_raster_tiles, only tiles
+    crossing its boundary are clipped, so clip work grows with the perimeter instead of the area.
+    """
+    return text(f"""
+        WITH circle AS ({circle_sql}),
+        tiles AS (
+            SELECT t.rid, t.population, ST_Within(t.envelope, c.geom) AS inside
+            FROM population_raster_tiles t, circle c
+            WHERE ST_Intersects(t.envelope, c.geom)
+        ),
+        clipped AS (
+            SELECT (ST_SummaryStats(ST_Clip(r.rast, c.geom, true))).sum AS population
+            FROM tiles t
+            JOIN population_raster r ON r.rid = t.rid
+            CROSS JOIN circle c
+            WHERE NOT t.inside
+        )
+        SELECT
+            COALESCE((SELECT SUM(population) FROM tiles WHERE inside), 0)
+            + COALESCE((SELECT SUM(population) FROM clipped), 0) AS total_population
+    """)
+
+
+def clip_sum_query(circle_sql: str) -> TextClause:
+    """Population inside the circle given by circle_sql, clipping every raster tile it intersects.
+
+    Used until the pipeline has built population_raster_tiles.
+    """
+    return text(f"""
+        WITH circle AS ({circle_sql}),
+        clipped AS (
+            SELECT (ST_SummaryStats(ST_Clip(r.rast, c.geom, true))).sum AS population
+            FROM population_raster r, circle c
+            WHERE ST_Intersects(r.rast, c.geom)
+        )
+        SELECT COALESCE(SUM(population), 0) AS total_population
+        FROM clipped
+    """)
+
+
+_has_population_raster_tiles = False
+
+
+def has_population_raster_tiles(session: Session) -> bool:
+    """Whether the pipeline built the raster tile sums, only a positive answer is remembered."""
+    global _has_population_raster_tiles
+    if not _has_population_raster_tiles:
+        _has_population_raster_tiles = bool(
+            session.execute(text("SELECT to_regclass('population_raster_tiles') IS NOT NULL")).scalar()
+        )
+    return _has_population_raster_tiles
+
+
+# Circle buffered in degrees around the center
+CIRCLE_SQL = "SELECT ST_Buffer(ST_SetSRID(ST_MakePoint(:center_lng, :center_lat), 4326), :radius_degrees) AS geom"
+POPULATION_IN_CIRCLE_QUERY = tile_sum_query(CIRCLE_SQL)
+POPULATION_IN_CIRCLE_CLIP_QUERY = clip_sum_query(CIRCLE_SQL)
+
+# Circle buffered in meters in Web Mercator, as used by the game
+MERCATOR_CIRCLE_SQL = (
+    "SELECT ST_Transform(ST_Buffer(ST_Transform(ST_SetSRID(ST_MakePoint(:lon, :lat), 4326), 3857), :radius_m), 4326)"
+    " AS geom"
+)
+POPULATION_IN_MERCATOR_CIRCLE_QUERY = tile_sum_query(MERCATOR_CIRCLE_SQL)
+POPULATION_IN_MERCATOR_CIRCLE_CLIP_QUERY = clip_sum_query(MERCATOR_CIRCLE_SQL)
+
+
 class PopulationStatistics(NamedTuple):
     total_tiles: int
     total_population: float
@@ -23,26 +93,12 @@ def get_population_in_circle(
     # Convert radius from meters to degrees (approximate)
     radius_degrees = radius_meters / METERS_PER_DEGREE_LATITUDE
 
-    # Create circle geometry and clip raster, then sum population values
-    query = text("""
-        WITH circle_geom AS (
-            SELECT ST_Buffer(
-                ST_SetSRID(ST_MakePoint(:center_lng, :center_lat), 4326),
-                :radius_degrees
-            ) AS geom
-        ),
-        clipped_raster AS (
-            SELECT ST_Clip(pr.rast, cg.geom) AS clipped_rast
-            FROM population_raster pr, circle_geom cg
-            WHERE ST_Intersects(pr.rast, cg.geom)
-        )
-        SELECT COALESCE(SUM((ST_SummaryStats(clipped_rast)).sum), 0.0) AS total_population
-        FROM clipped_raster
-        WHERE clipped_rast IS NOT NULL
-    """)
-
+    query = (
+        POPULATION_IN_CIRCLE_QUERY if has_population_raster_tiles(database_session) else POPULATION_IN_CIRCLE_CLIP_QUERY
+    )
     result = database_session.execute(
-        query, {"center_lng": center_longitude, "center_lat": center_latitude, "radius_degrees": radius_degrees}
+        query,
+        {"center_lng": center_longitude, "center_lat": center_latitude, "radius_degrees": radius_degrees},
     ).scalar()
 
     return float(result or 0.0)
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy.orm import Session
+
+from ..grid_files import Grid
+from .population_raster import clip_sum_query, has_population_raster_tiles, tile_sum_query
+
+# Polygons as lists of rings, rings as lists of (longitude, latitude), the first ring is the exterior
+Ring = Sequence[Sequence[float]]
+Polygon = Sequence[Ring]
+
+# Edge and row crossings a region may rasterize to, each takes about 50 bytes while the mask is built
+MAX_REGION_CROSSINGS = 2_000_000
+
+GEOMETRY_SQL = "SELECT ST_SetSRID(ST_GeomFromGeoJSON(:geojson), 4326) AS geom"
+POPULATION_IN_GEOMETRY_QUERY = tile_sum_query(GEOMETRY_SQL)
+POPULATION_IN_GEOMETRY_CLIP_QUERY = clip_sum_query(GEOMETRY_SQL)
+
+
+class RegionTooComplexError(ValueError):
+    """The region's edges cross too many grid rows to rasterize."""
+
+
+@dataclass(frozen=True)
+class RegionMask:
+    """Grid pixels covered by a region as [start, stop) column spans, several spans per row where needed."""
+
+    rows: npt.NDArray[np.int64]
+    starts: npt.NDArray[np.int64]
+    stops: npt.NDArray[np.int64]
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.starts.nbytes + self.stops.nbytes
+
+
+def _edges(polygons: Sequence[Polygon], grid: Grid) -> npt.NDArray[np.float64]:
+    """Every ring edge as (x0, y0, x1, y1) in fractional grid pixel coordinates."""
+    transform = grid.transform
+    edges = []
+    for polygon in polygons:
+        for ring in polygon:
+            points = np.asarray(ring, dtype=np.float64)[:, :2]
+            if len(points) < 3:
+                continue
+            # GeoJSON rings repeat the first position at the end, close the ones that do not
+            if not np.array_equal(points[0], points[-1]):
+                points = np.vstack([points, points[:1]])
+            columns = (points[:, 0] - transform.west) / transform.pixel_width
+            rows = (transform.north - points[:, 1]) / transform.pixel_height
+            edges.append(np.column_stack([columns[:-1], rows[:-1], columns[1:], rows[1:]]))
+    if not edges:
+        return np.empty((0, 4), dtype=np.float64)
+    return np.concatenate(edges)
+
+
+def rasterize_region(polygons: Sequence[Polygon], grid: Grid, max_crossings: int = MAX_REGION_CROSSINGS) -> RegionMask:
+    """Scanline rasterize polygons onto the grid, selecting pixels by their center like ST_Clip does.
+
+    Each edge is intersected with the centers of the rows it spans, all crossings are sorted by row and column, and
+    consecutive pairs become spans. Pairing by the even-odd rule leaves holes out without treating them specially.
+    The crossings are counted from the edges' row spans first, beyond max_crossings RegionTooComplexError is raised
+    before anything is allocated for them.
+    """
+    height, width = grid.array.shape[:2]
+    edges = _edges(polygons, grid)
+    x0, y0, x1, y1 = edges.T if len(edges) else (np.empty(0),) * 4
+
+    # Rows whose center y + 0.5 lies in [min(y0, y1), max(y0, y1)), horizontal edges span none
+    low = np.minimum(y0, y1)
+    high = np.maximum(y0, y1)
+    first_rows = np.clip(np.ceil(low - 0.5), 0, height).astype(np.int64)
+    stop_rows = np.clip(np.ceil(high - 0.5), 0, height).astype(np.int64)
+    counts = np.maximum(stop_rows - first_rows, 0)
+    if counts.sum() > max_crossings:
+        raise RegionTooComplexError(f"Region crosses grid rows {counts.sum()} times, at most {max_crossings} allowed")
+
+    edge_index = np.repeat(np.arange(len(edges)), counts)
+    row_offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    rows = first_rows[edge_index] + row_offsets
+    fraction = (rows + 0.5 - y0[edge_index]) / (y1[edge_index] - y0[edge_index])
+    crossings = x0[edge_index] + fraction * (x1[edge_index] - x0[edge_index])
+
+    order = np.lexsort((crossings, rows))
+    rows = rows[order]
+    crossings = crossings[order]
+    # Every row is crossed an even number of times by closed rings, pairs never straddle two rows
+    span_rows = rows[0::2]
+    starts = np.clip(np.ceil(crossings[0::2] - 0.5), 0, width).astype(np.int64)
+    stops = np.clip(np.ceil(crossings[1::2] - 0.5), 0, width).astype(np.int64)
+    keep = starts < stops
+    return RegionMask(rows=span_rows[keep], starts=starts[keep], stops=stops[keep])
+
+
+def population_in_mask(grid: Grid, mask: RegionMask) -> int:
+    """Total population of the pixels a region mask covers."""
+    total = 0.0
+    for row, start, stop in zip(mask.rows.tolist(), mask.starts.tolist(), mask.stops.tolist()):
+        total += float(grid.array[row, start:stop].sum(dtype=np.float64))
+    return round(total)
+
+
+def geometry_hash(polygons: Sequence[Polygon]) -> str:
+    """Stable hash of a region's coordinates, equal for geometries that differ only in JSON formatting."""
+    digest = hashlib.sha256()
+    for polygon in polygons:
+        digest.update(b"polygon")
+        for ring in polygon:
+            digest.update(b"ring")
+            digest.update(np.asarray(ring, dtype=np.float64)[:, :2].tobytes())
+    return digest.hexdigest()
+
+
+class RegionMaskCache:
+    """Rasterized region masks by geometry hash and grid, least recently used evicted beyond max_bytes."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._masks: OrderedDict[tuple[str, str, str | None], RegionMask] = OrderedDict()
+        self._size = 0
+
+    def get_or_rasterize(self, polygons: Sequence[Polygon], grid: Grid) -> RegionMask:
+        key = (geometry_hash(polygons), grid.name, grid.data_version)
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+
+        mask = rasterize_region(polygons, grid)
+        with self._lock:
+            if key not in self._masks:
+                self._masks[key] = mask
+                self._size += mask.nbytes
+            while self._size > self.max_bytes and len(self._masks) > 1:
+                _, evicted = self._masks.popitem(last=False)
+                self._size -= evicted.nbytes
+        return mask
+
+
+def get_population_in_geometry(session: Session, geojson: str) -> int:
+    """Total population within a GeoJSON geometry from the raster in PostGIS."""
+    query = POPULATION_IN_GEOMETRY_QUERY if has_population_raster_tiles(session) else POPULATION_IN_GEOMETRY_CLIP_QUERY
+    result = session.execute(query, {"geojson": geojson}).scalar()
+    return round(result) if result else 0
@@ -0,0 +1,154 @@
+"""Log of the circle population computations the API serves, and the circle quantization it shares with the cache.
+
+Every worker appends one fixed size record per request. A background thread writes them in batches, each with a single
+O_APPEND write, so request handlers never wait on the disk and records of concurrent workers never interleave. Beyond its size limit the log is rotated to one .1 generation. The pipeline replays the circles
+queried most often recently to warm the result cache after a data refresh, and the log doubles as realistic replay
+input for benchmarks.
+
+Only the standard library is imported here so the pipeline can use it without the API settings.
+"""
+
+import logging
+import os
+import queue
+import struct
+import threading
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from enum import IntEnum
+from pathlib import Path
+from typing import NamedTuple
+
+# Circles closer than this are the same circle, about 10 cm and 1 m
+COORDINATE_DECIMALS = 6
+RADIUS_KM_DECIMALS = 3
+QUERY_LOG_NAME = "population.log"
+
+# Unix seconds, latitude, longitude, radius in km, latency in ms and outcome, 33 bytes
+_RECORD = struct.Struct("<IdddfB")
+# Records a writer appends with one write at most
+WRITE_BATCH_RECORDS = 1024
+
+logger = logging.getLogger(__name__)
+
+Circle = tuple[float, float, float]
+
+
+class QueryOutcome(IntEnum):
+    COMPUTED = 0
+    CACHE_HIT = 1
+    # Joined a computation of the same circle already running in the process
+    COALESCED = 2
+
+
+class QueryRecord(NamedTuple):
+    timestamp: int
+    latitude: float
+    longitude: float
+    radius_km: float
+    latency_ms: float
+    outcome: QueryOutcome
+
+    @property
+    def circle(self) -> Circle:
+        return self.latitude, self.longitude, self.radius_km
+
+
+def normalize_circle(latitude: float, longitude: float, radius_km: float) -> Circle:
+    return (
+        round(latitude, COORDINATE_DECIMALS),
+        round(longitude, COORDINATE_DECIMALS),
+        round(radius_km, RADIUS_KM_DECIMALS),
+    )
+
+
+def population_cache_key(latitude: float, longitude: float, radius_km: float, data_version: str) -> str:
+    """Memcached key of a circle's population, for a circle already normalized."""
+    return f"population:{data_version}:{latitude}:{longitude}:{radius_km}"
+
+
+class QueryLog:
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def append(self, record: QueryRecord) -> None:
+        self.extend([record])
+
+    def extend(self, records: Iterable[QueryRecord]) -> None:
+        file_descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(file_descriptor, b"".join(_RECORD.pack(*record) for record in records))
+            size = os.fstat(file_descriptor).st_size
+        finally:
+            os.close(file_descriptor)
+        if size > self.max_bytes:
+            try:
+                os.replace(self.path, _rotated_path(self.path))
+            except FileNotFoundError:
+                # Another worker rotated it first
+                pass
+
+
+class QueryLogWriter:
+    """Appends records to a query log from a background thread.
+
+    At most max_pending records wait to be written, beyond that new ones are dropped rather than holding up requests.
+    Records still queued when the process exits are lost.
+    """
+
+    def __init__(self, query_log: QueryLog, max_pending: int = 10_000) -> None:
+        self.query_log = query_log
+        self._pending: queue.Queue[QueryRecord] = queue.Queue(maxsize=max_pending)
+        threading.Thread(target=self._write_pending, name="query-log-writer", daemon=True).start()
+
+    def submit(self, record: QueryRecord) -> bool:
+        """Queue a record without blocking, False when it was dropped."""
+        try:
+            self._pending.put_nowait(record)
+        except queue.Full:
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Wait until every record submitted so far has been written."""
+        self._pending.join()
+
+    def _write_pending(self) -> None:
+        while True:
+            records = [self._pending.get()]
+            while len(records) < WRITE_BATCH_RECORDS:
+                try:
+                    records.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.query_log.extend(records)
+            except OSError as e:
+                # The log is for warming and benchmarks only
+                logger.warning(f"Could not append {len(records)} records to the query log: {e}")
+            finally:
+                for _ in records:
+                    self._pending.task_done()
+
+
+def _rotated_path(path: Path) -> Path:
+    return path.with_name(path.name + ".1")
+
+
+def read_query_log(path: Path) -> Iterator[QueryRecord]:
+    """Records of the rotated and the current log, oldest first. A record being appended while reading is skipped."""
+    for log_path in (_rotated_path(path), path):
+        try:
+            content = log_path.read_bytes()
+        except FileNotFoundError:
+            continue
+        complete = len(content) - len(content) % _RECORD.size
+        for timestamp, latitude, longitude, radius_km, latency_ms, outcome in _RECORD.iter_unpack(content[:complete]):
+            yield QueryRecord(timestamp, latitude, longitude, radius_km, latency_ms, QueryOutcome(outcome))
+
+
+def most_frequent_circles(records: Iterable[QueryRecord], since: float, limit: int) -> list[Circle]:
+    """The limit circles queried most often since a Unix time, most frequent first."""
+    counts = Counter(record.circle for record in records if record.timestamp >= since)
+    return [circle for circle, _ in counts.most_common(limit)]
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple
+
+from sqlalchemy import delete, select
+
+from .database import get_session_context
+from .dependencies import cache_delete, memcached
+from .events import publish_challenge_event
+from .orm.tables import Challenge
+from .routes.challenge import _send_webhook, challenge_cache_key
+from .settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiredChallenge(NamedTuple):
+    challenge_id: str
+    webhook_url: str | None
+    webhook_token: str | None
+    webhook_extra_params: dict[str, Any] | None
+
+
+def _delete_expired_batch(cutoff: datetime, batch_size: int) -> list[ExpiredChallenge]:
+    """Delete up to batch_size challenges created before cutoff.
+
+    SKIP LOCKED lets reapers of several workers run concurrently without waiting on each other, guesses go away
+    through the ON DELETE CASCADE foreign key.
+    """
+    expired_ids = (
+        select(Challenge.challenge_id)
+        .where(Challenge.created_at < cutoff)
+        .order_by(Challenge.created_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    with get_session_context() as session:
+        rows = session.execute(
+            delete(Challenge)
+            .where(Challenge.challenge_id.in_(expired_ids))
+            .returning(
+                Challenge.challenge_id,
+                Challenge.webhook_url,
+                Challenge.webhook_token,
+                Challenge.webhook_extra_params,
+            )
+        ).all()
+        session.commit()
+    return [ExpiredChallenge(*row) for row in rows]
+
+
+async def _notify_expired(challenge: ExpiredChallenge) -> None:
+    cache_delete(memcached(), challenge_cache_key(challenge.challenge_id))
+    await publish_challenge_event(challenge.challenge_id, "challenge_expired", {})
+    if not get_settings().CHALLENGE_EXPIRY_WEBHOOK or not challenge.webhook_url:
+        return
+    webhook_data: dict[str, Any] = {"message": "The challenge expired before it was ended"}
+    if challenge.webhook_extra_params:
+        webhook_data.update(challenge.webhook_extra_params)
+    await _send_webhook(challenge.webhook_url, webhook_data, challenge.webhook_token)
+
+
+async def reap_expired_challenges() -> int:
+    """Delete all expired challenges in bounded batches and return how many were removed."""
+    settings = get_settings()
+    # created_at is stored as naive UTC, an aware cutoff would be compared in the session's time zone
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=settings.CHALLENGE_TTL_SECONDS)
+
+    total = 0
+    while True:
+        expired = await asyncio.to_thread(_delete_expired_batch, cutoff, settings.CHALLENGE_REAPER_BATCH_SIZE)
+        total += len(expired)
+
+        # The challenges are deleted already, a failed notification must not stop the others or the next batch
+        results = await asyncio.gather(*[_notify_expired(challenge) for challenge in expired], return_exceptions=True)
+        for challenge, result in zip(expired, results):
+            if isinstance(result, Exception):
+                logger.error(f"Could not notify the expiry of challenge {challenge.challenge_id}: {result}")
+
+        if len(expired) < settings.CHALLENGE_REAPER_BATCH_SIZE:
+            return total
+
+
+async def run_challenge_reaper() -> None:
+    """Periodically delete expired challenges until cancelled."""
+    interval = get_settings().CHALLENGE_REAPER_INTERVAL_SECONDS
+    while True:
+        try:
+            reaped = await reap_expired_challenges()
+            if reaped:
+                logger.info(f"Reaped {reaped} expired challenges")
+        except Exception as e:
+            logger.error(f"Challenge reaper failed: {e}")
+        await asyncio.sleep(interval)
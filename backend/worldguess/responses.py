@@ -0,0 +1,47 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Event streams must reach the client as they are written, images are compressed already
+UNCOMPRESSIBLE_CONTENT_TYPES = ("text/event-stream", "image/")
+
+
+def is_compressible(headers: Headers) -> bool:
+    return "content-encoding" not in headers and not headers.get("content-type", "").startswith(
+        UNCOMPRESSIBLE_CONTENT_TYPES
+    )
+
+
+class APIGZipMiddleware:
+    """Gzip large API responses only.
+
+    Static assets are already served precompressed, compressing them again (or images) per request is wasted CPU.
+    Event streams, images and responses with a content encoding bypass the compressor from their start message, so
+    nothing of them is buffered.
+    """
+
+    def __init__(self, app: ASGIApp, prefix: str = "/v1", minimum_size: int = 1024, compresslevel: int = 5) -> None:
+        self.app = app
+        self.prefix = prefix
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        async def app(scope: Scope, receive: Receive, compressing_send: Send) -> None:
+            response_send = compressing_send
+
+            async def route_send(message: Message) -> None:
+                nonlocal response_send
+                if message["type"] == "http.response.start" and not is_compressible(Headers(raw=message["headers"])):
+                    response_send = send
+                await response_send(message)
+
+            await self.app(scope, receive, route_send)
+
+        await GZipMiddleware(app, minimum_size=self.minimum_size, compresslevel=self.compresslevel)(
+            scope, receive, send
+        )
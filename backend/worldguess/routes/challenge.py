@@ -1,13 +1,20 @@
+import asyncio
 import logging
 import uuid
-from typing import Any
+from collections.abc import AsyncGenerator
+from typing import Annotated, Any
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import BigInteger, String, column, delete, func, literal, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..cancellation import run_cancellable
+from ..database import get_db, get_engine, get_read_db, get_session_context
+from ..dependencies import MemcachedClient, cache_delete, cache_set, memcached
+from ..events import get_event_hub, publish_challenge_event
 from ..orm.tables import Challenge, ChallengeGuess
 from ..routes.game import _calculate_population_in_circle
 from ..schemas import (
@@ -15,15 +22,22 @@ from ..schemas import (
     CreateChallengeRequest,
     CreateChallengeResponse,
     EndChallengeResponse,
+    SubmitGuessesRequest,
+    SubmitGuessesResponse,
     SubmitGuessRequest,
     SubmitGuessResponse,
 )
 from ..settings import get_settings
-from ..utils.guess_qualification import calculate_guess_qualification
+from ..utils.guess_qualification import calculate_guess_qualifications
+from ..utils.http_caching import etag_matches, make_etag
 
 router = APIRouter(tags=["challenge"], prefix="/challenge")
 
 
+def challenge_cache_key(challenge_id: str) -> str:
+    return f"challenge:{challenge_id}"
+
+
 async def _send_webhook(url: str, data: dict[str, Any], token: str | None = None) -> None:
     """Send webhook notification asynchronously with optional Bearer token."""
     headers = {}
@@ -42,9 +56,42 @@ async def _send_webhook(url: str, data: dict[str, Any], token: str | None = None
         logging.error(f"Failed to send webhook to {url}: {e}")
 
 
+def _store_actual_population(challenge_id: str) -> None:
+    """Compute the challenge answer off the request path and persist it on the challenge row."""
+    with get_session_context() as session:
+        challenge = session.get(Challenge, challenge_id)
+        if challenge is None or challenge.actual_population is not None:
+            return
+
+        actual_population = _calculate_population_in_circle(
+            session,
+            challenge.latitude,
+            challenge.longitude,
+            challenge.radius_km,
+        )
+
+        # The challenge may have been ended (and deleted) while the raster query was running
+        session.execute(
+            update(Challenge)
+            .where(Challenge.challenge_id == challenge_id, Challenge.actual_population.is_(None))
+            .values(actual_population=actual_population)
+        )
+        session.commit()
+
+
+def _get_challenge(session: Session, challenge_id: str) -> Challenge | None:
+    """Look up a challenge, retrying misses on the primary as a replica may not have the new challenge yet."""
+    challenge = session.get(Challenge, challenge_id)
+    if challenge is None and session.get_bind() is not get_engine():
+        with get_session_context() as primary_session:
+            challenge = primary_session.get(Challenge, challenge_id)
+    return challenge
+
+
 @router.post("/create")
 async def create_challenge(
     request: CreateChallengeRequest,
+    background_tasks: BackgroundTasks,
     session: Session = Depends(get_db),
 ) -> CreateChallengeResponse:
     """Create a new challenge with optional webhook notifications."""
@@ -66,6 +113,8 @@ async def create_challenge(
     session.add(challenge)
     session.commit()
 
+    background_tasks.add_task(_store_actual_population, challenge_id)
+
     settings = get_settings()
     challenge_url = f"{settings.BASE_URL}?challengeId={challenge_id}"
 
@@ -76,23 +125,82 @@ async def create_challenge(
     )
 
 
-@router.get("/{challenge_id}")
+@router.get("/{challenge_id}", response_model=ChallengeDetails)
 async def get_challenge(
     challenge_id: str,
-    session: Session = Depends(get_db),
-) -> ChallengeDetails:
-    """Get challenge details."""
-    challenge = session.get(Challenge, challenge_id)
-    if not challenge:
+    cache: Annotated[MemcachedClient, Depends(memcached)],
+    if_none_match: Annotated[str | None, Header()] = None,
+    session: Session = Depends(get_read_db),
+) -> Response:
+    """Get challenge details.
+
+    Details never change while the challenge exists, so they are read through memcached and served with a strong
+    ETag. The cache entry is dropped when the challenge ends or expires.
+    """
+    settings = get_settings()
+    cache_key = challenge_cache_key(challenge_id)
+
+    body = cache.get(cache_key)
+    if body is None:
+        challenge = _get_challenge(session, challenge_id)
+        if not challenge:
+            raise HTTPException(status_code=404, detail="Challenge not found")
+
+        body = (
+            ChallengeDetails(
+                challenge_id=challenge.challenge_id,
+                game_id=challenge.game_id,
+                latitude=challenge.latitude,
+                longitude=challenge.longitude,
+                radius_km=challenge.radius_km,
+                size_class=challenge.size_class,
+            )
+            .model_dump_json()
+            .encode()
+        )
+        cache_set(cache, cache_key, body, expire=settings.CHALLENGE_CACHE_SECONDS)
+
+    etag = make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.CHALLENGE_HTTP_MAX_AGE}"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/{challenge_id}/events")
+async def stream_challenge_events(
+    challenge_id: str,
+    session: Session = Depends(get_read_db),
+) -> StreamingResponse:
+    """Server-sent event stream of guesses and the final rankings of a challenge.
+
+    The stream closes after the challenge has ended or expired.
+    """
+    challenge_exists = _get_challenge(session, challenge_id) is not None
+    # Do not hold a pooled connection for the lifetime of the stream
+    session.close()
+    if not challenge_exists:
         raise HTTPException(status_code=404, detail="Challenge not found")
 
-    return ChallengeDetails(
-        challenge_id=challenge.challenge_id,
-        game_id=challenge.game_id,
-        latitude=challenge.latitude,
-        longitude=challenge.longitude,
-        radius_km=challenge.radius_km,
-        size_class=challenge.size_class,
+    keepalive = get_settings().CHALLENGE_EVENTS_KEEPALIVE_SECONDS
+
+    async def event_stream() -> AsyncGenerator[str, None]:
+        with get_event_hub().subscribe(challenge_id) as queue:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield event.to_sse()
+                if event.is_final:
+                    return
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -100,10 +208,10 @@ async def get_challenge(
 async def get_user_guess(
     challenge_id: str,
     username: str,
-    session: Session = Depends(get_db),
+    session: Session = Depends(get_read_db),
 ) -> dict[str, int | None]:
     """Check if user has already submitted a guess."""
-    challenge = session.get(Challenge, challenge_id)
+    challenge = _get_challenge(session, challenge_id)
     if not challenge:
         raise HTTPException(status_code=404, detail="Challenge not found")
 
@@ -119,6 +227,33 @@ async def get_user_guess(
     return {"guess": None}
 
 
+async def _notify_guesses(
+    challenge_id: str,
+    webhook_url: str | None,
+    webhook_token: str | None,
+    webhook_extra_params: dict[str, Any] | None,
+    usernames: list[str],
+) -> None:
+    """Push the live guess event and send the "made their guess" webhook notification if configured."""
+    if not usernames:
+        return
+
+    await publish_challenge_event(challenge_id, "guess_submitted", {"usernames": usernames})
+
+    if not webhook_url:
+        return
+
+    if len(usernames) == 1:
+        message = f"{usernames[0]} has made their guess"
+    else:
+        message = f"{', '.join(usernames)} have made their guesses"
+
+    webhook_data = {"message": message}
+    if webhook_extra_params:
+        webhook_data.update(webhook_extra_params)
+    await _send_webhook(webhook_url, webhook_data, webhook_token)
+
+
 @router.post("/{challenge_id}/guess")
 async def submit_guess(
     challenge_id: str,
@@ -126,89 +261,209 @@ async def submit_guess(
     session: Session = Depends(get_db),
 ) -> SubmitGuessResponse:
     """Submit a guess for a challenge."""
-    challenge = session.get(Challenge, challenge_id)
-    if not challenge:
-        raise HTTPException(status_code=404, detail="Challenge not found")
-
-    # Check if username already submitted
-    existing_guess = session.execute(
-        select(ChallengeGuess).where(
-            ChallengeGuess.challenge_id == challenge_id,
-            ChallengeGuess.username == request.username,
+    # Single round trip: the insert only happens if the challenge exists and the
+    # unique (challenge_id, username) constraint turns duplicates into a no-op
+    inserted = (
+        pg_insert(ChallengeGuess)
+        .from_select(
+            ["challenge_id", "username", "guess"],
+            select(
+                Challenge.challenge_id,
+                literal(request.username, String),
+                literal(request.guess, BigInteger),
+            ).where(Challenge.challenge_id == challenge_id),
         )
-    ).scalar_one_or_none()
+        .on_conflict_do_nothing(index_elements=["challenge_id", "username"])
+        .returning(ChallengeGuess.id)
+        .cte("inserted")
+    )
+    challenge = session.execute(
+        select(
+            Challenge.webhook_url,
+            Challenge.webhook_token,
+            Challenge.webhook_extra_params,
+            select(func.count()).select_from(inserted).scalar_subquery().label("inserted_count"),
+        ).where(Challenge.challenge_id == challenge_id)
+    ).one_or_none()
+    session.commit()
 
-    if existing_guess:
+    if challenge is None:
+        raise HTTPException(status_code=404, detail="Challenge not found")
+
+    if not challenge.inserted_count:
         raise HTTPException(status_code=400, detail="Username has already submitted a guess")
 
-    guess = ChallengeGuess(
-        challenge_id=challenge_id,
-        username=request.username,
-        guess=request.guess,
+    await _notify_guesses(
+        challenge_id,
+        challenge.webhook_url,
+        challenge.webhook_token,
+        challenge.webhook_extra_params,
+        [request.username],
     )
 
-    session.add(guess)
-    session.commit()
-
-    # Send webhook notification if configured
-    if challenge.webhook_url:
-        webhook_data = {"message": f"{request.username} has made their guess"}
-        if challenge.webhook_extra_params:
-            webhook_data.update(challenge.webhook_extra_params)
-        await _send_webhook(challenge.webhook_url, webhook_data, challenge.webhook_token)
-
     return SubmitGuessResponse(
         success=True,
         message="Guess submitted successfully",
     )
 
 
-@router.post("/{challenge_id}/end")
-async def end_challenge(
+@router.post("/{challenge_id}/guesses")
+async def submit_guesses(
     challenge_id: str,
+    request: SubmitGuessesRequest,
     session: Session = Depends(get_db),
-) -> EndChallengeResponse:
-    """End a challenge, calculate rankings, send webhooks, and cleanup."""
-    challenge = session.get(Challenge, challenge_id)
-    if not challenge:
+) -> SubmitGuessesResponse:
+    """Submit many guesses for a challenge at once.
+
+    Meant for bots relaying channel guesses. Usernames that already guessed (or repeat within the request) are
+    rejected without failing the rest of the batch.
+    """
+    # First guess wins for usernames repeated within the batch
+    guesses: dict[str, int] = {}
+    for guess in request.guesses:
+        guesses.setdefault(guess.username, guess.guess)
+
+    # One statement as in submit_guess, so the challenge can not go away between looking it up and inserting
+    batch = values(column("username", String), column("guess", BigInteger), name="batch").data(list(guesses.items()))
+    inserted = (
+        pg_insert(ChallengeGuess)
+        .from_select(
+            ["challenge_id", "username", "guess"],
+            select(Challenge.challenge_id, batch.c.username, batch.c.guess).where(
+                Challenge.challenge_id == challenge_id
+            ),
+        )
+        .on_conflict_do_nothing(index_elements=["challenge_id", "username"])
+        .returning(ChallengeGuess.username)
+        .cte("inserted")
+    )
+    challenge = session.execute(
+        select(
+            Challenge.webhook_url,
+            Challenge.webhook_token,
+            Challenge.webhook_extra_params,
+            select(func.array_agg(inserted.c.username)).scalar_subquery().label("accepted_usernames"),
+        ).where(Challenge.challenge_id == challenge_id)
+    ).one_or_none()
+    session.commit()
+
+    if challenge is None:
         raise HTTPException(status_code=404, detail="Challenge not found")
 
-    # Calculate actual population
-    actual_population = _calculate_population_in_circle(
-        session,
-        challenge.latitude,
-        challenge.longitude,
-        challenge.radius_km,
+    accepted_usernames = set(challenge.accepted_usernames or ())
+    accepted: list[str] = []
+    rejected: list[str] = []
+    seen: set[str] = set()
+    for guess in request.guesses:
+        if guess.username in accepted_usernames and guess.username not in seen:
+            accepted.append(guess.username)
+        else:
+            rejected.append(guess.username)
+        seen.add(guess.username)
+
+    await _notify_guesses(
+        challenge_id,
+        challenge.webhook_url,
+        challenge.webhook_token,
+        challenge.webhook_extra_params,
+        accepted,
+    )
+
+    return SubmitGuessesResponse(
+        success=bool(accepted),
+        message=f"{len(accepted)} guesses submitted, {len(rejected)} rejected",
+        accepted=accepted,
+        rejected=rejected,
     )
 
-    # Get all guesses
-    guesses = session.execute(select(ChallengeGuess).where(ChallengeGuess.challenge_id == challenge_id)).scalars().all()
-
-    # Calculate rankings
-    rankings = []
-    for guess in guesses:
-        difference = abs(actual_population - guess.guess)
-        score = calculate_guess_qualification(actual_population, guess.guess)
-
-        rankings.append(
-            {
-                "username": guess.username,
-                "guess": guess.guess,
-                "difference": difference,
-                "score": score,
-            }
+
+@router.post("/{challenge_id}/end")
+async def end_challenge(
+    challenge_id: str,
+    request: Request,
+    cache: Annotated[MemcachedClient, Depends(memcached)],
+    session: Session = Depends(get_db),
+) -> EndChallengeResponse:
+    """End a challenge, calculate rankings, send webhooks, and cleanup.
+
+    The challenge is deleted and its guesses read in a single statement, the guesses come from the statement's
+    snapshot taken before the ON DELETE CASCADE removes them. With the population stored at creation this ends the
+    challenge in one round trip plus the commit.
+    """
+    deleted = (
+        delete(Challenge)
+        .where(Challenge.challenge_id == challenge_id)
+        .returning(Challenge.latitude, Challenge.longitude, Challenge.radius_km, Challenge.actual_population)
+        .cte("deleted")
+    )
+    rows = session.execute(
+        select(
+            deleted.c.latitude,
+            deleted.c.longitude,
+            deleted.c.radius_km,
+            deleted.c.actual_population,
+            ChallengeGuess.username,
+            ChallengeGuess.guess,
+            ChallengeGuess.id,
         )
+        .select_from(deleted)
+        .outerjoin(ChallengeGuess, ChallengeGuess.challenge_id == challenge_id)
+        # Closest guess first when the population is known, guess order otherwise
+        .order_by(func.abs(ChallengeGuess.guess - deleted.c.actual_population), ChallengeGuess.id)
+    ).all()
+    if not rows:
+        session.rollback()
+        raise HTTPException(status_code=404, detail="Challenge not found")
 
-    # Sort by difference (closest guess first)
-    rankings.sort(key=lambda x: x["difference"])
+    challenge = rows[0]
+    ranked_guesses = [row for row in rows if row.username is not None]
+    actual_population = challenge.actual_population
+    if actual_population is None:
+        # Background precompute has not finished yet (or failed), compute it inline. A client leaving meanwhile
+        # cancels it and rolls back the delete, the challenge is not ended.
+        actual_population = await run_cancellable(
+            request,
+            session,
+            lambda: _calculate_population_in_circle(
+                session, challenge.latitude, challenge.longitude, challenge.radius_km
+            ),
+        )
+        ranked_guesses.sort(key=lambda row: (abs(row.guess - actual_population), row.id))
+
+    results = calculate_guess_qualifications(actual_population, [row.guess for row in ranked_guesses])
+
+    rankings = [
+        {
+            "username": row.username,
+            "guess": row.guess,
+            "difference": guess_difference,
+            "score": qualification,
+            "accuracy": accuracy,
+            "rank": rank,
+        }
+        for row, guess_difference, qualification, accuracy, rank in zip(
+            ranked_guesses,
+            results.differences.tolist(),
+            results.qualifications.tolist(),
+            results.scores.tolist(),
+            results.ranks.tolist(),
+        )
+    ]
 
-    # Cleanup: delete guesses and challenge
-    session.execute(select(ChallengeGuess).where(ChallengeGuess.challenge_id == challenge_id))
-    for guess in guesses:
-        session.delete(guess)
-    session.delete(challenge)
+    cache_delete(cache, challenge_cache_key(challenge_id))
     session.commit()
 
+    max_rankings = get_settings().CHALLENGE_EVENTS_MAX_RANKINGS
+    await publish_challenge_event(
+        challenge_id,
+        "challenge_ended",
+        {
+            "actual_population": actual_population,
+            "rankings": rankings[:max_rankings],
+            "total_guesses": len(rankings),
+        },
+    )
+
     return EndChallengeResponse(
         success=True,
         message="Challenge ended successfully",
@@ -1,10 +1,9 @@
 from typing import Annotated, Literal
 
-import pymemcache
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 
-from worldguess.dependencies import memcached
+from worldguess.dependencies import MemcachedClient, memcached
 from worldguess.settings import get_settings
 
 router = APIRouter(tags=["checks"], prefix="/health")
@@ -22,7 +21,7 @@ class Status(BaseModel):
 
 @router.get("/ready", response_model=Status)
 async def check_ready(
-    cache: Annotated[pymemcache.Client, Depends(memcached)],
+    cache: Annotated[MemcachedClient, Depends(memcached)],
 ) -> Status:
     cached_status = cache.get(get_settings().PIPELINE_READYNESS_KEY)
     if cached_status is None:
@@ -1,13 +1,47 @@
+import asyncio
 import random
+import time
 import uuid
+from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func, select, text
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..admission import admit, bounds_cost, circle_cost
+from ..cancellation import run_cancellable
+from ..constants import COUNTRY_GRID, POPULATION_GRID, POPULATION_YEAR_GRID
+from ..database import get_read_db
+from ..dependencies import MemcachedClient, memcached
+from ..grid_files import Grid
+from ..grids import get_grid
 from ..orm.tables import LandAreas
-from ..schemas import GameConfig, PopulationResult, RandomGameResponse, SizeClass
+from ..population_cache import SingleFlight, leased_compute, population_data_version, record_population_query
+from ..queries.population_cells import get_population_in_circle_from_cells, has_population_cells
+from ..queries.population_grid import population_by_country, population_in_circle, population_in_circle_per_grid
+from ..queries.population_raster import (
+    POPULATION_IN_MERCATOR_CIRCLE_CLIP_QUERY,
+    POPULATION_IN_MERCATOR_CIRCLE_QUERY,
+    has_population_raster_tiles,
+)
+from ..queries.population_region import (
+    RegionMaskCache,
+    RegionTooComplexError,
+    get_population_in_geometry,
+    population_in_mask,
+)
+from ..query_log import QueryOutcome, normalize_circle, population_cache_key
+from ..schemas import (
+    CountryPopulation,
+    GameConfig,
+    PopulationResult,
+    RandomGameResponse,
+    RegionConfig,
+    RegionPopulationResult,
+    SizeClass,
+    YearPopulation,
+)
 from ..settings import get_settings
 from ..utils.guess_qualification import calculate_guess_qualification
 
@@ -23,29 +57,178 @@ SIZE_CLASS_RANGES: dict[SizeClass, tuple[float, float]] = {
 def _calculate_population_in_circle(session: Session, latitude: float, longitude: float, radius_km: float) -> int:
     """Calculate total population within a circle using raster data.
 
-    Raster operations use raw SQL as they involve PostGIS composite
-    types not directly supported by SQLAlchemy ORM.
+    Uses the population grid exported by the pipeline when available, it is shared by all workers. Otherwise raster
+    operations use raw SQL as they involve PostGIS composite types not directly supported by SQLAlchemy ORM, summing
+    the pre-aggregated population cells once the pipeline has built them.
     """
-    query = text("""
-        WITH circle AS (
-            SELECT ST_Buffer(
-                ST_Transform(ST_SetSRID(ST_MakePoint(:lon, :lat), 4326), 3857),
-                :radius_m
-            )::geometry AS geom
-        ),
-        clipped_rasters AS (
-            SELECT ST_Clip(r.rast, ST_Transform(c.geom, 4326), true) AS rast
-            FROM population_raster r, circle c
-            WHERE ST_Intersects(r.rast, ST_Transform(c.geom, 4326))
+    grid = get_grid(POPULATION_GRID)
+    if grid is not None:
+        return population_in_circle(grid, latitude, longitude, radius_km)
+    if has_population_cells(session):
+        return get_population_in_circle_from_cells(session, latitude, longitude, radius_km)
+
+    query = (
+        POPULATION_IN_MERCATOR_CIRCLE_QUERY
+        if has_population_raster_tiles(session)
+        else POPULATION_IN_MERCATOR_CIRCLE_CLIP_QUERY
+    )
+    result = session.execute(query, {"lat": latitude, "lon": longitude, "radius_m": radius_km * 1000}).scalar()
+
+    return round(result) if result else 0
+
+
+_population_flights: SingleFlight[int] = SingleFlight()
+
+
+async def _get_population_in_circle(
+    request: Request, session: Session, cache: MemcachedClient, latitude: float, longitude: float, radius_km: float
+) -> int:
+    """Population of a circle through the result cache, concurrent requests for the same circle share one computation.
+
+    Only the request that computes is charged for admission, cached results and joined computations cost nothing.
+    """
+    started = time.perf_counter()
+    latitude, longitude, radius_km = normalize_circle(latitude, longitude, radius_km)
+    data_version = population_data_version(session)
+    key = population_cache_key(latitude, longitude, radius_km, data_version or "unversioned")
+    if data_version is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            record_population_query(latitude, longitude, radius_km, started, QueryOutcome.CACHE_HIT)
+            return int(cached)
+    outcome = QueryOutcome.COALESCED if _population_flights.in_flight(key) else QueryOutcome.COMPUTED
+    if outcome == QueryOutcome.COMPUTED:
+        await admit(request, circle_cost(latitude, radius_km))
+
+    async def compute() -> int:
+        return await run_cancellable(
+            request, session, lambda: _calculate_population_in_circle(session, latitude, longitude, radius_km)
         )
-        SELECT COALESCE(SUM((ST_SummaryStats(rast)).sum), 0)::bigint
-        FROM clipped_rasters
-        WHERE rast IS NOT NULL
-    """)
 
-    result = session.execute(query, {"lat": latitude, "lon": longitude, "radius_m": radius_km * 1000}).scalar()
+    if data_version is None:
+        # Nothing loaded yet, not worth caching
+        population = await _population_flights.run(key, compute)
+    else:
+        population = await _population_flights.run(key, lambda: leased_compute(cache, key, compute, str, int))
+    record_population_query(latitude, longitude, radius_km, started, outcome)
+    return population
+
+
+_region_masks: RegionMaskCache | None = None
+
+
+def _calculate_population_in_region(session: Session, region: RegionConfig) -> int:
+    """Zonal sum over the population grid with the region's rasterized mask, cached for repeated regions.
+
+    Without the grid the raster in PostGIS is clipped to the region instead.
+    """
+    global _region_masks
+    grid = get_grid(POPULATION_GRID)
+    if grid is None:
+        return get_population_in_geometry(session, region.geometry.model_dump_json())
+
+    if _region_masks is None:
+        _region_masks = RegionMaskCache(get_settings().REGION_MASK_CACHE_MAX_BYTES)
+    try:
+        mask = _region_masks.get_or_rasterize(region.polygons(), grid)
+    except RegionTooComplexError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    return population_in_mask(grid, mask)
+
+
+def _calculate_population_by_country(
+    latitude: float, longitude: float, radius_km: float
+) -> tuple[int, list[CountryPopulation]]:
+    """Population within a circle split by country, from the country grid aligned with the population grid.
+
+    There is no database fallback, one polygon intersection per country is exactly what the grid avoids.
+    """
+    population_grid = get_grid(POPULATION_GRID)
+    country_grid = get_grid(COUNTRY_GRID)
+    if population_grid is None or country_grid is None:
+        raise HTTPException(status_code=503, detail="Country breakdown not available")
+
+    population, by_country = population_by_country(population_grid, country_grid, latitude, longitude, radius_km)
+    country_metadata = country_grid.metadata["countries"]
+    countries = [
+        CountryPopulation(
+            name=country_metadata[str(country_id)]["name"],
+            iso_code=country_metadata[str(country_id)]["iso_code"],
+            population=country_population,
+        )
+        for country_id, country_population in sorted(by_country.items(), key=lambda item: item[1], reverse=True)
+    ]
+    return population, countries
+
+
+_country_flights: SingleFlight[tuple[int, list[CountryPopulation]]] = SingleFlight()
+_COUNTRY_BREAKDOWN = TypeAdapter(tuple[int, list[CountryPopulation]])
 
-    return int(result) if result else 0
+
+def _encode_country_breakdown(breakdown: tuple[int, list[CountryPopulation]]) -> str:
+    return _COUNTRY_BREAKDOWN.dump_json(breakdown).decode()
+
+
+async def _get_population_by_country(
+    request: Request, session: Session, cache: MemcachedClient, latitude: float, longitude: float, radius_km: float
+) -> tuple[int, list[CountryPopulation]]:
+    """Country breakdown of a circle, cached and coalesced like circle populations and summed in a thread."""
+    latitude, longitude, radius_km = normalize_circle(latitude, longitude, radius_km)
+    data_version = population_data_version(session)
+    key = f"{population_cache_key(latitude, longitude, radius_km, data_version or 'unversioned')}:countries"
+    if data_version is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return _COUNTRY_BREAKDOWN.validate_json(cached)
+    if not _country_flights.in_flight(key):
+        await admit(request, circle_cost(latitude, radius_km))
+
+    async def compute() -> tuple[int, list[CountryPopulation]]:
+        return await asyncio.to_thread(_calculate_population_by_country, latitude, longitude, radius_km)
+
+    if data_version is None:
+        return await _country_flights.run(key, compute)
+    return await _country_flights.run(
+        key,
+        lambda: leased_compute(cache, key, compute, _encode_country_breakdown, _COUNTRY_BREAKDOWN.validate_json),
+    )
+
+
+def _population_grids_by_year() -> dict[int, Grid]:
+    """The population grid of every exported WorldPop year, the latest year's being the population grid itself."""
+    population_grid = get_grid(POPULATION_GRID)
+    if population_grid is None or "year" not in population_grid.metadata:
+        return {}
+    grids = {int(population_grid.metadata["year"]): population_grid}
+    for year in population_grid.metadata.get("years", []):
+        year_grid = get_grid(POPULATION_YEAR_GRID.format(year=year))
+        if int(year) not in grids and year_grid is not None:
+            grids[int(year)] = year_grid
+    return grids
+
+
+def _calculate_population_by_year(
+    latitude: float, longitude: float, radius_km: float, years: list[int]
+) -> tuple[int, list[YearPopulation]]:
+    """Population within a circle today and in each requested year, all summed in one pass over the circle's pixels.
+
+    Like the country breakdown there is no database fallback, only the latest year is loaded into PostGIS.
+    """
+    grids = _population_grids_by_year()
+    if not grids:
+        raise HTTPException(status_code=503, detail="Population by year not available")
+    missing = sorted(set(years) - grids.keys())
+    if missing:
+        raise HTTPException(
+            status_code=422, detail=f"No population data for {missing}, available years are {sorted(grids)}"
+        )
+
+    latest = max(grids)
+    selected = sorted(set(years) | {latest})
+    populations = dict(
+        zip(selected, population_in_circle_per_grid([grids[year] for year in selected], latitude, longitude, radius_km))
+    )
+    return populations[latest], [YearPopulation(year=year, population=populations[year]) for year in years]
 
 
 def _get_random_land_point(session: Session) -> tuple[float, float]:
@@ -138,10 +321,27 @@ def _get_random_land_point(session: Session) -> tuple[float, float]:
 @router.post("/calculate")
 async def calculate_population(
     config: GameConfig,
-    session: Session = Depends(get_db),
+    request: Request,
+    cache: Annotated[MemcachedClient, Depends(memcached)],
+    session: Session = Depends(get_read_db),
 ) -> PopulationResult:
-    """Calculate population within a circular area."""
-    population = _calculate_population_in_circle(session, config.latitude, config.longitude, config.radius_km)
+    """Calculate population within a circular area, optionally broken down by country or with past years, not both."""
+    countries = None
+    years = None
+    if config.by_country:
+        population, countries = await _get_population_by_country(
+            request, session, cache, config.latitude, config.longitude, config.radius_km
+        )
+    elif config.years:
+        # Every additional year is another grid summed over the circle
+        await admit(request, circle_cost(config.latitude, config.radius_km) * (1 + len(config.years)))
+        population, years = await asyncio.to_thread(
+            _calculate_population_by_year, config.latitude, config.longitude, config.radius_km, config.years
+        )
+    else:
+        population = await _get_population_in_circle(
+            request, session, cache, config.latitude, config.longitude, config.radius_km
+        )
 
     qualification = None
     if config.guess is not None:
@@ -155,13 +355,27 @@ async def calculate_population(
         radius_km=config.radius_km,
         size_class=config.size_class,
         qualification=qualification,
+        countries=countries,
+        years=years,
     )
 
 
+@router.post("/calculate/region")
+async def calculate_region_population(
+    region: RegionConfig,
+    request: Request,
+    session: Session = Depends(get_read_db),
+) -> RegionPopulationResult:
+    """Calculate population within a GeoJSON Polygon or MultiPolygon."""
+    await admit(request, bounds_cost(*region.bounds()))
+    population = await run_cancellable(request, session, lambda: _calculate_population_in_region(session, region))
+    return RegionPopulationResult(population=population)
+
+
 @router.post("/random")
 async def create_random_game(
     size_class: SizeClass,
-    session: Session = Depends(get_db),
+    session: Session = Depends(get_read_db),
 ) -> RandomGameResponse:
     """Generate a random game with specified size class."""
     latitude, longitude = _get_random_land_point(session)
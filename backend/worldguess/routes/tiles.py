@@ -0,0 +1,115 @@
+import asyncio
+import gzip
+from pathlib import Path
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy.orm import Session
+
+from ..chunked_grid import ChunkedArray
+from ..constants import POPULATION_GRID
+from ..database import get_read_db
+from ..grid_files import Grid
+from ..grids import get_grid
+from ..queries.land_tiles import get_land_tile
+from ..settings import get_settings
+from ..static import negotiate_encoding
+from ..tiles import PYRAMID_DIR_NAME, DiskTileCache, render_density_tile, tile_path
+from ..utils.http_caching import etag_matches
+
+router = APIRouter(tags=["tiles"], prefix="/tiles")
+
+_tile_cache: DiskTileCache | None = None
+
+
+def _get_tile_cache(data_version: str) -> DiskTileCache:
+    global _tile_cache
+    if _tile_cache is None or _tile_cache.data_version != data_version:
+        settings = get_settings()
+        _tile_cache = DiskTileCache(settings.TILE_CACHE_DIR, data_version, settings.TILE_CACHE_MAX_BYTES)
+    return _tile_cache
+
+
+def _load_density_tile(grid: Grid, data_version: str, z: int, x: int, y: int) -> bytes | None:
+    """Pre-rendered pyramid first, then the on-demand cache, rendering the tile on a miss.
+
+    None for a pyramid tile missing from a chunked grid, rendering a low zoom tile reads most of the chunks.
+    """
+    settings = get_settings()
+    pyramid_tile = tile_path(Path(settings.GRID_DIR) / PYRAMID_DIR_NAME, data_version, z, x, y)
+    if pyramid_tile.exists():
+        return pyramid_tile.read_bytes()
+    if isinstance(grid.array, ChunkedArray) and z <= settings.TILE_PRERENDER_MAX_ZOOM:
+        return None
+
+    cache = _get_tile_cache(data_version)
+    content = cache.get(z, x, y)
+    if content is None:
+        content = render_density_tile(grid.array, grid.transform, z, x, y)
+        cache.put(z, x, y, content)
+    return content
+
+
+@router.get(
+    "/density/{z}/{x}/{y}.png",
+    response_class=Response,
+    responses={200: {"content": {"image/png": {}}}, 304: {"description": "Not modified"}},
+)
+async def get_density_tile(
+    z: int,
+    x: int,
+    y: int,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    """Population density XYZ map tile, transparent where nobody lives."""
+    settings = get_settings()
+    grid = get_grid(POPULATION_GRID)
+    if grid is None or grid.data_version is None:
+        raise HTTPException(status_code=404, detail="Population grid not available")
+    if not (0 <= z <= settings.TILE_MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z):
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    # Tiles only change with the data version
+    etag = f'"{grid.data_version}-{z}-{x}-{y}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.TILE_HTTP_MAX_AGE}"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    content = await asyncio.to_thread(_load_density_tile, grid, grid.data_version, z, x, y)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Tile not pre-rendered")
+    return Response(content=content, media_type="image/png", headers=headers)
+
+
+@router.get(
+    "/land/{z}/{x}/{y}.geojson",
+    response_class=Response,
+    responses={200: {"content": {"application/geo+json": {}}}, 304: {"description": "Not modified"}},
+)
+async def get_land_tile_geojson(
+    z: int,
+    x: int,
+    y: int,
+    session: Session = Depends(get_read_db),
+    if_none_match: Annotated[str | None, Header()] = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
+) -> Response:
+    """Land polygons of an XYZ tile as GeoJSON, simplified to the tile's pixel size by the pipeline."""
+    tile = get_land_tile(session, z, x, y)
+    if tile is None:
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    etag = f'"{tile.data_version}-land-{z}-{x}-{y}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={get_settings().TILE_HTTP_MAX_AGE}",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Stored compressed, only clients that cannot take gzip cost a decompression
+    if negotiate_encoding(accept_encoding, {"gzip": tile.body}) == "gzip":
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=tile.body, media_type="application/geo+json", headers=headers)
+    return Response(content=gzip.decompress(tile.body), media_type="application/geo+json", headers=headers)
@@ -1,7 +1,13 @@
 from enum import Enum
 from typing import Any
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+from pydantic_geojson import MultiPolygonModel, PolygonModel
+
+# WorldPop publishes 2000 to 2020
+MAX_POPULATION_YEARS = 21
+# Positions of all rings of a region together, a detailed country outline has a few thousand
+MAX_REGION_POSITIONS = 20_000
 
 
 class SizeClass(str, Enum):
@@ -24,6 +30,30 @@ class GameConfig(BaseModel):
     radius_km: float = Field(..., gt=0)
     size_class: SizeClass | None = None
     guess: int | None = Field(None, ge=0)
+    by_country: bool = False
+    # Past populations of the circle as well, for the WorldPop years the pipeline exported
+    years: list[int] | None = Field(None, min_length=1, max_length=MAX_POPULATION_YEARS)
+
+    @model_validator(mode="after")
+    def check_breakdown(self) -> "GameConfig":
+        if self.by_country and self.years:
+            raise ValueError("by_country and years can not be requested together")
+        return self
+
+
+class CountryPopulation(BaseModel):
+    """Part of a circle's population living in one country."""
+
+    name: str
+    iso_code: str | None = None
+    population: int
+
+
+class YearPopulation(BaseModel):
+    """Population of a circle in one WorldPop year."""
+
+    year: int
+    population: int
 
 
 class PopulationResult(BaseModel):
@@ -35,6 +65,50 @@ class PopulationResult(BaseModel):
     radius_km: float
     size_class: SizeClass | None = None
     qualification: GuessQualification | None = None
+    # Most populous first, only when requested with by_country
+    countries: list[CountryPopulation] | None = None
+    # In requested order, only when requested with years
+    years: list[YearPopulation] | None = None
+
+
+class RegionConfig(BaseModel):
+    """A GeoJSON Polygon or MultiPolygon to calculate the population of."""
+
+    geometry: PolygonModel | MultiPolygonModel
+
+    @model_validator(mode="after")
+    def check_geometry(self) -> "RegionConfig":
+        expected_type = "Polygon" if isinstance(self.geometry, PolygonModel) else "MultiPolygon"
+        if self.geometry.type != expected_type:
+            raise ValueError(f"Coordinates do not match geometry type {self.geometry.type}")
+        polygons = self.polygons()
+        for polygon in polygons:
+            if not polygon or any(len(ring) < 4 for ring in polygon):
+                raise ValueError("Polygon rings need at least four positions")
+        if sum(len(ring) for polygon in polygons for ring in polygon) > MAX_REGION_POSITIONS:
+            raise ValueError(f"Regions may have at most {MAX_REGION_POSITIONS} positions")
+        return self
+
+    def polygons(self) -> list[list[list[tuple[float, float]]]]:
+        """Polygons as lists of rings of (longitude, latitude), the first ring of each is the exterior."""
+        if isinstance(self.geometry, PolygonModel):
+            polygons = [self.geometry.coordinates]
+        else:
+            polygons = self.geometry.coordinates
+        return [[[(position.lon, position.lat) for position in ring] for ring in polygon] for polygon in polygons]
+
+    def bounds(self) -> tuple[float, float, float, float]:
+        """West, south, east and north limits of the exterior rings."""
+        exteriors = [position for polygon in self.polygons() for position in polygon[0]]
+        longitudes = [longitude for longitude, _ in exteriors]
+        latitudes = [latitude for _, latitude in exteriors]
+        return min(longitudes), min(latitudes), max(longitudes), max(latitudes)
+
+
+class RegionPopulationResult(BaseModel):
+    """Result of population calculation within a region."""
+
+    population: int
 
 
 class RandomGameResponse(BaseModel):
@@ -93,10 +167,36 @@ class SubmitGuessResponse(BaseModel):
     message: str
 
 
+class SubmitGuessesRequest(BaseModel):
+    """Request to submit many guesses for a challenge at once, e.g. relayed by a chat bot."""
+
+    guesses: list[SubmitGuessRequest] = Field(..., min_length=1, max_length=1000)
+
+
+class SubmitGuessesResponse(BaseModel):
+    """Response for bulk guess submission."""
+
+    success: bool
+    message: str
+    accepted: list[str]
+    rejected: list[str]
+
+
+class RankingEntry(BaseModel):
+    """A guess of an ended challenge with its score."""
+
+    username: str
+    guess: int
+    difference: int
+    score: GuessQualification
+    accuracy: float
+    rank: int
+
+
 class EndChallengeResponse(BaseModel):
     """Response for ending a challenge."""
 
     success: bool
     message: str
     actual_population: int
-    rankings: list[dict[str, Any]]
+    rankings: list[RankingEntry]
@@ -1,14 +1,18 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from .constants import PIPELINE_READYNESS_KEY
+from .constants import PIPELINE_READYNESS_KEY, POPULATION_GRID
+from .utils.database_url import PostgresDriver
 
 
 class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8090
     RELOAD: bool = False
+    # Uvicorn worker processes, reload only works with a single worker
+    WORKERS: int = 1
     DEBUG: bool = False
     STATIC_DIR: str = "./static"
     BASE_URL: str = "http://localhost:8090"
@@ -17,8 +21,72 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = "worldguess"
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: int = 5432
+    POSTGRES_DRIVER: PostgresDriver = "psycopg2"
+    # psycopg only, prepare a statement after this many executions on a connection, unset to disable
+    POSTGRES_PREPARE_THRESHOLD: int | None = 2
+    # Connections all workers together may open, split evenly between them
+    DB_CONNECTION_BUDGET: int = 60
+    # Comma separated host[:port] list, read-only routes use these when set
+    POSTGRES_REPLICA_HOSTS: str = ""
+    # Per replica, split between workers like DB_CONNECTION_BUDGET
+    REPLICA_CONNECTION_BUDGET: int = 60
+    # How long a replica that failed to connect is skipped
+    REPLICA_RETRY_SECONDS: float = 10.0
+    # Deadline for all queries of a request, enforced by Postgres statement_timeout, 0 disables it
+    QUERY_TIMEOUT_SECONDS: float = 30.0
+    # Otherwise startup fails when the schema is behind and migrations must be run separately
+    MIGRATE_ON_STARTUP: bool = True
     PIPELINE_READYNESS_KEY: str = PIPELINE_READYNESS_KEY
     MEMCACHE_SERVER: str = "memcached"
+    # How long the dummy client stands in after memcached failed to connect
+    MEMCACHE_RETRY_SECONDS: float = 10.0
+    # Raster aligned arrays exported by the pipeline, shared between workers instead of loaded once each
+    GRID_DIR: str = "/data/grids"
+    GRID_SHARING: Literal["mmap", "shm"] = "mmap"
+    # Comma separated grids copied to shared memory with GRID_SHARING "shm" and several WORKERS, the others are
+    # memory-mapped. /dev/shm must hold their .npy files, about 3.1 GB for the 1 km population grid.
+    SHARED_GRIDS: str = POPULATION_GRID
+    # "chunked" reads grids from their compressed chunk stores instead, for hosts that cannot map whole grids. RSS is
+    # bounded by the cache of decompressed chunks.
+    GRID_STORAGE: Literal["array", "chunked"] = "array"
+    GRID_CHUNK_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    # Density tiles deeper than the pre-rendered pyramid are rendered on demand into this LRU disk cache
+    TILE_CACHE_DIR: str = "/tmp/worldguess_tiles"
+    TILE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    TILE_MAX_ZOOM: int = 12
+    # Deepest zoom the pipeline pre-renders. With GRID_STORAGE "chunked" these are only served from the pyramid,
+    # rendering them would decompress most of the grid.
+    TILE_PRERENDER_MAX_ZOOM: int = 6
+    TILE_HTTP_MAX_AGE: int = 24 * 60 * 60
+    # Population query cost is counted in grid pixels. Each worker admits this many per second with bursts up to
+    # ADMISSION_COST_BURST and answers 503 beyond, each client this many per minute across workers before 429.
+    # 0 disables the limit.
+    ADMISSION_COST_PER_SECOND: float = 100_000_000
+    ADMISSION_COST_BURST: float = 200_000_000
+    ADMISSION_CLIENT_COST_PER_MINUTE: int = 500_000_000
+    # Circle populations are cached per data version, one process computes a circle while the others wait on its
+    # lease for at most POPULATION_LEASE_SECONDS
+    POPULATION_CACHE_SECONDS: int = 7 * 24 * 60 * 60
+    POPULATION_LEASE_SECONDS: int = 30
+    # Served circles are appended here for the pipeline to warm the cache after a data refresh, empty disables it
+    QUERY_LOG_DIR: str = ""
+    QUERY_LOG_MAX_BYTES: int = 64 * 1024 * 1024
+    # Rasterized masks of queried regions, reused while the same polygons are queried again
+    REGION_MASK_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Challenges older than this are deleted by the background reaper, 0 disables expiry
+    CHALLENGE_TTL_SECONDS: int = 0
+    CHALLENGE_REAPER_INTERVAL_SECONDS: int = 5 * 60
+    CHALLENGE_REAPER_BATCH_SIZE: int = 500
+    CHALLENGE_EXPIRY_WEBHOOK: bool = True
+    # "postgres" distributes live challenge events across workers and API instances with LISTEN/NOTIFY, "local" only
+    # reaches streams of the same process. Unset picks "postgres" with several WORKERS.
+    CHALLENGE_EVENTS_BROKER: Literal["local", "postgres"] | None = None
+    CHALLENGE_EVENTS_KEEPALIVE_SECONDS: float = 15.0
+    CHALLENGE_EVENTS_MAX_RANKINGS: int = 50
+    CHALLENGE_CACHE_SECONDS: int = 60 * 60
+    CHALLENGE_HTTP_MAX_AGE: int = 60
+    # API responses smaller than this are sent uncompressed
+    GZIP_MINIMUM_SIZE: int = 1024
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
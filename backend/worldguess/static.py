@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import Scope
+
+from .utils.http_caching import etag_matches
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".json", ".map", ".svg", ".txt", ".ico", ".webmanifest"}
+MIN_COMPRESS_SIZE = 1024
+# Create React App puts a content hash in the name of everything under static/
+HASHED_FILENAME = re.compile(r"\.[0-9a-f]{8,}\.")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Tie breaker between content codings the client accepts with the same quality
+ENCODING_PREFERENCE = {"br": 1, "gzip": 0}
+
+
+@dataclass
+class StaticAsset:
+    full_path: str
+    stat_result: os.stat_result
+    media_type: str
+    etag: str
+    cache_control: str
+    # Precompressed bodies by content coding, smaller than the original
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+
+def negotiate_encoding(accept_encoding: str | None, available: dict[str, bytes]) -> str | None:
+    """Pick the preferred available content coding, brotli over gzip on equal quality."""
+    if not accept_encoding or not available:
+        return None
+
+    qualities: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    candidates = [
+        (qualities.get(coding, qualities.get("*", 0.0)), preference, coding)
+        for coding, preference in ENCODING_PREFERENCE.items()
+        if coding in available
+    ]
+    quality, _, coding = max(candidates, default=(0.0, 0, ""))
+    return coding if quality > 0 else None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """Static files served from precompressed in-memory copies with long-lived caching for hashed names.
+
+    Call precompress() once at startup, until then (or for files that appear later) it behaves like StaticFiles.
+    Conditional requests for known assets are answered from the precomputed ETag without touching the disk.
+    """
+
+    def __init__(self, *, directory: str, html: bool = False, check_dir: bool = True) -> None:
+        super().__init__(directory=directory, html=html, check_dir=check_dir)
+        self.assets: dict[str, StaticAsset] = {}
+
+    def precompress(self) -> None:
+        root = Path(str(self.directory))
+        original_size = 0
+        compressed_size = 0
+        assets: dict[str, StaticAsset] = {}
+
+        for path in root.rglob("*"):
+            if not path.is_file():
+                continue
+
+            content = path.read_bytes()
+            relative_path = path.relative_to(root).as_posix()
+            asset = StaticAsset(
+                full_path=str(path),
+                stat_result=path.stat(),
+                media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+                etag=f'"{hashlib.md5(content, usedforsecurity=False).hexdigest()}"',
+                cache_control=IMMUTABLE_CACHE_CONTROL
+                if HASHED_FILENAME.search(path.name)
+                else REVALIDATE_CACHE_CONTROL,
+            )
+
+            if path.suffix in COMPRESSIBLE_SUFFIXES and len(content) >= MIN_COMPRESS_SIZE:
+                encoded = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    encoded["br"] = brotli.compress(content, quality=11)
+                asset.encoded = {coding: body for coding, body in encoded.items() if len(body) < len(content)}
+                original_size += len(content)
+                compressed_size += min((len(body) for body in asset.encoded.values()), default=len(content))
+
+            assets[relative_path] = asset
+
+        self.assets = assets
+        logger.info(
+            f"Precompressed static assets: {len(assets)} files, "
+            f"{original_size / 1024:.0f} KiB of text assets down to {compressed_size / 1024:.0f} KiB"
+        )
+
+    def _find_asset(self, path: str, scope: Scope) -> StaticAsset | None:
+        relative_path = Path(path).as_posix()
+        asset = self.assets.get(relative_path)
+        # Directories are served their index.html, "/" arrives as "." here. Without the trailing slash StaticFiles
+        # redirects first.
+        if asset is None and self.html and scope["path"].endswith("/"):
+            asset = self.assets.get("index.html" if relative_path == "." else f"{relative_path}/index.html")
+        return asset
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        asset = self._find_asset(path, scope)
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            response = await super().get_response(path, scope)
+            response.headers.setdefault("Cache-Control", REVALIDATE_CACHE_CONTROL)
+            return response
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding"), asset.encoded)
+        # Each representation needs its own strong validator
+        etag = asset.etag if encoding is None else f'{asset.etag[:-1]}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+
+        if etag_matches(request_headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+            return Response(content=asset.encoded[encoding], media_type=asset.media_type, headers=headers)
+
+        return FileResponse(
+            asset.full_path, stat_result=asset.stat_result, media_type=asset.media_type, headers=headers
+        )
@@ -0,0 +1,201 @@
+"""Population density map tiles rendered from the population grid.
+
+Shared by the API, which renders deep zoom tiles on demand, and the pipeline, which pre-renders the low zooms into
+a disk pyramid. Only numpy, Pillow and the numpy-only chunk store are imported here so the pipeline can use it
+without the API settings.
+"""
+
+import io
+import math
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+import numpy.typing as npt
+from PIL import Image
+
+from .chunked_grid import GridArray
+
+TILE_SIZE = 256
+# Pre-rendered pyramid written by the pipeline next to the exported grids
+PYRAMID_DIR_NAME = "density_tiles"
+EARTH_RADIUS_KM = 6371.0088
+# People per km² mapped to the top of the color ramp, the ramp is logarithmic below it
+MAX_DENSITY = 10_000.0
+
+
+class RasterTransform(Protocol):
+    @property
+    def west(self) -> float: ...
+
+    @property
+    def north(self) -> float: ...
+
+    @property
+    def pixel_width(self) -> float: ...
+
+    @property
+    def pixel_height(self) -> float: ...
+
+
+def _color_ramp() -> npt.NDArray[np.uint8]:
+    """256 RGBA entries from transparent through yellow and orange to dark red."""
+    stops = np.array(
+        [
+            [255, 255, 178, 0],
+            [254, 204, 92, 150],
+            [253, 141, 60, 190],
+            [240, 59, 32, 215],
+            [189, 0, 38, 235],
+        ],
+        dtype=np.float64,
+    )
+    positions = np.linspace(0, 255, len(stops))
+    ramp = np.stack([np.interp(np.arange(256), positions, stops[:, channel]) for channel in range(4)], axis=1)
+    return ramp.round().astype(np.uint8)
+
+
+COLOR_RAMP = _color_ramp()
+
+
+def tile_path(root: str | Path, data_version: str, z: int, x: int, y: int) -> Path:
+    return Path(root) / data_version / str(z) / str(x) / f"{y}.png"
+
+
+def _tile_latitudes(z: int, y: int) -> npt.NDArray[np.float64]:
+    """Latitude of the TILE_SIZE + 1 pixel edges of a tile row, north first."""
+    n = 2**z
+    mercator_y = math.pi * (1 - 2 * (y + np.arange(TILE_SIZE + 1) / TILE_SIZE) / n)
+    latitudes: npt.NDArray[np.float64] = np.degrees(np.arctan(np.sinh(mercator_y)))
+    return latitudes
+
+
+def _tile_longitudes(z: int, x: int) -> npt.NDArray[np.float64]:
+    n = 2**z
+    longitudes: npt.NDArray[np.float64] = (x + np.arange(TILE_SIZE + 1) / TILE_SIZE) / n * 360.0 - 180.0
+    return longitudes
+
+
+def _block_means(
+    array: GridArray, row_edges: npt.NDArray[np.int64], column_edges: npt.NDArray[np.int64]
+) -> npt.NDArray[np.float64]:
+    """Mean of the grid pixels under every tile pixel, tile pixels smaller than a grid pixel take its value."""
+    row_start, row_stop = int(row_edges[0]), int(max(row_edges[-1], row_edges[0] + 1))
+    column_start, column_stop = int(column_edges[0]), int(max(column_edges[-1], column_edges[0] + 1))
+    # A view, low zoom tiles cover most of the grid and must not be copied
+    block = array[row_start:row_stop, column_start:column_stop]
+
+    # reduceat needs indices inside the block, equal consecutive indices pick a single row or column
+    row_indices = np.minimum(row_edges[:-1] - row_start, block.shape[0] - 1)
+    column_indices = np.minimum(column_edges[:-1] - column_start, block.shape[1] - 1)
+    row_sums = np.add.reduceat(block, row_indices, axis=0, dtype=np.float64)
+    sums = np.add.reduceat(row_sums, column_indices, axis=1)
+    row_counts = np.maximum(np.diff(row_edges), 1)
+    column_counts = np.maximum(np.diff(column_edges), 1)
+    means: npt.NDArray[np.float64] = sums / np.outer(row_counts, column_counts)
+    return means
+
+
+def render_density_tile(array: GridArray, transform: RasterTransform, z: int, x: int, y: int) -> bytes:
+    """Render the XYZ (Web Mercator) tile z/x/y of a population count grid as an RGBA PNG."""
+    height, width = array.shape[:2]
+    latitudes = _tile_latitudes(z, y)
+    longitudes = _tile_longitudes(z, x)
+
+    # Fractional grid coordinates of the tile pixel edges
+    rows = (transform.north - latitudes) / transform.pixel_height
+    columns = (longitudes - transform.west) / transform.pixel_width
+    row_inside = (rows[:-1] + rows[1:]) / 2
+    column_inside = (columns[:-1] + columns[1:]) / 2
+    row_mask = (row_inside >= 0) & (row_inside < height)
+    column_mask = (column_inside >= 0) & (column_inside < width)
+
+    rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    if row_mask.any() and column_mask.any():
+        row_edges = np.clip(np.floor(rows), 0, height).astype(np.int64)
+        column_edges = np.clip(np.floor(columns), 0, width).astype(np.int64)
+        means = _block_means(array, row_edges, column_edges)
+
+        # Grid pixels shrink towards the poles, convert counts to people per km²
+        center_latitudes = np.radians((latitudes[:-1] + latitudes[1:]) / 2)
+        pixel_area_km2 = (
+            np.radians(transform.pixel_height)
+            * np.radians(transform.pixel_width)
+            * EARTH_RADIUS_KM**2
+            * np.cos(center_latitudes)
+        )
+        density = means / pixel_area_km2[:, np.newaxis]
+        levels = np.clip(np.log1p(density) / math.log1p(MAX_DENSITY) * 255, 0, 255).astype(np.uint8)
+        levels[density <= 0] = 0
+        colors = COLOR_RAMP[levels]
+        colors[~(row_mask[:, np.newaxis] & column_mask[np.newaxis, :])] = 0
+        rgba = colors
+
+    output = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(output, format="PNG", optimize=False, compress_level=6)
+    return output.getvalue()
+
+
+def write_tile(path: Path, content: bytes) -> None:
+    """Write atomically, concurrent readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(file_descriptor, "wb") as temporary_file:
+        temporary_file.write(content)
+    os.replace(temporary_path, path)
+
+
+class DiskTileCache:
+    """Tiles rendered on demand, evicted least recently used first once max_bytes is exceeded.
+
+    Only the current data version is kept, directories of other versions are removed when the cache is opened.
+    """
+
+    def __init__(self, root: str | Path, data_version: str, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.data_version = data_version
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Path, int] = OrderedDict()
+        self._size = 0
+        self._load()
+
+    def _load(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        for version_dir in self.root.iterdir():
+            if version_dir.name != self.data_version and version_dir.is_dir():
+                shutil.rmtree(version_dir, ignore_errors=True)
+
+        version_root = self.root / self.data_version
+        existing = [(path.stat().st_mtime, path) for path in version_root.rglob("*.png")]
+        for _, path in sorted(existing):
+            size = path.stat().st_size
+            self._entries[path] = size
+            self._size += size
+
+    def get(self, z: int, x: int, y: int) -> bytes | None:
+        path = tile_path(self.root, self.data_version, z, x, y)
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+        return content
+
+    def put(self, z: int, x: int, y: int, content: bytes) -> None:
+        path = tile_path(self.root, self.data_version, z, x, y)
+        write_tile(path, content)
+        with self._lock:
+            self._size += len(content) - self._entries.pop(path, 0)
+            self._entries[path] = len(content)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                evicted, size = self._entries.popitem(last=False)
+                self._size -= size
+                evicted.unlink(missing_ok=True)
@@ -0,0 +1,25 @@
+from typing import Any, Literal
+
+from sqlalchemy import URL
+
+PostgresDriver = Literal["psycopg2", "psycopg"]
+
+
+def build_database_url(
+    driver: PostgresDriver, user: str, password: str, host: str, port: int | str, database: str
+) -> URL:
+    """Connection URL shared by the API and the pipeline, the password is escaped properly."""
+    return URL.create(
+        f"postgresql+{driver}", username=user, password=password, host=host, port=int(port), database=database
+    )
+
+
+def driver_connect_args(driver: PostgresDriver, prepare_threshold: int | None) -> dict[str, Any]:
+    """Driver specific connection arguments.
+
+    psycopg 3 prepares a statement server-side once the same query text ran prepare_threshold times on a connection,
+    later executions skip parsing and planning. None disables it, which is needed behind pgbouncer in transaction mode.
+    """
+    if driver == "psycopg":
+        return {"prepare_threshold": prepare_threshold}
+    return {}
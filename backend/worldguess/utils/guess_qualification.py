@@ -1,4 +1,23 @@
 import math
+from typing import NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+
+QUALIFICATIONS = np.array(["good", "meh", "bad"])
+
+
+def _base_tolerance(actual: int) -> float:
+    # Calculate order of magnitude of the actual value
+    magnitude = math.log10(max(actual, 1))
+
+    # Base tolerance decreases logarithmically with magnitude
+    # magnitude 0 (1-10): 200% tolerance (2.0)
+    # magnitude 1 (10-100): 100% tolerance (1.0)
+    # magnitude 2 (100-1000): 66% tolerance (0.66)
+    # magnitude 3 (1000-10000): 50% tolerance (0.5)
+    # magnitude 4+ (10000+): 40% tolerance (0.4)
+    return max(0.4, 2.0 / (1 + magnitude))
 
 
 def calculate_guess_qualification(actual: int, guess: int) -> str:
@@ -19,16 +38,7 @@ def calculate_guess_qualification(actual: int, guess: int) -> str:
     if difference == 0:
         return "good"
 
-    # Calculate order of magnitude of the actual value
-    magnitude = math.log10(max(actual, 1))
-
-    # Base tolerance decreases logarithmically with magnitude
-    # magnitude 0 (1-10): 200% tolerance (2.0)
-    # magnitude 1 (10-100): 100% tolerance (1.0)
-    # magnitude 2 (100-1000): 66% tolerance (0.66)
-    # magnitude 3 (1000-10000): 50% tolerance (0.5)
-    # magnitude 4+ (10000+): 40% tolerance (0.4)
-    base_tolerance = max(0.4, 2.0 / (1 + magnitude))
+    base_tolerance = _base_tolerance(actual)
 
     error_ratio = difference / actual
 
@@ -42,3 +52,41 @@ def calculate_guess_qualification(actual: int, guess: int) -> str:
 
     # Bad: beyond 2x base tolerance
     return "bad"
+
+
+class BatchQualification(NamedTuple):
+    qualifications: npt.NDArray[np.str_]
+    differences: npt.NDArray[np.int64]
+    # Continuous score in (0, 1], 0.5 at the good/meh boundary and 1/3 at the meh/bad one
+    scores: npt.NDArray[np.float64]
+    # Dense ranks by difference, 1 is the closest guess and equal differences share a rank
+    ranks: npt.NDArray[np.int64]
+
+
+def calculate_guess_qualifications(actual: int, guesses: npt.ArrayLike) -> BatchQualification:
+    """Vectorized version of calculate_guess_qualification for many guesses of one actual value.
+
+    Qualifications match the scalar function element by element.
+    """
+    guess_array = np.asarray(guesses, dtype=np.int64).reshape(-1)
+    differences = np.abs(guess_array - actual)
+
+    if actual == 0:
+        levels = np.where(guess_array <= 10, 0, np.where(guess_array <= 100, 1, 2))
+        normalized_error = guess_array / 10
+    else:
+        base_tolerance = _base_tolerance(actual)
+        error_ratio = differences / actual
+        levels = np.where(error_ratio <= base_tolerance, 0, np.where(error_ratio <= base_tolerance * 2, 1, 2))
+        zero_guess_level = 0 if actual <= 10 else 1 if actual <= 100 else 2
+        levels = np.where(guess_array == 0, zero_guess_level, levels)
+        normalized_error = error_ratio / base_tolerance
+
+    _, inverse = np.unique(differences, return_inverse=True)
+
+    return BatchQualification(
+        qualifications=QUALIFICATIONS[levels],
+        differences=differences,
+        scores=1 / (1 + normalized_error),
+        ranks=inverse.astype(np.int64) + 1,
+    )
@@ -113,6 +113,20 @@ def test_challenge_flow():
         assert duplicate_response.status_code == 400, "Duplicate should be rejected"
         print("✓ Duplicate username rejected")
 
+        print("\n5b. Submitting a batch of guesses relayed by a bot...")
+        bulk_response = client.post(
+            f"/v1/challenge/{challenge_id}/guesses",
+            json={"guesses": [{"username": "Dave", "guess": 100000}, {"username": "Alice", "guess": 999999}]},
+        )
+        assert bulk_response.status_code == 200, f"Bulk guess failed: {bulk_response.text}"
+        bulk_data = bulk_response.json()
+        assert bulk_data["accepted"] == ["Dave"], f"Unexpected accepted guesses: {bulk_data}"
+        assert bulk_data["rejected"] == ["Alice"], f"Unexpected rejected guesses: {bulk_data}"
+        print("✓ Batch submitted, duplicate username rejected")
+        time.sleep(0.5)
+        assert len(webhook_messages) == 4, f"Expected 4 webhooks, got {len(webhook_messages)}"
+        initial_webhook_count = len(webhook_messages)
+
         print("\n6. Ending challenge...")
         end_response = client.post(f"/v1/challenge/{challenge_id}/end")
         assert end_response.status_code == 200, f"End failed: {end_response.text}"
@@ -126,7 +140,7 @@ def test_challenge_flow():
         assert end_data["actual_population"] > 0, "actual_population should be positive"
 
         # Verify rankings are correct
-        assert len(end_data["rankings"]) == 3, f"Expected 3 rankings, got {len(end_data['rankings'])}"
+        assert len(end_data["rankings"]) == 4, f"Expected 4 rankings, got {len(end_data['rankings'])}"
         assert end_data["rankings"][0]["username"] == "Bob", "Bob should be ranked first"
 
         # Verify each ranking has score field
@@ -141,7 +155,7 @@ def test_challenge_flow():
         for msg in webhook_messages[initial_webhook_count:]:
             print(f"  - {msg}")
 
-        # Should have NO webhooks after ending (only 3 from guesses)
+        # Should have NO webhooks after ending (only 4 from guesses)
         assert end_webhooks == 0, f"Expected 0 end webhooks, got {end_webhooks}"
 
         print("\n8. Verifying challenge cleanup...")
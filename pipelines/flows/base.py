@@ -12,9 +12,47 @@ from dotenv import load_dotenv
 from sqlalchemy import Connection, Engine, create_engine
 from sqlalchemy.orm import Session, sessionmaker
 
+from backend.worldguess.utils.database_url import PostgresDriver, build_database_url
+
 load_dotenv()
 
 TIMEOUT = int(os.getenv("JOB_TIMEOUT", 1800))  # 30 minutes for large raster processing
+POSTGRES_DRIVER: PostgresDriver = "psycopg" if os.getenv("POSTGRES_DRIVER") == "psycopg" else "psycopg2"
+
+
+def psql_command() -> tuple[list[str], dict[str, str]]:
+    """psql invocation and environment for streaming SQL or COPY data into the database."""
+    pg_host = os.getenv("POSTGRES_HOST", "localhost")
+    pg_port = os.getenv("POSTGRES_PORT", "5432")
+    pg_user = os.getenv("POSTGRES_USER", "postgres")
+    pg_db = os.getenv("POSTGRES_DB", "postgres")
+
+    psql_cmd = [
+        "psql",
+        "-h",
+        pg_host,
+        "-p",
+        pg_port,
+        "-U",
+        pg_user,
+        "-d",
+        pg_db,
+        "-q",
+    ]
+
+    env = os.environ.copy()
+    env["PGPASSWORD"] = os.getenv("POSTGRES_PASSWORD", "postgres")
+    return psql_cmd, env
+
+
+def ogr_connection_string() -> str:
+    """GDAL PostgreSQL datasource for importing vector data with ogr2ogr."""
+    pg_host = os.getenv("POSTGRES_HOST", "localhost")
+    pg_port = os.getenv("POSTGRES_PORT", "5432")
+    pg_user = os.getenv("POSTGRES_USER", "postgres")
+    pg_password = os.getenv("POSTGRES_PASSWORD", "postgres")
+    pg_db = os.getenv("POSTGRES_DB", "postgres")
+    return f"PG:host={pg_host} port={pg_port} dbname={pg_db} user={pg_user} password={pg_password}"
 
 
 class JobStatus(StrEnum):
@@ -99,7 +137,7 @@ class Job(abc.ABC):
         pg_user = os.getenv("POSTGRES_USER", "postgres")
         pg_password = os.getenv("POSTGRES_PASSWORD", "postgres")
         pg_db = os.getenv("POSTGRES_DB", "postgres")
-        self.engine = create_engine(f"postgresql+psycopg2://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_db}")
+        self.engine = create_engine(build_database_url(POSTGRES_DRIVER, pg_user, pg_password, pg_host, pg_port, pg_db))
 
     @contextmanager
     def with_pg_connection(self) -> Generator[Connection, None, None]:
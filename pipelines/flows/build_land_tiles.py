@@ -0,0 +1,126 @@
+import gzip
+import logging
+import math
+import os
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from .base import Job, JobStatus, RunStatusType
+
+# Zoom 6 is 5461 tiles in total, clients overzoom the deepest level
+LAND_TILE_MAX_ZOOM = int(os.getenv("LAND_TILE_MAX_ZOOM", 6))
+TILE_SIZE = 256
+
+# Every tile of a zoom level as a GeoJSON FeatureCollection, empty for ocean tiles. Polygons are simplified to a
+# tile pixel, smaller ones are dropped, and clipped to the tile so clients never draw more than they show.
+LAND_TILES_QUERY = text("""
+    WITH simplified AS MATERIALIZED (
+        SELECT id, ST_SimplifyPreserveTopology(geom, :tolerance) AS geom
+        FROM land_areas
+        WHERE ST_Area(geom) >= :tolerance * :tolerance
+    ),
+    tiles AS (
+        SELECT x, y, ST_Transform(ST_TileEnvelope(:z, x, y), 4326) AS envelope
+        FROM generate_series(0, :tile_count - 1) AS x, generate_series(0, :tile_count - 1) AS y
+    ),
+    clipped AS (
+        SELECT t.x, t.y, s.id, ST_ClipByBox2D(s.geom, t.envelope::box2d) AS geom
+        FROM tiles t
+        JOIN simplified s ON s.geom && t.envelope
+    )
+    SELECT t.x, t.y, json_build_object(
+        'type', 'FeatureCollection',
+        'features', COALESCE(
+            json_agg(
+                json_build_object(
+                    'type', 'Feature',
+                    'id', c.id,
+                    'properties', json_build_object(),
+                    'geometry', ST_AsGeoJSON(c.geom, :digits)::json
+                )
+            ) FILTER (WHERE c.geom IS NOT NULL AND NOT ST_IsEmpty(c.geom)),
+            '[]'::json
+        )
+    )::text AS geojson
+    FROM tiles t
+    LEFT JOIN clipped c ON c.x = t.x AND c.y = t.y
+    GROUP BY t.x, t.y
+""")
+
+
+def simplify_tolerance(z: int) -> float:
+    """Width of a tile pixel in degrees at zoom z."""
+    return 360.0 / (TILE_SIZE * 2**z)
+
+
+def coordinate_digits(tolerance: float) -> int:
+    """Decimal digits that keep rounding below half the simplification tolerance."""
+    return max(0, math.ceil(-math.log10(tolerance / 2)))
+
+
+class BuildLandTiles(Job):
+    """Precompute simplified land polygons per XYZ tile as gzip compressed GeoJSON blobs for the API."""
+
+    def __init__(self, name: str, dependencies: list[Job] | None, data_version: str) -> None:
+        super().__init__(name, dependencies)
+        self.data_version = data_version
+
+    def run(self) -> RunStatusType:
+        try:
+            self._build_tiles()
+            return JobStatus.SUCCESS
+        except (SQLAlchemyError, ValueError) as e:
+            logging.error(f"BuildLandTiles failed: {e}")
+            return JobStatus.FAILURE
+
+    def _build_tiles(self) -> None:
+        with self.with_pg_connection() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS land_tiles_new"))
+            connection.execute(
+                text("""
+                    CREATE TABLE land_tiles_new (
+                        z SMALLINT NOT NULL,
+                        x INTEGER NOT NULL,
+                        y INTEGER NOT NULL,
+                        data_version TEXT NOT NULL,
+                        body BYTEA NOT NULL,
+                        PRIMARY KEY (z, x, y)
+                    )
+                """)
+            )
+
+            total_bytes = 0
+            for z in range(LAND_TILE_MAX_ZOOM + 1):
+                tolerance = simplify_tolerance(z)
+                rows = connection.execute(
+                    LAND_TILES_QUERY,
+                    {"z": z, "tile_count": 2**z, "tolerance": tolerance, "digits": coordinate_digits(tolerance)},
+                )
+                tiles = [
+                    {
+                        "z": z,
+                        "x": row.x,
+                        "y": row.y,
+                        "data_version": self.data_version,
+                        "body": gzip.compress(row.geojson.encode(), compresslevel=9, mtime=0),
+                    }
+                    for row in rows
+                ]
+                connection.execute(
+                    text(
+                        "INSERT INTO land_tiles_new (z, x, y, data_version, body)"
+                        " VALUES (:z, :x, :y, :data_version, :body)"
+                    ),
+                    tiles,
+                )
+                zoom_bytes = sum(len(tile["body"]) for tile in tiles)
+                total_bytes += zoom_bytes
+                logging.info(f"Built {len(tiles)} land tiles for zoom {z} ({zoom_bytes} bytes compressed)")
+
+            # Swap the complete table in at once, the API never sees a partially built one
+            connection.execute(text("DROP TABLE IF EXISTS land_tiles"))
+            connection.execute(text("ALTER TABLE land_tiles_new RENAME TO land_tiles"))
+            connection.execute(text("ALTER INDEX land_tiles_new_pkey RENAME TO land_tiles_pkey"))
+
+        logging.info(f"Land tiles built up to zoom {LAND_TILE_MAX_ZOOM}, {total_bytes} bytes compressed")
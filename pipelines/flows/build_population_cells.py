@@ -0,0 +1,126 @@
+import logging
+import subprocess
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import rasterio
+from rasterio.errors import RasterioError
+from rasterio.transform import Affine
+from rasterio.windows import Window
+from sqlalchemy import text
+
+from .base import Job, JobStatus, RunStatusType, psql_command
+from .load_population_raster import download_worldpop_data
+
+# Level 0 cells are BASE_CELL_PIXELS wide and each level above doubles the size, 32 px up to 4096 px (~4 km to
+# ~500 km at the equator). Cells are aligned with the raster pixels and the 256x256 raster2pgsql tiles.
+BASE_CELL_PIXELS = 32
+CELL_LEVELS = 8
+
+
+def _pool_2x2(cells: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Sum 2x2 blocks, odd edges are padded with zeros."""
+    height, width = cells.shape
+    padded = np.pad(cells, ((0, height % 2), (0, width % 2)))
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+    pooled: npt.NDArray[np.float64] = blocks.sum(axis=(1, 3))
+    return pooled
+
+
+class BuildPopulationCells(Job):
+    """Pre-aggregate the population raster into a quadtree of cells holding population totals.
+
+    Circle queries sum the largest cells that lie inside the circle and only clip the raster under the level 0 cells
+    crossing its boundary. Cells without population are not stored, none of their children have any either.
+    """
+
+    def run(self) -> RunStatusType:
+        try:
+            tiff_path = download_worldpop_data()
+            levels, transform, width, height = self._aggregate(tiff_path)
+            self._load_cells(levels, transform, width, height)
+            return JobStatus.SUCCESS
+        except (OSError, RasterioError, RuntimeError, subprocess.CalledProcessError) as e:
+            logging.error(f"BuildPopulationCells failed: {e}")
+            return JobStatus.FAILURE
+
+    def _aggregate(self, tiff_path: Path) -> tuple[list[npt.NDArray[np.float64]], Affine, int, int]:
+        logging.info("Aggregating population raster into cells...")
+        with rasterio.open(tiff_path) as dataset:
+            columns = -(-dataset.width // BASE_CELL_PIXELS)
+            rows = -(-dataset.height // BASE_CELL_PIXELS)
+            base = np.zeros((rows, columns), dtype=np.float64)
+
+            # One row of level 0 cells at a time keeps memory small
+            for cell_row in range(rows):
+                row = cell_row * BASE_CELL_PIXELS
+                window = Window(0, row, dataset.width, min(BASE_CELL_PIXELS, dataset.height - row))
+                band = np.clip(dataset.read(1, window=window, masked=True).filled(0), 0, None).astype(np.float64)
+                band = np.pad(band, ((0, 0), (0, columns * BASE_CELL_PIXELS - dataset.width)))
+                base[cell_row] = band.reshape(band.shape[0], columns, BASE_CELL_PIXELS).sum(axis=(0, 2))
+
+            levels = [base]
+            for _ in range(1, CELL_LEVELS):
+                levels.append(_pool_2x2(levels[-1]))
+            return levels, dataset.transform, dataset.width, dataset.height
+
+    def _cell_rows(
+        self, levels: list[npt.NDArray[np.float64]], transform: Affine, width: int, height: int
+    ) -> Iterator[str]:
+        """CSV rows for COPY, cell polygons as EWKT."""
+        for level, cells in enumerate(levels):
+            cell_pixels = BASE_CELL_PIXELS * 2**level
+            for y, x in zip(*np.nonzero(cells > 0)):
+                # Clamp to the raster extent so edge cells only cover real pixels
+                xmin, ymax = transform * (x * cell_pixels, y * cell_pixels)
+                xmax, ymin = transform * (min((x + 1) * cell_pixels, width), min((y + 1) * cell_pixels, height))
+                polygon = f"POLYGON(({xmin} {ymin},{xmax} {ymin},{xmax} {ymax},{xmin} {ymax},{xmin} {ymin}))"
+                yield f"{level},{x},{y},{float(cells[y, x])!r},SRID=4326;{polygon}\n"
+
+    def _load_cells(self, levels: list[npt.NDArray[np.float64]], transform: Affine, width: int, height: int) -> None:
+        with self.with_pg_connection() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS population_cells_new"))
+            connection.execute(
+                text("""
+                    CREATE TABLE population_cells_new (
+                        level SMALLINT NOT NULL,
+                        x INTEGER NOT NULL,
+                        y INTEGER NOT NULL,
+                        population DOUBLE PRECISION NOT NULL,
+                        geom geometry(POLYGON, 4326) NOT NULL,
+                        PRIMARY KEY (level, x, y)
+                    )
+                """)
+            )
+
+        psql_cmd, env = psql_command()
+        copy_cmd = [*psql_cmd, "-c", "COPY population_cells_new FROM STDIN WITH (FORMAT csv)"]
+        logging.info(f"Piping cells to: {' '.join(copy_cmd)}")
+        psql_process = subprocess.Popen(
+            copy_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env
+        )
+        if psql_process.stdin is None:
+            raise RuntimeError("Could not open psql stdin")
+
+        cell_count = 0
+        for row in self._cell_rows(levels, transform, width, height):
+            psql_process.stdin.write(row)
+            cell_count += 1
+        _, psql_stderr = psql_process.communicate()
+        if psql_process.returncode != 0:
+            raise subprocess.CalledProcessError(psql_process.returncode, copy_cmd, stderr=psql_stderr)
+
+        # Swap the complete table in at once, queries never see a partially loaded one
+        with self.with_pg_connection() as connection:
+            connection.execute(
+                text("CREATE INDEX population_cells_new_geom_idx ON population_cells_new USING GIST (geom)")
+            )
+            connection.execute(text("DROP TABLE IF EXISTS population_cells"))
+            connection.execute(text("ALTER TABLE population_cells_new RENAME TO population_cells"))
+            connection.execute(text("ALTER INDEX population_cells_new_geom_idx RENAME TO population_cells_geom_idx"))
+            connection.execute(text("ALTER INDEX population_cells_new_pkey RENAME TO population_cells_pkey"))
+            connection.execute(text("ANALYZE population_cells"))
+
+        logging.info(f"Loaded {cell_count} population cells in {len(levels)} levels")
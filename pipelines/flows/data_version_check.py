@@ -2,7 +2,8 @@ from sqlalchemy import exists, select
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.orm import Session
 
-from backend.worldguess.orm.tables import Base, DataVersion
+from backend.worldguess.migrations import migrate
+from backend.worldguess.orm.tables import DataVersion
 
 from .base import Job
 
@@ -18,8 +19,7 @@ def has_data_version(database_session: Session, version_hash: str) -> bool:
 
 def should_skip_pipeline(job: Job, version_hash: str) -> bool:
     with job.with_pg_session() as database_session:
-        database_engine = database_session.bind
-        if database_engine is not None:
-            Base.metadata.create_all(bind=database_engine)
+        if job.engine is not None:
+            migrate(job.engine)
 
         return has_data_version(database_session, version_hash)
@@ -0,0 +1,62 @@
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from backend.worldguess.chunked_grid import CHUNKS_SUFFIX, CorruptChunkError, read_chunked_header, write_chunked_grid
+
+from .base import Job, JobStatus, RunStatusType
+from .export_population_grid import GRID_DIR
+
+
+def exported_grids(grid_dir: Path, data_version: str) -> list[str]:
+    """Names of the grids exported for a data version, partial exports have no metadata yet.
+
+    Grids left over from other versions, e.g. of a year no longer exported, are not chunked.
+    """
+    names = []
+    for metadata_path in sorted(grid_dir.glob("*.json")):
+        if metadata_path.with_suffix(".npy").exists():
+            if json.loads(metadata_path.read_text()).get("data_version") == data_version:
+                names.append(metadata_path.stem)
+    return names
+
+
+def chunked_grids_are_current(data_version: str, grid_dir: str = GRID_DIR) -> bool:
+    """Whether every grid has a chunk store of this data version."""
+    for name in exported_grids(Path(grid_dir), data_version):
+        try:
+            if read_chunked_header(Path(grid_dir) / f"{name}{CHUNKS_SUFFIX}").get("data_version") != data_version:
+                return False
+        except (OSError, CorruptChunkError):
+            return False
+    return True
+
+
+class ExportChunkedGrids(Job):
+    """Write the exported grids again as compressed chunk stores, for API hosts that cannot map whole grids."""
+
+    def __init__(self, name: str, dependencies: list[Job] | None, data_version: str) -> None:
+        super().__init__(name, dependencies)
+        self.data_version = data_version
+
+    def run(self) -> RunStatusType:
+        try:
+            grid_dir = Path(GRID_DIR)
+            for name in exported_grids(grid_dir, self.data_version):
+                self._export(grid_dir, name)
+            return JobStatus.SUCCESS
+        except (OSError, ValueError) as e:
+            logging.error(f"ExportChunkedGrids failed: {e}")
+            return JobStatus.FAILURE
+
+    def _export(self, grid_dir: Path, name: str) -> None:
+        array = np.load(grid_dir / f"{name}.npy", mmap_mode="r")
+        chunks_path = grid_dir / f"{name}{CHUNKS_SUFFIX}"
+        write_chunked_grid(array, chunks_path, self.data_version)
+        size = chunks_path.stat().st_size
+        logging.info(
+            f"Wrote chunk store of grid {name} to {chunks_path}, "
+            f"{size / 1024**2:.0f} MiB for {array.nbytes / 1024**2:.0f} MiB of grid"
+        )
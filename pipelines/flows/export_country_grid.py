@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import shapely
+from rasterio.errors import RasterioError
+from rasterio.features import rasterize
+from rasterio.transform import Affine
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.worldguess.constants import COUNTRY_GRID, POPULATION_GRID
+
+from .base import Job, JobStatus, RunStatusType
+from .export_population_grid import GRID_DIR, READ_BLOCK_ROWS
+
+
+class ExportCountryGrid(Job):
+    """Rasterize the country boundaries into an id grid aligned pixel for pixel with the population grid.
+
+    A pixel gets the id of the country containing its center, 0 outside every country. Ids and names are stored in
+    the grid metadata so the API can break circle populations down by country with a bincount over the same pixels
+    it sums, without touching the database.
+    """
+
+    def __init__(self, name: str, dependencies: list[Job] | None, data_version: str) -> None:
+        super().__init__(name, dependencies)
+        self.data_version = data_version
+
+    def run(self) -> RunStatusType:
+        try:
+            self._export(Path(GRID_DIR))
+            return JobStatus.SUCCESS
+        except (OSError, RasterioError, SQLAlchemyError, ValueError, KeyError) as e:
+            logging.error(f"ExportCountryGrid failed: {e}")
+            return JobStatus.FAILURE
+
+    def _load_countries(self) -> tuple[dict[int, dict[str, str | None]], list[tuple[int, shapely.Geometry]]]:
+        with self.with_pg_connection() as connection:
+            rows = connection.execute(
+                text("SELECT id, name, iso_code, ST_AsBinary(geometry) AS wkb FROM countries ORDER BY id")
+            ).all()
+        if not rows:
+            raise ValueError("No countries loaded")
+        if rows[-1].id > np.iinfo(np.uint16).max:
+            raise ValueError("Too many countries for a uint16 grid")
+
+        countries = {row.id: {"name": row.name, "iso_code": row.iso_code} for row in rows}
+        geometries = [(row.id, shapely.from_wkb(bytes(row.wkb))) for row in rows]
+        return countries, geometries
+
+    def _export(self, grid_dir: Path) -> None:
+        population_metadata = json.loads((grid_dir / f"{POPULATION_GRID}.json").read_text())
+        width, height = population_metadata["width"], population_metadata["height"]
+        transform = Affine(
+            population_metadata["pixel_width"],
+            0,
+            population_metadata["west"],
+            0,
+            -population_metadata["pixel_height"],
+            population_metadata["north"],
+        )
+        countries, geometries = self._load_countries()
+        bounds = np.array([geometry.bounds for _, geometry in geometries])
+
+        partial_path = grid_dir / f"{COUNTRY_GRID}.partial.npy"
+        grid = np.lib.format.open_memmap(partial_path, mode="w+", dtype=np.uint16, shape=(height, width))
+        for row in range(0, height, READ_BLOCK_ROWS):
+            rows = min(READ_BLOCK_ROWS, height - row)
+            block_transform = transform * Affine.translation(0, row)
+            block_north = population_metadata["north"] - row * population_metadata["pixel_height"]
+            block_south = block_north - rows * population_metadata["pixel_height"]
+            # Only countries reaching into the block's latitudes, rasterize cost grows with the shapes passed in
+            overlapping = np.nonzero((bounds[:, 1] <= block_north) & (bounds[:, 3] >= block_south))[0]
+            shapes = [(geometries[index][1], geometries[index][0]) for index in overlapping]
+            if shapes:
+                grid[row : row + rows] = rasterize(
+                    shapes, out_shape=(rows, width), transform=block_transform, fill=0, dtype="uint16"
+                )
+            else:
+                grid[row : row + rows] = 0
+        grid.flush()
+        del grid
+
+        metadata = {
+            key: population_metadata[key] for key in ("west", "north", "pixel_width", "pixel_height", "width", "height")
+        }
+        metadata["data_version"] = self.data_version
+        metadata["countries"] = {str(country_id): country for country_id, country in countries.items()}
+
+        # Workers map the file, replace it atomically so they never see a partial grid
+        os.replace(partial_path, grid_dir / f"{COUNTRY_GRID}.npy")
+        metadata_path = grid_dir / f"{COUNTRY_GRID}.json"
+        metadata_path.with_suffix(".json.partial").write_text(json.dumps(metadata))
+        os.replace(metadata_path.with_suffix(".json.partial"), metadata_path)
+        logging.info(f"Exported country grid of {len(countries)} countries to {grid_dir / f'{COUNTRY_GRID}.npy'}")
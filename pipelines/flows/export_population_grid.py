@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import rasterio
+from rasterio.errors import RasterioError
+from rasterio.windows import Window
+
+from backend.worldguess.constants import POPULATION_GRID, POPULATION_YEAR_GRID
+
+from .base import Job, JobStatus, RunStatusType
+from .load_population_raster import LATEST_POPULATION_YEAR, POPULATION_YEARS, download_worldpop_data
+
+GRID_DIR = os.getenv("GRID_DIR", "/data/grids")
+# Rows read per window, keeps memory bounded for the ~40k x 17k global raster
+READ_BLOCK_ROWS = 1024
+ALIGNMENT_KEYS = ["west", "north", "pixel_width", "pixel_height", "width", "height"]
+
+
+def grid_is_current(data_version: str, grid_dir: str = GRID_DIR, name: str = POPULATION_GRID) -> bool:
+    """Whether the grid was already exported for this data version."""
+    metadata_path = Path(grid_dir) / f"{name}.json"
+    if not metadata_path.exists() or not metadata_path.with_suffix(".npy").exists():
+        return False
+    with open(metadata_path) as metadata_file:
+        return bool(json.load(metadata_file).get("data_version") == data_version)
+
+
+class ExportPopulationGrid(Job):
+    """Export the population raster as a .npy grid the backend workers memory-map or share.
+
+    Nodata and negative values are stored as zero so sums need no masking. The latest year is the population grid,
+    every other year gets a grid of its own, aligned pixel for pixel, which the API sums over the same circle spans.
+    """
+
+    def __init__(self, name: str, dependencies: list[Job] | None, data_version: str) -> None:
+        super().__init__(name, dependencies)
+        self.data_version = data_version
+
+    def run(self) -> RunStatusType:
+        try:
+            grid_dir = Path(GRID_DIR)
+            aligned_with: dict[str, Any] | None = None
+            # The population grid last, once it is current every year is
+            for year in POPULATION_YEARS:
+                if year != LATEST_POPULATION_YEAR:
+                    name = POPULATION_YEAR_GRID.format(year=year)
+                    aligned_with = self._export(download_worldpop_data(year), grid_dir, name, year, aligned_with)
+            self._export(download_worldpop_data(), grid_dir, POPULATION_GRID, LATEST_POPULATION_YEAR, aligned_with)
+            return JobStatus.SUCCESS
+        except (OSError, RasterioError, ValueError) as e:
+            logging.error(f"ExportPopulationGrid failed: {e}")
+            return JobStatus.FAILURE
+
+    def _export(
+        self, tiff_path: Path, grid_dir: Path, name: str, year: int, aligned_with: dict[str, Any] | None
+    ) -> dict[str, Any]:
+        """Export one year's grid and return its metadata, raising when it is not aligned with another grid's."""
+        grid_dir.mkdir(parents=True, exist_ok=True)
+        array_path = grid_dir / f"{name}.npy"
+        partial_path = grid_dir / f"{name}.partial.npy"
+
+        with rasterio.open(tiff_path) as dataset:
+            transform = dataset.transform
+            if transform.b != 0 or transform.d != 0:
+                raise ValueError("Population raster must be north-up")
+
+            grid = np.lib.format.open_memmap(
+                partial_path, mode="w+", dtype=np.float32, shape=(dataset.height, dataset.width)
+            )
+            for row in range(0, dataset.height, READ_BLOCK_ROWS):
+                rows = min(READ_BLOCK_ROWS, dataset.height - row)
+                block = dataset.read(1, window=Window(0, row, dataset.width, rows), masked=True)
+                grid[row : row + rows] = np.clip(block.filled(0), 0, None)
+            grid.flush()
+            del grid
+
+            metadata = {
+                "west": transform.c,
+                "north": transform.f,
+                "pixel_width": transform.a,
+                "pixel_height": -transform.e,
+                "width": dataset.width,
+                "height": dataset.height,
+                "data_version": self.data_version,
+                "year": year,
+            }
+        if name == POPULATION_GRID:
+            metadata["years"] = POPULATION_YEARS
+        if aligned_with is not None and any(metadata[key] != aligned_with[key] for key in ALIGNMENT_KEYS):
+            # Every year is summed over the same pixel spans
+            raise ValueError(f"Population raster of {year} is not aligned with the other years")
+
+        # Workers map the file, replace it atomically so they never see a partial grid
+        os.replace(partial_path, array_path)
+        metadata_path = grid_dir / f"{name}.json"
+        metadata_path.with_suffix(".json.partial").write_text(json.dumps(metadata))
+        os.replace(metadata_path.with_suffix(".json.partial"), metadata_path)
+        logging.info(f"Exported population grid {metadata['width']}x{metadata['height']} to {array_path}")
+        return metadata
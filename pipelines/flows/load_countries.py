@@ -0,0 +1,92 @@
+import logging
+import subprocess
+import zipfile
+from pathlib import Path
+
+import requests
+from sqlalchemy import text
+
+from .base import Job, JobStatus, RunStatusType, ogr_connection_string
+
+# Natural Earth admin 0 boundaries, 1:10m like the land polygons
+NATURAL_EARTH_COUNTRIES_URL = "https://naturalearth.s3.amazonaws.com/10m_cultural/ne_10m_admin_0_countries.zip"
+
+
+class LoadCountries(Job):
+    """Load country boundaries into the countries table.
+
+    Countries get ids in name order, so the ids stored in the country grid stay stable between loads of the same
+    data. Natural Earth marks missing ISO codes with -99, the EH variant fills most of them.
+    """
+
+    def run(self) -> RunStatusType:
+        try:
+            shapefile_dir = self._download_countries()
+            self._import_to_postgis(shapefile_dir)
+            return JobStatus.SUCCESS
+        except (OSError, requests.RequestException, RuntimeError) as e:
+            logging.error(f"LoadCountries failed: {e}")
+            return JobStatus.FAILURE
+
+    def _download_countries(self) -> Path:
+        download_dir = Path("/tmp/worldguess")
+        download_dir.mkdir(exist_ok=True)
+        zip_path = download_dir / "ne_10m_admin_0_countries.zip"
+        extract_dir = download_dir / "ne_10m_admin_0_countries"
+
+        if extract_dir.exists() and any(extract_dir.glob("*.shp")):
+            logging.info("Country data already downloaded")
+            return extract_dir
+
+        logging.info(f"Downloading country data from {NATURAL_EARTH_COUNTRIES_URL}")
+        response = requests.get(NATURAL_EARTH_COUNTRIES_URL, stream=True, timeout=300)
+        response.raise_for_status()
+        with open(zip_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                f.write(chunk)
+
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            zip_ref.extractall(extract_dir)
+        return extract_dir
+
+    def _import_to_postgis(self, shapefile_dir: Path) -> None:
+        shapefile = next(shapefile_dir.glob("*.shp"))
+        ogr2ogr_cmd = [
+            "ogr2ogr",
+            "-f",
+            "PostgreSQL",
+            ogr_connection_string(),
+            str(shapefile),
+            "-nln",
+            "countries_import",
+            "-lco",
+            "GEOMETRY_NAME=geom",
+            "-nlt",
+            "MULTIPOLYGON",
+            "-t_srs",
+            "EPSG:4326",
+            "-overwrite",
+        ]
+        logging.info(f"Running: {' '.join(ogr2ogr_cmd)}")
+        result = subprocess.run(ogr2ogr_cmd, capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"Failed to import countries: {result.stderr}")
+
+        # The countries table belongs to the API migrations, replace its rows in one transaction
+        with self.with_pg_connection() as connection:
+            connection.execute(text("TRUNCATE countries RESTART IDENTITY"))
+            connection.execute(
+                text("""
+                    INSERT INTO countries (name, iso_code, geometry)
+                    SELECT
+                        name,
+                        COALESCE(NULLIF(iso_a3_eh, '-99'), NULLIF(iso_a3, '-99'), adm0_a3),
+                        ST_Multi(ST_CollectionExtract(ST_MakeValid(geom), 3))
+                    FROM countries_import
+                    ORDER BY name
+                """)
+            )
+            connection.execute(text("DROP TABLE countries_import"))
+            connection.execute(text("ANALYZE countries"))
+            count = connection.execute(text("SELECT COUNT(*) FROM countries")).scalar()
+        logging.info(f"Loaded {count} countries")
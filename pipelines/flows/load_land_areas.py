@@ -1,12 +1,11 @@
 import logging
-import os
 import zipfile
 from pathlib import Path
 
 import requests
 from sqlalchemy import text
 
-from .base import Job, JobStatus, RunStatusType
+from .base import Job, JobStatus, RunStatusType, ogr_connection_string
 
 logging.basicConfig(level=logging.INFO)
 
@@ -71,13 +70,7 @@ class LoadLandAreas(Job):
         shapefile = next(shapefile_dir.glob("*.shp"))
         logging.info(f"Found shapefile: {shapefile}")
 
-        pg_host = os.getenv("POSTGRES_HOST", "localhost")
-        pg_port = os.getenv("POSTGRES_PORT", "5432")
-        pg_user = os.getenv("POSTGRES_USER", "postgres")
-        pg_password = os.getenv("POSTGRES_PASSWORD", "postgres")
-        pg_db = os.getenv("POSTGRES_DB", "postgres")
-
-        connection_string = f"PG:host={pg_host} port={pg_port} dbname={pg_db} user={pg_user} password={pg_password}"
+        connection_string = ogr_connection_string()
 
         ogr2ogr_cmd = [
             "ogr2ogr",
@@ -3,19 +3,34 @@ import os
 import subprocess
 import sys
 import tempfile
+from collections.abc import Container, Iterable
 from pathlib import Path
+from typing import IO
 
+import numpy as np
+import rasterio
 import requests
-from sqlalchemy import create_engine, text
+from rasterio.errors import RasterioError
+from rasterio.windows import Window
+from sqlalchemy import text
 
-from .base import Job, JobStatus, RunStatusType
+from .base import Job, JobStatus, RunStatusType, psql_command
 
 WORLDPOP_POPULATION_DENSITY = (
-    "https://data.worldpop.org/GIS/Population/Global_2000_2020/2020/0_Mosaicked/ppp_2020_1km_Aggregated.tif"
+    "https://data.worldpop.org/GIS/Population/Global_2000_2020/{year}/0_Mosaicked/ppp_{year}_1km_Aggregated.tif"
 )
+# WorldPop years exported as aligned grids, the latest is the one loaded into PostGIS and queried by default
+POPULATION_YEARS = sorted({int(year) for year in os.getenv("POPULATION_YEARS", "2000,2010,2020").split(",")})
+LATEST_POPULATION_YEAR = POPULATION_YEARS[-1]
 
 PIPELINE_READYNESS_KEY = "pipeline_ready"
 
+# raster2pgsql -t tile size, emptiness is scanned over the same blocks
+RASTER_TILE_SIZE = 256
+RASTER_INSERT_PREFIX = b"INSERT INTO "
+
+TileExtent = tuple[float, float, float, float]
+
 
 def format_bytes(num_bytes: int) -> str:
     size = float(num_bytes)
@@ -26,68 +41,129 @@ def format_bytes(num_bytes: int) -> str:
     return f"{size:.1f} PB"
 
 
+def download_worldpop_data(year: int = LATEST_POPULATION_YEAR) -> Path:
+    """Download the WorldPop raster of a year once, later runs reuse the cached copy."""
+    cache_dir = Path(tempfile.gettempdir()) / "worldguess_cache"
+    cache_dir.mkdir(exist_ok=True)
+    tiff_path = cache_dir / f"worldpop_{year}_1km.tif"
+
+    if tiff_path.exists():
+        logging.info(f"Using cached WorldPop data: {tiff_path}")
+        return tiff_path
+
+    logging.info(f"Downloading WorldPop {year} population density data...")
+
+    headers: dict[str, str] = {}
+    if tiff_path.exists():
+        headers["Range"] = f"bytes={tiff_path.stat().st_size}-"
+
+    response = requests.get(WORLDPOP_POPULATION_DENSITY.format(year=year), headers=headers, stream=True)
+    response.raise_for_status()
+
+    total_size = int(response.headers.get("content-length", 0))
+    total_formatted = format_bytes(total_size)
+    logging.info(f"Starting download of {total_formatted}...")
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    downloaded_bytes = 0
+    log_interval = max(1, total_size // 100)  # Log every 1% for better visibility
+
+    with open(tiff_path, "ab" if "Range" in headers else "wb") as file_handle:
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                file_handle.write(chunk)
+                downloaded_bytes += len(chunk)
+
+                if downloaded_bytes % log_interval < len(chunk):
+                    progress_percent = (downloaded_bytes / total_size) * 100
+                    downloaded_formatted = format_bytes(downloaded_bytes)
+                    total_formatted = format_bytes(total_size)
+                    logging.info(
+                        f"Download progress: {progress_percent:.1f}% ({downloaded_formatted}/{total_formatted})"
+                    )
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+
+    logging.info(f"Downloaded WorldPop data to: {tiff_path}")
+    return tiff_path
+
+
+def find_empty_tiles(tiff_path: Path, tile_size: int = RASTER_TILE_SIZE) -> tuple[dict[int, TileExtent], int]:
+    """Tiles whose pixels are all nodata or zero, by raster2pgsql tile index, and the total tile count.
+
+    raster2pgsql numbers tiles row by row from the top left, edge tiles are cut short rather than padded. Extents are
+    (west, south, east, north).
+    """
+    empty: dict[int, TileExtent] = {}
+    with rasterio.open(tiff_path) as dataset:
+        transform = dataset.transform
+        tiles_x = -(-dataset.width // tile_size)
+        tiles_y = -(-dataset.height // tile_size)
+        for tile_y in range(tiles_y):
+            row = tile_y * tile_size
+            rows = min(tile_size, dataset.height - row)
+            block = dataset.read(1, window=Window(0, row, dataset.width, rows), masked=True).filled(0)
+            populated = (block != 0) & ~np.isnan(block)
+            padded = np.zeros((rows, tiles_x * tile_size), dtype=bool)
+            padded[:, : dataset.width] = populated
+            tile_populated = padded.reshape(rows, tiles_x, tile_size).any(axis=(0, 2))
+            for tile_x in np.flatnonzero(~tile_populated):
+                column = int(tile_x) * tile_size
+                empty[tile_y * tiles_x + int(tile_x)] = (
+                    transform.c + column * transform.a,
+                    transform.f + (row + rows) * transform.e,
+                    transform.c + min(column + tile_size, dataset.width) * transform.a,
+                    transform.f + row * transform.e,
+                )
+    return empty, tiles_x * tiles_y
+
+
+def filter_tile_inserts(sql_lines: Iterable[bytes], empty_tiles: Container[int], out: IO[bytes]) -> tuple[int, int]:
+    """Copy raster2pgsql output to out without the INSERTs of empty tiles, return the bytes kept and dropped.
+
+    raster2pgsql writes one INSERT line per tile in tile order, everything else passes through unchanged.
+    """
+    kept = dropped = 0
+    tile = 0
+    for line in sql_lines:
+        if line.startswith(RASTER_INSERT_PREFIX):
+            is_empty = tile in empty_tiles
+            tile += 1
+            if is_empty:
+                dropped += len(line)
+                continue
+        kept += len(line)
+        out.write(line)
+    return kept, dropped
+
+
 class LoadPopulationRaster(Job):
     def run(self) -> RunStatusType:
         try:
-            tiff_path = self._download_worldpop_data()
-            self._import_raster_to_postgis(tiff_path)
+            tiff_path = download_worldpop_data()
+            empty_tiles, tile_count = find_empty_tiles(tiff_path)
+            logging.info(f"{len(empty_tiles)} of {tile_count} raster tiles are empty and will not be imported")
+            self._import_raster_to_postgis(tiff_path, empty_tiles)
+            self._record_empty_tiles(empty_tiles)
+            self._create_tile_statistics()
             self._create_spatial_indexes()
 
             if self.cache_set(PIPELINE_READYNESS_KEY, "done"):
                 return JobStatus.SUCCESS
             return JobStatus.FAILURE
 
-        except (OSError, requests.RequestException, RuntimeError, subprocess.CalledProcessError) as e:
+        except (
+            OSError,
+            requests.RequestException,
+            RasterioError,
+            RuntimeError,
+            subprocess.CalledProcessError,
+        ) as e:
             logging.error(f"LoadPopulationRaster failed: {e}")
             return JobStatus.FAILURE
 
-    def _download_worldpop_data(self) -> Path:
-        cache_dir = Path(tempfile.gettempdir()) / "worldguess_cache"
-        cache_dir.mkdir(exist_ok=True)
-        tiff_path = cache_dir / "worldpop_2020_1km.tif"
-
-        if tiff_path.exists():
-            logging.info(f"Using cached WorldPop data: {tiff_path}")
-            return tiff_path
-
-        logging.info("Downloading WorldPop population density data...")
-
-        headers: dict[str, str] = {}
-        if tiff_path.exists():
-            headers["Range"] = f"bytes={tiff_path.stat().st_size}-"
-
-        response = requests.get(WORLDPOP_POPULATION_DENSITY, headers=headers, stream=True)
-        response.raise_for_status()
-
-        total_size = int(response.headers.get("content-length", 0))
-        total_formatted = format_bytes(total_size)
-        logging.info(f"Starting download of {total_formatted}...")
-        sys.stdout.flush()
-        sys.stderr.flush()
-
-        downloaded_bytes = 0
-        log_interval = max(1, total_size // 100)  # Log every 1% for better visibility
-
-        with open(tiff_path, "ab" if "Range" in headers else "wb") as file_handle:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file_handle.write(chunk)
-                    downloaded_bytes += len(chunk)
-
-                    if downloaded_bytes % log_interval < len(chunk):
-                        progress_percent = (downloaded_bytes / total_size) * 100
-                        downloaded_formatted = format_bytes(downloaded_bytes)
-                        total_formatted = format_bytes(total_size)
-                        logging.info(
-                            f"Download progress: {progress_percent:.1f}% ({downloaded_formatted}/{total_formatted})"
-                        )
-                        sys.stdout.flush()
-                        sys.stderr.flush()
-
-        logging.info(f"Downloaded WorldPop data to: {tiff_path}")
-        return tiff_path
-
-    def _import_raster_to_postgis(self, tiff_path: Path) -> None:
+    def _import_raster_to_postgis(self, tiff_path: Path, empty_tiles: Container[int]) -> None:
         logging.info("Importing raster data to PostGIS...")
         self._clean_existing_data()
 
@@ -98,57 +174,43 @@ class LoadPopulationRaster(Job):
             "-s",
             "4326",
             "-t",
-            "256x256",
+            f"{RASTER_TILE_SIZE}x{RASTER_TILE_SIZE}",
             str(tiff_path),
             "population_raster",
         ]
 
         logging.info(f"Running: {' '.join(raster2pgsql_cmd)}")
 
-        raster2pgsql_process = subprocess.Popen(
-            raster2pgsql_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-        )
+        raster2pgsql_process = subprocess.Popen(raster2pgsql_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-        pg_host = os.getenv("POSTGRES_HOST", "localhost")
-        pg_port = os.getenv("POSTGRES_PORT", "5432")
-        pg_user = os.getenv("POSTGRES_USER", "postgres")
-        pg_db = os.getenv("POSTGRES_DB", "postgres")
-
-        psql_cmd = [
-            "psql",
-            "-h",
-            pg_host,
-            "-p",
-            pg_port,
-            "-U",
-            pg_user,
-            "-d",
-            pg_db,
-            "-q",
-        ]
-
-        env = os.environ.copy()
-        env["PGPASSWORD"] = os.getenv("POSTGRES_PASSWORD", "postgres")
+        psql_cmd, env = psql_command()
 
         logging.info(f"Piping to: {' '.join(psql_cmd)}")
 
-        psql_process = subprocess.Popen(
-            psql_cmd,
-            stdin=raster2pgsql_process.stdout,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            env=env,
-        )
-
-        # Close raster2pgsql stdout to allow psql to receive EOF
-        if raster2pgsql_process.stdout:
-            raster2pgsql_process.stdout.close()
-
-        # Wait for both processes to complete
-        psql_stdout, psql_stderr = psql_process.communicate()
-        raster2pgsql_process.wait()  # Ensure raster2pgsql process is complete
-        raster2pgsql_stderr = raster2pgsql_process.stderr.read() if raster2pgsql_process.stderr else ""
+        # psql output goes to files, a pipe nobody reads while we write its input could fill up and stall both
+        with tempfile.TemporaryFile() as psql_output:
+            psql_process = subprocess.Popen(
+                psql_cmd, stdin=subprocess.PIPE, stdout=psql_output, stderr=subprocess.STDOUT, env=env
+            )
+            if raster2pgsql_process.stdout is None or psql_process.stdin is None:
+                raise RuntimeError("Could not pipe raster2pgsql into psql")
+            try:
+                kept_bytes, dropped_bytes = filter_tile_inserts(
+                    raster2pgsql_process.stdout, empty_tiles, psql_process.stdin
+                )
+            finally:
+                # Close psql's stdin so it receives EOF
+                psql_process.stdin.close()
+                raster2pgsql_process.stdout.close()
+
+            # Wait for both processes to complete
+            psql_process.wait()
+            raster2pgsql_process.wait()
+            raster2pgsql_stderr = (
+                raster2pgsql_process.stderr.read().decode(errors="replace") if raster2pgsql_process.stderr else ""
+            )
+            psql_output.seek(0)
+            psql_output_text = psql_output.read().decode(errors="replace")
 
         # Log detailed error information for debugging
         logging.info(f"raster2pgsql return code: {raster2pgsql_process.returncode}")
@@ -156,10 +218,8 @@ class LoadPopulationRaster(Job):
 
         if raster2pgsql_stderr:
             logging.error(f"raster2pgsql stderr: {raster2pgsql_stderr}")
-        if psql_stderr:
-            logging.error(f"psql stderr: {psql_stderr}")
-        if psql_stdout:
-            logging.info(f"psql stdout: {psql_stdout}")
+        if psql_output_text:
+            logging.error(f"psql output: {psql_output_text}")
 
         # Check for errors
         if raster2pgsql_process.returncode is not None and raster2pgsql_process.returncode != 0:
@@ -168,18 +228,46 @@ class LoadPopulationRaster(Job):
             )
 
         if psql_process.returncode is not None and psql_process.returncode != 0:
-            raise subprocess.CalledProcessError(psql_process.returncode, psql_cmd, stderr=psql_stderr)
+            raise subprocess.CalledProcessError(psql_process.returncode, psql_cmd, output=psql_output_text)
 
-        logging.info("Successfully imported raster data to PostGIS")
+        total_bytes = kept_bytes + dropped_bytes
+        logging.info(
+            f"Skipped {format_bytes(dropped_bytes)} of {format_bytes(total_bytes)} raster SQL "
+            f"({dropped_bytes / max(total_bytes, 1):.0%}) for empty tiles"
+        )
+        with self.with_pg_connection() as database_connection:
+            table_bytes = database_connection.execute(
+                text("SELECT pg_total_relation_size('population_raster')")
+            ).scalar_one()
+        logging.info(
+            f"Successfully imported raster data to PostGIS, population_raster is {format_bytes(table_bytes)} "
+            f"with indexes, about {format_bytes(table_bytes * total_bytes // max(kept_bytes, 1))} without skipping"
+        )
 
-    def _get_database_url(self) -> str:
-        """Get database URL for connections."""
-        pg_host = os.getenv("POSTGRES_HOST", "localhost")
-        pg_port = os.getenv("POSTGRES_PORT", "5432")
-        pg_user = os.getenv("POSTGRES_USER", "postgres")
-        pg_password = os.getenv("POSTGRES_PASSWORD", "postgres")
-        pg_db = os.getenv("POSTGRES_DB", "postgres")
-        return f"postgresql+psycopg2://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_db}"
+    def _record_empty_tiles(self, empty_tiles: dict[int, TileExtent]) -> None:
+        """Keep the extents of the tiles left out, a gap in population_raster there is not missing data."""
+        with self.with_pg_connection() as database_connection:
+            database_connection.execute(text("DROP TABLE IF EXISTS population_raster_empty_tiles"))
+            database_connection.execute(
+                text("""
+                    CREATE TABLE population_raster_empty_tiles (
+                        tile integer PRIMARY KEY,
+                        envelope geometry(POLYGON, 4326) NOT NULL
+                    )
+                """)
+            )
+            if empty_tiles:
+                database_connection.execute(
+                    text("""
+                        INSERT INTO population_raster_empty_tiles (tile, envelope)
+                        VALUES (:tile, ST_MakeEnvelope(:west, :south, :east, :north, 4326))
+                    """),
+                    [
+                        {"tile": tile, "west": west, "south": south, "east": east, "north": north}
+                        for tile, (west, south, east, north) in empty_tiles.items()
+                    ],
+                )
+        logging.info(f"Recorded {len(empty_tiles)} empty tile extents in population_raster_empty_tiles")
 
     def _clean_existing_data(self) -> None:
         """Drop existing raster table for consistent reruns."""
@@ -191,6 +279,30 @@ class LoadPopulationRaster(Job):
             except Exception as e:
                 logging.warning(f"Could not clean existing data: {e}")
 
+    def _create_tile_statistics(self) -> None:
+        """Store every tile's population sum and envelope, circle queries add up tiles they fully contain."""
+        logging.info("Computing per-tile population statistics...")
+        with self.with_pg_connection() as database_connection:
+            database_connection.execute(text("DROP TABLE IF EXISTS population_raster_tiles"))
+            database_connection.execute(
+                text("""
+                    CREATE TABLE population_raster_tiles AS
+                    SELECT
+                        rid,
+                        COALESCE((ST_SummaryStats(rast)).sum, 0) AS population,
+                        ST_Envelope(rast)::geometry(POLYGON, 4326) AS envelope
+                    FROM population_raster
+                """)
+            )
+            database_connection.execute(text("ALTER TABLE population_raster_tiles ADD PRIMARY KEY (rid)"))
+            database_connection.execute(
+                text(
+                    "CREATE INDEX population_raster_tiles_envelope_idx ON population_raster_tiles USING GIST (envelope)"
+                )
+            )
+            database_connection.execute(text("ANALYZE population_raster_tiles"))
+        logging.info("Per-tile population statistics created")
+
     def _create_spatial_indexes(self) -> None:
         """Create additional spatial indexes on raster table."""
         logging.info("Creating additional spatial indexes...")
@@ -198,10 +310,11 @@ class LoadPopulationRaster(Job):
         try:
             # The raster2pgsql -I flag already creates the main spatial index
             # VACUUM ANALYZE needs to run outside transaction context
-            database_url = self._get_database_url()
-            engine = create_engine(database_url)
+            self.create_engine()
+            if self.engine is None:
+                raise ValueError("Could not create database engine")
 
-            with engine.connect() as connection:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
                 connection.execute(text("VACUUM ANALYZE population_raster"))
 
             logging.info("Completed spatial indexing and table optimization")
@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from backend.worldguess.constants import POPULATION_GRID
+from backend.worldguess.tiles import PYRAMID_DIR_NAME, render_density_tile, tile_path, write_tile
+
+from .base import Job, JobStatus, RunStatusType
+from .export_population_grid import GRID_DIR
+
+# Zoom 6 is 5461 tiles in total, deeper tiles are rendered on demand by the API
+TILE_PRERENDER_MAX_ZOOM = int(os.getenv("TILE_PRERENDER_MAX_ZOOM", 6))
+COMPLETE_MARKER = ".complete"
+
+
+class GridTransform(NamedTuple):
+    west: float
+    north: float
+    pixel_width: float
+    pixel_height: float
+
+
+def pyramid_is_current(data_version: str, grid_dir: str = GRID_DIR) -> bool:
+    """Whether all pre-rendered tiles exist for this data version."""
+    return (Path(grid_dir) / PYRAMID_DIR_NAME / data_version / COMPLETE_MARKER).exists()
+
+
+class RenderDensityTiles(Job):
+    """Pre-render the low zoom population density tiles from the exported grid into a disk pyramid."""
+
+    def __init__(self, name: str, dependencies: list[Job] | None, data_version: str) -> None:
+        super().__init__(name, dependencies)
+        self.data_version = data_version
+
+    def run(self) -> RunStatusType:
+        try:
+            self._render(Path(GRID_DIR))
+            return JobStatus.SUCCESS
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"RenderDensityTiles failed: {e}")
+            return JobStatus.FAILURE
+
+    def _render(self, grid_dir: Path) -> None:
+        array = np.load(grid_dir / f"{POPULATION_GRID}.npy", mmap_mode="r")
+        metadata = json.loads((grid_dir / f"{POPULATION_GRID}.json").read_text())
+        transform = GridTransform(
+            west=metadata["west"],
+            north=metadata["north"],
+            pixel_width=metadata["pixel_width"],
+            pixel_height=metadata["pixel_height"],
+        )
+
+        pyramid_root = grid_dir / PYRAMID_DIR_NAME
+        tile_count = 0
+        for z in range(TILE_PRERENDER_MAX_ZOOM + 1):
+            for x in range(2**z):
+                for y in range(2**z):
+                    content = render_density_tile(array, transform, z, x, y)
+                    write_tile(tile_path(pyramid_root, self.data_version, z, x, y), content)
+                    tile_count += 1
+            logging.info(f"Rendered density tiles up to zoom {z} ({tile_count} tiles)")
+
+        (pyramid_root / self.data_version / COMPLETE_MARKER).touch()
+        for version_dir in pyramid_root.iterdir():
+            if version_dir.is_dir() and version_dir.name != self.data_version:
+                shutil.rmtree(version_dir, ignore_errors=True)
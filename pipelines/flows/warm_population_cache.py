@@ -0,0 +1,63 @@
+import logging
+import os
+import time
+from pathlib import Path
+
+from pymemcache.exceptions import MemcacheError
+
+from backend.worldguess.constants import POPULATION_GRID
+from backend.worldguess.grid_files import load_grid
+from backend.worldguess.queries.population_grid import population_in_circle
+from backend.worldguess.query_log import QUERY_LOG_NAME, most_frequent_circles, population_cache_key, read_query_log
+
+from .base import Job, JobStatus, RunStatusType
+from .export_population_grid import GRID_DIR
+
+QUERY_LOG_DIR = os.getenv("QUERY_LOG_DIR", "/data/query_log")
+WARM_CIRCLE_COUNT = int(os.getenv("WARM_CIRCLE_COUNT", 2000))
+WARM_WINDOW_SECONDS = int(os.getenv("WARM_WINDOW_SECONDS", 7 * 24 * 60 * 60))
+# Same lifetime the API gives the results it caches
+POPULATION_CACHE_SECONDS = int(os.getenv("POPULATION_CACHE_SECONDS", 7 * 24 * 60 * 60))
+SET_MANY_BATCH = 100
+
+
+class WarmPopulationCache(Job):
+    """Fill the API's circle population cache for a new data version with the circles queried most often recently.
+
+    Circles are replayed from the API's query log and summed over the freshly exported grid, the way the API sums
+    them. API workers switch to the new grid, and so to these keys, within GRID_CHECK_SECONDS of its export. Warming
+    only saves the first requests after a refresh their latency, without a log or a grid it is skipped and it never
+    fails the pipeline.
+    """
+
+    def __init__(self, name: str, dependencies: list[Job] | None, data_version: str) -> None:
+        super().__init__(name, dependencies)
+        self.data_version = data_version
+
+    def run(self) -> RunStatusType:
+        try:
+            self._warm()
+        except (OSError, MemcacheError, ValueError) as e:
+            logging.warning(f"WarmPopulationCache skipped: {e}")
+        return JobStatus.SUCCESS
+
+    def _warm(self) -> None:
+        grid = load_grid(Path(GRID_DIR), POPULATION_GRID)
+        if grid is None or grid.data_version != self.data_version:
+            logging.info(f"No population grid of data version {self.data_version}, not warming the cache")
+            return
+
+        circles = most_frequent_circles(
+            read_query_log(Path(QUERY_LOG_DIR) / QUERY_LOG_NAME), time.time() - WARM_WINDOW_SECONDS, WARM_CIRCLE_COUNT
+        )
+        started = time.perf_counter()
+        batch: dict[str, str] = {}
+        for latitude, longitude, radius_km in circles:
+            population = population_in_circle(grid, latitude, longitude, radius_km)
+            batch[population_cache_key(latitude, longitude, radius_km, self.data_version)] = str(population)
+            if len(batch) >= SET_MANY_BATCH:
+                self.cache.set_many(batch, expire=POPULATION_CACHE_SECONDS)
+                batch = {}
+        if batch:
+            self.cache.set_many(batch, expire=POPULATION_CACHE_SECONDS)
+        logging.info(f"Warmed the population cache with {len(circles)} circles in {time.perf_counter() - started:.1f}s")
@@ -1,22 +1,67 @@
 import asyncio
 import logging
 
-from flows.base import JobStatus
+from backend.worldguess.constants import COUNTRY_GRID
+from flows.base import Job, JobStatus
+from flows.build_land_tiles import BuildLandTiles
+from flows.build_population_cells import BuildPopulationCells
 from flows.data_version_check import should_skip_pipeline
+from flows.export_chunked_grids import ExportChunkedGrids, chunked_grids_are_current
+from flows.export_country_grid import ExportCountryGrid
+from flows.export_population_grid import ExportPopulationGrid, grid_is_current
+from flows.load_countries import LoadCountries
 from flows.load_land_areas import LoadLandAreas
 from flows.load_population_raster import LoadPopulationRaster
+from flows.render_density_tiles import RenderDensityTiles, pyramid_is_current
 from flows.set_data_version import SetDataVersion
 from flows.set_status import Begin, End
+from flows.warm_population_cache import WarmPopulationCache
 
-DATA_VERSION = "2"
+DATA_VERSION = "8"
 
 begin = Begin("begin")
 load_land = LoadLandAreas("load_land_areas", [begin])
+build_land_tiles = BuildLandTiles("build_land_tiles", [load_land], DATA_VERSION)
 load_population = LoadPopulationRaster("load_population", [load_land])
-set_data_version = SetDataVersion("set_data_version", [load_population], DATA_VERSION)
-end = End("end", [set_data_version])
+export_population_grid = ExportPopulationGrid("export_population_grid", [load_population], DATA_VERSION)
+render_density_tiles = RenderDensityTiles("render_density_tiles", [export_population_grid], DATA_VERSION)
+build_population_cells = BuildPopulationCells("build_population_cells", [load_population])
+load_countries = LoadCountries("load_countries", [begin])
+export_country_grid = ExportCountryGrid("export_country_grid", [load_countries, export_population_grid], DATA_VERSION)
+export_chunked_grids = ExportChunkedGrids(
+    "export_chunked_grids", [export_population_grid, export_country_grid], DATA_VERSION
+)
+set_data_version = SetDataVersion(
+    "set_data_version",
+    [
+        load_population,
+        export_population_grid,
+        render_density_tiles,
+        build_population_cells,
+        build_land_tiles,
+        export_country_grid,
+        export_chunked_grids,
+    ],
+    DATA_VERSION,
+)
+warm_population_cache = WarmPopulationCache("warm_population_cache", [set_data_version], DATA_VERSION)
+end = End("end", [warm_population_cache])
 
-flows = [begin, load_land, load_population, set_data_version, end]
+flows = [
+    begin,
+    load_land,
+    build_land_tiles,
+    load_population,
+    export_population_grid,
+    render_density_tiles,
+    build_population_cells,
+    load_countries,
+    export_country_grid,
+    export_chunked_grids,
+    set_data_version,
+    warm_population_cache,
+    end,
+]
 
 
 logging.basicConfig(level=logging.INFO)
@@ -29,8 +74,21 @@ async def main() -> None:
         logging.info(f"Data version {DATA_VERSION} already exists, setting ready status")
         # Create simple jobs without dependencies for cache status update
         simple_begin = Begin("status_begin")
-        simple_end = End("status_end")
-        flows_to_run = [simple_begin, simple_end]
+        flows_to_run: list[Job] = [simple_begin]
+        if not grid_is_current(DATA_VERSION):
+            # The database is loaded but the grid volume is new or stale
+            flows_to_run.append(ExportPopulationGrid("export_population_grid", [simple_begin], DATA_VERSION))
+        if not grid_is_current(DATA_VERSION) or not pyramid_is_current(DATA_VERSION):
+            flows_to_run.append(RenderDensityTiles("render_density_tiles", flows_to_run[-1:], DATA_VERSION))
+        if not grid_is_current(DATA_VERSION) or not grid_is_current(DATA_VERSION, name=COUNTRY_GRID):
+            flows_to_run.append(ExportCountryGrid("export_country_grid", flows_to_run[-1:], DATA_VERSION))
+        if (
+            not grid_is_current(DATA_VERSION)
+            or not grid_is_current(DATA_VERSION, name=COUNTRY_GRID)
+            or not chunked_grids_are_current(DATA_VERSION)
+        ):
+            flows_to_run.append(ExportChunkedGrids("export_chunked_grids", flows_to_run[-1:], DATA_VERSION))
+        flows_to_run.append(End("status_end", flows_to_run[-1:]))
     else:
         logging.info(f"Starting pipeline with data version {DATA_VERSION}")
         flows_to_run = flows
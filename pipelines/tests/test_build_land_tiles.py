@@ -0,0 +1,40 @@
+import pytest
+
+from flows.build_land_tiles import coordinate_digits, simplify_tolerance
+
+
+@pytest.mark.parametrize(
+    ("z", "tolerance"),
+    [
+        (0, 1.40625),
+        (1, 0.703125),
+        (2, 0.3515625),
+        (6, 0.02197265625),
+        (10, 0.001373291015625),
+    ],
+)
+def test_simplify_tolerance_is_a_tile_pixel(z: int, tolerance: float) -> None:
+    assert simplify_tolerance(z) == tolerance
+
+
+@pytest.mark.parametrize(
+    ("tolerance", "digits"),
+    [
+        (10.0, 0),
+        (2.0, 0),
+        (1.40625, 1),
+        (0.2, 1),
+        (0.02197265625, 2),
+        (0.002, 3),
+        (0.001373291015625, 4),
+    ],
+)
+def test_coordinate_digits(tolerance: float, digits: int) -> None:
+    assert coordinate_digits(tolerance) == digits
+
+
+@pytest.mark.parametrize("z", range(13))
+def test_rounding_stays_below_half_the_tolerance(z: int) -> None:
+    tolerance = simplify_tolerance(z)
+    digits = coordinate_digits(tolerance)
+    assert 0.5 * 10**-digits < tolerance / 2
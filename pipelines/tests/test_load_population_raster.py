@@ -0,0 +1,86 @@
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from flows.load_population_raster import RASTER_INSERT_PREFIX, filter_tile_inserts, find_empty_tiles
+
+NODATA = -1.0
+N = np.nan
+
+
+def _write_tiff(path: Path, array: np.ndarray) -> Path:
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=array.shape[1],
+        height=array.shape[0],
+        count=1,
+        dtype="float32",
+        nodata=NODATA,
+        # One degree pixels from 10° E, 50° N
+        transform=from_origin(10.0, 50.0, 1.0, 1.0),
+    ) as dataset:
+        dataset.write(array.astype(np.float32), 1)
+    return path
+
+
+def test_only_tiles_without_population_are_empty(tmp_path: Path) -> None:
+    # Two by two tiles, the last column is an edge tile one pixel wide
+    array = np.array(
+        [
+            # All nodata, partly populated, fully populated
+            [-1, -1, 5, -1, 3],
+            [-1, -1, 0, -1, 4],
+            # Zeros, NaN, partly populated edge
+            [0, 0, N, N, -1],
+            [0, 0, N, N, 2],
+        ]
+    )
+    empty, tile_count = find_empty_tiles(_write_tiff(tmp_path / "population.tif", array), tile_size=2)
+
+    assert tile_count == 6
+    assert empty == {
+        0: (10.0, 48.0, 12.0, 50.0),
+        3: (10.0, 46.0, 12.0, 48.0),
+        4: (12.0, 46.0, 14.0, 48.0),
+    }
+
+
+def test_fully_populated_raster_has_no_empty_tiles(tmp_path: Path) -> None:
+    empty, tile_count = find_empty_tiles(_write_tiff(tmp_path / "population.tif", np.ones((4, 4))), tile_size=2)
+    assert (empty, tile_count) == ({}, 4)
+
+
+def test_all_nodata_raster_is_empty_everywhere(tmp_path: Path) -> None:
+    empty, tile_count = find_empty_tiles(_write_tiff(tmp_path / "population.tif", np.full((4, 4), NODATA)), 2)
+    assert sorted(empty) == [0, 1, 2, 3] and tile_count == 4
+
+
+def _insert(tile: int) -> bytes:
+    return RASTER_INSERT_PREFIX + f'"population_raster" ("rast") VALUES (\'tile {tile}\'::raster);\n'.encode()
+
+
+@pytest.mark.parametrize(
+    ("empty_tiles", "kept_tiles"),
+    [
+        (set(), [0, 1, 2]),
+        ({1}, [0, 2]),
+        ({0, 1, 2}, []),
+    ],
+)
+def test_inserts_of_empty_tiles_are_dropped(empty_tiles: set[int], kept_tiles: list[int]) -> None:
+    header = [b"BEGIN;\n", b'CREATE TABLE "population_raster" ("rid" serial PRIMARY KEY,"rast" raster);\n']
+    footer = [b"END;\n"]
+    out = io.BytesIO()
+
+    kept, dropped = filter_tile_inserts(header + [_insert(tile) for tile in range(3)] + footer, empty_tiles, out)
+
+    expected = b"".join(header + [_insert(tile) for tile in kept_tiles] + footer)
+    assert out.getvalue() == expected
+    assert kept == len(expected)
+    assert dropped == sum(len(_insert(tile)) for tile in empty_tiles)